@@ -1,11 +1,11 @@
-from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status
+from typing import Any, Callable, Generator, List, Optional
+from fastapi import Depends, HTTPException, Query, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from app.core.config import settings
-from app.db import models
+from app.db import models, repository
 from app.db.base import get_db
 from datetime import datetime, timedelta
 
@@ -65,3 +65,34 @@ def get_current_active_superuser(
             status_code=400, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+class PageParams:
+    """
+    Keyset pagination parameters of list endpoints: pass the X-Next-Cursor
+    header of a page as `cursor` to get the next one.
+    """
+    def __init__(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+def send_page(
+    response: Response,
+    params: PageParams,
+    fetch: Callable[[Optional[List[Any]], int], repository.Page],
+) -> repository.Page:
+    """
+    fetch(after, limit) the requested page and expose its total and next
+    cursor as X-Total-Count / X-Next-Cursor headers.
+    """
+    try:
+        page = fetch(repository.decode_cursor(params.cursor) if params.cursor else None, params.limit)
+    except repository.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    response.headers["X-Total-Count"] = str(page.total)
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return page
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, vms, analytics, courses, resources, users
+from app.api.v1.endpoints import auth, vms, analytics, courses, resources, users, metrics, search
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -8,4 +8,6 @@ api_router.include_router(analytics.router, prefix="/analytics", tags=["analytic
 api_router.include_router(courses.router, prefix="/courses", tags=["courses"])
 api_router.include_router(resources.router, prefix="/resources", tags=["resources"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+api_router.include_router(search.router, prefix="/search", tags=["search"])
 
@@ -1,17 +1,21 @@
 from typing import Any
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from app.api import deps
 from app.db import models
-from app.hypervisor.manager import HypervisorManager
+from app.services.analytics import analytics
 
 router = APIRouter()
 
 @router.get("/", response_model=Any)
-def get_system_analytics(
+async def get_system_analytics(
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    Get system-wide analytics.
+    Get system-wide analytics over every hypervisor: cluster totals, per-node
+    utilization, VMs by state and per-course allocation.
+    Served from the shared, periodically rebuilt report (see generated_at).
     """
-    client = HypervisorManager.get_client()
-    return client.get_analytics()
+    try:
+        return await analytics.get()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Analytics not available yet: {e}")
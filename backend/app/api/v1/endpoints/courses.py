@@ -1,9 +1,18 @@
-from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, joinedload
 from app.api import deps
-from app.db import models
+from app.core.config import settings
+from app.db import models, repository
+from app.db.base import SessionLocal
 from app.hypervisor.manager import HypervisorManager
+from app.services.idle import clear_idle
+from app.services.power import bulk_power
+from app.services.tasks import register_task
+from app.services.templates import template_location, clone_source
+from app.services.vmids import reserve_vmids, mark_used, release
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -12,6 +21,23 @@ class CourseCreate(BaseModel):
     name: str
     description: Optional[str] = None
     template_id: Optional[int] = None
+    clone_mode: Literal["full", "linked"] = "full"
+    # Cluster holding the template; the default one when omitted
+    hypervisor_id: Optional[int] = None
+    # What to do with VMs idle for idle_minutes (see IdlePolicyUpdate)
+    idle_action: Literal["off", "hibernate", "shutdown"] = "off"
+    idle_minutes: int = 60
+    idle_cpu_percent: float = 5.0
+    idle_net_kbps: float = 80.0
+
+class IdlePolicyUpdate(BaseModel):
+    # "hibernate" suspends to disk (RAM is freed, the next start resumes),
+    # "shutdown" shuts the guest down
+    idle_action: Literal["off", "hibernate", "shutdown"]
+    idle_minutes: int = 60
+    # A VM is idle while CPU and network (in + out, kilobits per second) stay under both limits
+    idle_cpu_percent: float = 5.0
+    idle_net_kbps: float = 80.0
 
 class CourseResponse(BaseModel):
     id: int
@@ -19,6 +45,12 @@ class CourseResponse(BaseModel):
     description: Optional[str] = None
     professor_id: int
     template_id: Optional[int] = None
+    clone_mode: Optional[str] = "full"
+    hypervisor_id: Optional[int] = None
+    idle_action: Optional[str] = "off"
+    idle_minutes: Optional[int] = None
+    idle_cpu_percent: Optional[float] = None
+    idle_net_kbps: Optional[float] = None
     
     class Config:
         from_attributes = True
@@ -41,12 +73,21 @@ def create_course(
     """
     if current_user.role not in [models.UserRole.PROFESSOR, models.UserRole.SYS_ADMIN]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    if course_in.idle_minutes < 10:
+        raise HTTPException(status_code=400, detail="idle_minutes must be at least 10")
         
     course = models.Course(
         name=course_in.name,
         description=course_in.description,
         professor_id=current_user.id,
-        template_id=course_in.template_id
+        template_id=course_in.template_id,
+        clone_mode=course_in.clone_mode,
+        hypervisor_id=course_in.hypervisor_id,
+        idle_action=course_in.idle_action,
+        idle_minutes=course_in.idle_minutes,
+        idle_cpu_percent=course_in.idle_cpu_percent,
+        idle_net_kbps=course_in.idle_net_kbps,
     )
     db.add(course)
     db.commit()
@@ -69,6 +110,7 @@ def get_course_details(
     """
     Get full course details (Professor, Students, Assistants).
     Accessible by: SysAdmin, Course Professor, Course Assistants.
+    People come from the same single-query roster as /students.
     """
     course = db.query(models.Course).filter(models.Course.id == course_id).first()
     if not course:
@@ -77,44 +119,43 @@ def get_course_details(
     
     is_sys_admin = current_user.role == models.UserRole.SYS_ADMIN
     is_professor = current_user.id == course.professor_id
-    is_assistant = current_user in course.assistants
     
-    if not (is_sys_admin or is_professor or is_assistant):
+    if not (is_sys_admin or is_professor or repository.is_course_assistant(db, course.id, current_user.id)):
         raise HTTPException(status_code=403, detail="Not authorized to view this course")
 
-    response = CourseDetailResponse.model_validate(course)
+    # Validate the course columns only: from_attributes on CourseDetailResponse
+    # would lazy-load the professor, students and assistants relationships
+    response = CourseDetailResponse(**CourseResponse.model_validate(course).model_dump())
     
-    
-    if course.professor:
-        response.professor = {"username": course.professor.username, "email": course.professor.email}
-        
-    response.students = [{"username": s.username, "email": s.email} for s in course.students]
-    response.assistants = [{"username": a.username, "email": a.email} for a in course.assistants]
+    for person in repository.course_roster(db, course.id):
+        entry = {"username": person["username"], "email": person["email"]}
+        if person["role"] == "professor":
+            response.professor = entry
+        elif person["role"] == "assistant":
+            response.assistants.append(entry)
+        else:
+            response.students.append(entry)
     
     return response
 
 @router.get("/", response_model=List[CourseResponse])
 def list_courses(
+    response: Response,
+    professor_id: Optional[int] = None,
+    page: deps.PageParams = Depends(),
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    List courses.
+    List courses, paginated by id (X-Total-Count / X-Next-Cursor headers).
     - Students: Only enrolled courses.
     - Assistants: Only assisting courses.
     - Professors: Only owned courses.
     - Sys Admin: All courses.
     """
-    if current_user.role == models.UserRole.SYS_ADMIN:
-        return db.query(models.Course).all()
-    elif current_user.role == models.UserRole.PROFESSOR:
-        return db.query(models.Course).filter(models.Course.professor_id == current_user.id).all()
-    elif current_user.role == models.UserRole.ASSISTANT:
-        return current_user.assisting_courses
-    elif current_user.role == models.UserRole.STUDENT:
-        return current_user.enrolled_courses
-    else:
-        return []
+    return deps.send_page(response, page, lambda after, limit: repository.list_courses(
+        db, current_user, after, limit, professor_id=professor_id
+    ))
 
 @router.post("/{course_id}/enroll", response_model=Any)
 def enroll_student(
@@ -153,9 +194,10 @@ def enroll_student(
     db.commit()
     return {"message": f"User {student.email} enrolled in course {course.name}. VM provisioning started."}
 
-def provision_vm_for_student(db: Session, course: models.Course, student: models.User):
+def provision_vm_for_student(db: Session, course: models.Course, student: models.User, vmid: int = None):
     """
     Helper function to provision a VM for a single student in a course.
+    `vmid` is a VMID already reserved by the caller; one is reserved here otherwise.
     """
     
     existing_vm = db.query(models.VirtualMachine).filter(
@@ -163,39 +205,100 @@ def provision_vm_for_student(db: Session, course: models.Course, student: models
         models.VirtualMachine.course_id == course.id
     ).first()
     
+    vmid_pool = course.hypervisor_id or 0
     if existing_vm:
+        if vmid:
+            release(db, [vmid], vmid_pool)
         return 
         
-    client = HypervisorManager.get_client()
+    client = HypervisorManager.get_client(course.hypervisor)
+    if not vmid:
+        try:
+            vmid = reserve_vmids(db, 1, client.get_inventory().used_vmids(), vmid_pool)[0]
+        except Exception as e:
+            print(f"Failed to provision for {student.username}: {e}")
+            return
     
     
     vm_name = f"{course.name.replace(' ', '-')}-{student.username}"
     vm_name = "".join(c for c in vm_name if c.isalnum() or c in "-").lower()
     
+    template = template_location(db, course.template_id, course.hypervisor_id)
+    
     try:
         
         result = client.create_vm(vm_name, {
             "template_id": course.template_id,
+            **clone_source(template),
+            "clone_mode": course.clone_mode,
+            "vmid": vmid,
             "cpu": 2, 
             "memory": 1024
         })
+        mark_used(db, vmid, vmid_pool)
         
         
         new_vm = models.VirtualMachine(
             name=vm_name,
             owner_id=student.id,
             vm_id=result.get("vmid"),
+            hypervisor_id=course.hypervisor_id,
             course_id=course.id,
             status="creating",
-            details={"node": result.get("node")}
+            details={
+                "node": result.get("node"),
+                "clone_mode": result.get("clone_mode"),
+                "pending_config": result.get("pending_config"),
+            }
         )
         db.add(new_vm)
         db.commit()
+        register_task(db, result.get("upid"), "clone", vm=new_vm, hypervisor_id=new_vm.hypervisor_id)
         print(f"Successfully provisioned VM {vm_name} for {student.username}")
         
     except Exception as e:
+        db.rollback()
+        release(db, [vmid], vmid_pool)
         print(f"Failed to provision for {student.username}: {e}")
 
+def provision_course_vms(course_id: int, student_ids: List[int]):
+    """
+    Provision VMs for many students of a course at once.
+    One block of VMIDs is reserved up front so the clones can be issued in
+    parallel (PROVISION_CONCURRENCY) without racing on cluster/nextid.
+    """
+    db = SessionLocal()
+    try:
+        provisioned = {
+            owner_id for (owner_id,) in db.query(models.VirtualMachine.owner_id).filter(
+                models.VirtualMachine.course_id == course_id,
+                models.VirtualMachine.owner_id.in_(student_ids)
+            )
+        }
+        student_ids = [s for s in student_ids if s not in provisioned]
+        if not student_ids:
+            return
+        course = db.query(models.Course).filter(models.Course.id == course_id).first()
+        client = HypervisorManager.get_client(course.hypervisor)
+        vmids = reserve_vmids(db, len(student_ids), client.get_inventory().used_vmids(), course.hypervisor_id or 0)
+    except Exception as e:
+        print(f"Failed to reserve VMIDs for course {course_id}: {e}")
+        return
+    finally:
+        db.close()
+
+    def provision(student_id: int, vmid: int):
+        worker_db = SessionLocal()
+        try:
+            course = worker_db.query(models.Course).filter(models.Course.id == course_id).first()
+            student = worker_db.query(models.User).filter(models.User.id == student_id).first()
+            provision_vm_for_student(worker_db, course, student, vmid=vmid)
+        finally:
+            worker_db.close()
+
+    with ThreadPoolExecutor(max_workers=settings.PROVISION_CONCURRENCY) as pool:
+        list(pool.map(provision, student_ids, vmids))
+
 @router.post("/{course_id}/provision", response_model=Any)
 def provision_vms(
     course_id: int,
@@ -228,19 +331,83 @@ def provision_vms(
     else:
         targets = course.students
 
-    for student in targets:
-        background_tasks.add_task(provision_vm_for_student, db, course, student)
+    background_tasks.add_task(provision_course_vms, course.id, [s.id for s in targets])
     
     return {"message": f"Provisioning triggered for {len(targets)} students."}
 
+@router.post("/{course_id}/vms/{action}", response_model=Any)
+async def power_course_vms(
+    course_id: int,
+    action: Literal["start", "stop", "shutdown"],
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Start, stop or shut down every VM of the course at once.
+    Only Professor/SysAdmin.
+    """
+    # Sync DB work runs in the threadpool, never on the event loop
+    def load():
+        course = db.query(models.Course).filter(models.Course.id == course_id).first()
+        if not course:
+            raise HTTPException(status_code=404, detail="Course not found")
+
+        if current_user.role != models.UserRole.SYS_ADMIN and course.professor_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+
+        return db.query(models.VirtualMachine).options(joinedload(models.VirtualMachine.hypervisor)).filter(
+            models.VirtualMachine.course_id == course.id,
+            models.VirtualMachine.status.notin_(["creating", "draft_template", "template"]),
+        ).all()
+
+    vms = await run_in_threadpool(load)
+    result = await bulk_power(vms, action)
+    if action == "start":
+        await run_in_threadpool(clear_idle, db, [r["id"] for r in result["results"] if r["status"] == "ok"])
+    return result
+
+@router.put("/{course_id}/idle-policy", response_model=CourseResponse)
+def update_idle_policy(
+    course_id: int,
+    policy_in: IdlePolicyUpdate,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Set what happens to the course's VMs once they have been idle for a while.
+    Only Professor/SysAdmin.
+    """
+    course = db.query(models.Course).filter(models.Course.id == course_id).first()
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    if current_user.role != models.UserRole.SYS_ADMIN and course.professor_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    if policy_in.idle_minutes < 10:
+        raise HTTPException(status_code=400, detail="idle_minutes must be at least 10")
+
+    course.idle_action = policy_in.idle_action
+    course.idle_minutes = policy_in.idle_minutes
+    course.idle_cpu_percent = policy_in.idle_cpu_percent
+    course.idle_net_kbps = policy_in.idle_net_kbps
+    db.commit()
+    db.refresh(course)
+    return course
+
 @router.get("/{course_id}/students", response_model=Any)
 def list_course_students(
     course_id: int,
+    response: Response,
+    include_staff: bool = False,
+    page: deps.PageParams = Depends(),
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    List all students in a course and their associated VMs.
+    List all students in a course and their associated VMs, ordered by username
+    and paginated (X-Total-Count / X-Next-Cursor headers).
+    include_staff adds the professor and assistants (first) with their role.
     Accessible by: SysAdmin, Course Professor, Course Assistants.
     """
     course = db.query(models.Course).filter(models.Course.id == course_id).first()
@@ -250,36 +417,21 @@ def list_course_students(
     
     is_sys_admin = current_user.role == models.UserRole.SYS_ADMIN
     is_professor = current_user.id == course.professor_id
-    is_assistant = current_user in course.assistants
     
-    if not (is_sys_admin or is_professor or is_assistant):
+    if not (is_sys_admin or is_professor or repository.is_course_assistant(db, course.id, current_user.id)):
         raise HTTPException(status_code=403, detail="Not authorized to view this course's students")
 
-    results = []
-    for student in course.students:
-        vm = db.query(models.VirtualMachine).filter(
-            models.VirtualMachine.owner_id == student.id,
-            models.VirtualMachine.course_id == course.id
-        ).first()
-        
-        student_data = {
-            "id": student.id,
-            "username": student.username,
-            "email": student.email,
-            "vm": {
-                "id": vm.id,
-                "name": vm.name,
-                "status": vm.status,
-                "ip": vm.details.get("ip") if vm.details else None
-            } if vm else None
-        }
-        results.append(student_data)
-        
-    return results
+    roles = repository.ROSTER_ROLES if include_staff else ("student",)
+    # Students joined to their course VM in one query
+    return deps.send_page(response, page, lambda after, limit: repository.course_roster_page(
+        db, course.id, after, limit, roles=roles
+    ))
 
 @router.get("/{course_id}/assistants", response_model=Any)
 def list_course_assistants(
     course_id: int,
+    response: Response,
+    page: deps.PageParams = Depends(),
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
@@ -297,15 +449,36 @@ def list_course_assistants(
     if not (is_sys_admin or is_professor):
         raise HTTPException(status_code=403, detail="Not authorized to view this course's assistants")
 
-    results = []
-    for assistant in course.assistants:
-        results.append({
-            "id": assistant.id,
-            "username": assistant.username,
-            "email": assistant.email
-        })
-        
-    return results
+    return deps.send_page(response, page, lambda after, limit: repository.course_roster_page(
+        db, course.id, after, limit, roles=("assistant",), row=lambda r: {"id": r.id, "username": r.username, "email": r.email}
+    ))
+
+class CloneModeRequest(BaseModel):
+    clone_mode: Literal["full", "linked"]
+
+@router.put("/{course_id}/clone-mode", response_model=CourseResponse)
+def set_clone_mode(
+    course_id: int,
+    clone_in: CloneModeRequest,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Choose full or linked clones for the course's future VMs.
+    Linked clones fall back to full clones when the template's storage can't do them.
+    Accessible by: SysAdmin, Course Professor.
+    """
+    course = db.query(models.Course).filter(models.Course.id == course_id).first()
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    if current_user.role != models.UserRole.SYS_ADMIN and course.professor_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    course.clone_mode = clone_in.clone_mode
+    db.commit()
+    db.refresh(course)
+    return course
 
 class AssignProfessorRequest(BaseModel):
     email: str
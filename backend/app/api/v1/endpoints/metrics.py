@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.api import deps
+from app.db import models
+from app.services.metrics import query_series, vm_subject, node_subject
+
+router = APIRouter()
+
+Resolution = Optional[Literal[60, 900]]
+
+def _range(start: Optional[datetime], end: Optional[datetime]):
+    """Default to the last hour; naive datetimes are taken as UTC."""
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=1)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+def _can_view_course(user: models.User, course: models.Course) -> bool:
+    if user.role in [models.UserRole.SYS_ADMIN, models.UserRole.BUSINESS_ADMIN]:
+        return True
+    if user.role == models.UserRole.PROFESSOR:
+        return course.professor_id == user.id
+    if user.role == models.UserRole.ASSISTANT:
+        return user in course.assistants
+    return False
+
+@router.get("/vms/{vm_id}", response_model=Any)
+def get_vm_metrics(
+    vm_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Resolution = None,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Usage history of one VM (by database id), served from the metrics store.
+    resolution is 60 (raw, last day) or 900 (15-minute roll-ups); picked from the range when omitted.
+    """
+    vm = db.query(models.VirtualMachine).filter(models.VirtualMachine.id == vm_id).first()
+    if not vm:
+        raise HTTPException(status_code=404, detail="VM not found")
+    if vm.owner_id != current_user.id and not (vm.course and _can_view_course(current_user, vm.course)) \
+            and current_user.role not in [models.UserRole.SYS_ADMIN, models.UserRole.BUSINESS_ADMIN]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    start, end = _range(start, end)
+    return query_series(db, start, end, resolution, subjects=[vm_subject(vm.id)])
+
+@router.get("/courses/{course_id}", response_model=Any)
+def get_course_metrics(
+    course_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Resolution = None,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Combined usage history of all VMs of a course: average CPU, summed memory and I/O.
+    """
+    course = db.query(models.Course).filter(models.Course.id == course_id).first()
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if not _can_view_course(current_user, course):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    vm_ids = [vm_id for (vm_id,) in db.query(models.VirtualMachine.id).filter(models.VirtualMachine.course_id == course.id)]
+    start, end = _range(start, end)
+    return query_series(db, start, end, resolution, vm_ids=vm_ids)
+
+@router.get("/nodes/{node}", response_model=Any)
+def get_node_metrics(
+    node: str,
+    hypervisor_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Resolution = None,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Usage history of a hypervisor node. SysAdmin and Business Admin only.
+    """
+    if current_user.role not in [models.UserRole.SYS_ADMIN, models.UserRole.BUSINESS_ADMIN]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    start, end = _range(start, end)
+    return query_series(db, start, end, resolution, subjects=[node_subject(hypervisor_id, node)])
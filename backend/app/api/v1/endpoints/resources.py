@@ -1,34 +1,76 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+import time
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 from app.api import deps
+from app.core.config import settings
 from app.db import models
 from app.hypervisor.manager import HypervisorManager
+from app.services.catalog import catalog
+from app.services.task_logs import task_logs
+from app.services.tasks import register_task, upid_node
 
 router = APIRouter()
 
 @router.get("/isos", response_model=List[Any])
-def list_isos(
+async def list_isos(
+    response: Response,
+    db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    List available ISO images in Proxmox storage.
+    List available ISO images in Proxmox storage of every hypervisor.
     Accessible by SYS_ADMIN and PROFESSOR (to know what they can request).
+    Clusters and node/storage pairs that could not be read are listed in the
+    X-Partial-Result header instead of failing the whole request.
     """
     if current_user.role not in [models.UserRole.SYS_ADMIN, models.UserRole.PROFESSOR]:
         raise HTTPException(status_code=403, detail="Not authorized to view ISOs")
 
-    client = HypervisorManager.get_client()
-    return client.list_isos()
+    results, errors = await HypervisorManager.fan_out(db, lambda hypervisor, client: catalog.get_isos(hypervisor))
+    missing = [e["hypervisor"] for e in errors]
+    merged = []
+    for hypervisor, isos in results:
+        hypervisor_id = hypervisor.id if hypervisor else None
+        merged.extend({**iso, "hypervisor_id": hypervisor_id} for iso in isos)
+        missing.extend(
+            "/".join(filter(None, [e.get("node"), e.get("storage")])) for e in getattr(isos, "errors", [])
+        )
+    if missing:
+        response.headers["X-Partial-Result"] = ", ".join(missing)
+    return merged
 
 class ISODownloadRequest(BaseModel):
     url: str
     file_name: str
     storage: str = "local"
+    # Cluster to download to; the default one when omitted
+    hypervisor_id: Optional[int] = None
+
+def _hypervisor(db: Session, hypervisor_id: Optional[int]) -> Optional[models.Hypervisor]:
+    if hypervisor_id is None:
+        return None
+    hypervisor = db.query(models.Hypervisor).filter(models.Hypervisor.id == hypervisor_id).first()
+    if not hypervisor:
+        raise HTTPException(status_code=404, detail="Hypervisor not found")
+    return hypervisor
+
+def _task_hypervisor(db: Session, upid: str, hypervisor_id: Optional[int]) -> Optional[models.Hypervisor]:
+    """Cluster a task runs on: explicit, else the one we recorded it for."""
+    if hypervisor_id is not None:
+        return _hypervisor(db, hypervisor_id)
+    task = db.query(models.HypervisorTask).filter(models.HypervisorTask.upid == upid).first()
+    return task.hypervisor if task else None
 
 @router.post("/isos/download", response_model=Any)
-def download_iso(
+async def download_iso(
     download_in: ISODownloadRequest,
+    db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
@@ -39,57 +81,110 @@ def download_iso(
     if current_user.role != models.UserRole.SYS_ADMIN:
         raise HTTPException(status_code=403, detail="Only SysAdmins can download ISOs")
 
-    client = HypervisorManager.get_client()
+    client = HypervisorManager.get_async_client(await run_in_threadpool(_hypervisor, db, download_in.hypervisor_id))
     try:
-        upid = client.download_iso(download_in.url, download_in.file_name, download_in.storage)
+        upid = await client.download_iso(download_in.url, download_in.file_name, download_in.storage)
+        # The ISO catalog is refreshed by the task tracker once the download ends
+        await run_in_threadpool(register_task, db, upid, "download_iso", hypervisor_id=download_in.hypervisor_id)
         return {"upid": upid, "message": "Download started"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/tasks/{upid}", response_model=Any)
-def get_task_status(
+async def get_task_status(
     upid: str,
     node: str = "pve",
     # UPID format: UPID:node:hex:hex:hex:user:id:
+    hypervisor_id: Optional[int] = None,
+    db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get status of a background task.
+    Only log lines added since the last poll are fetched from Proxmox.
     """
     if current_user.role != models.UserRole.SYS_ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    try:
-        # UPID:node:pid:pstart:starttime:type:id:user@realm:
-        parts = upid.split(":")
-        if len(parts) > 1:
-            node = parts[1]
-    except:
-        pass
-
-    client = HypervisorManager.get_client()
-    status = client.get_task_status(upid, node)
-    logs = client.get_task_log(upid, node)
-    
-
-    progress = 0
-    for line in logs:
-        if "progress" in line.lower() or "%" in line:
-            # Try to extract number
-            import re
-            match = re.search(r'(\d+)%', line)
-            if match:
-                progress = int(match.group(1))
-    
+    node = upid_node(upid, node)
+    client = HypervisorManager.get_async_client(await run_in_threadpool(_task_hypervisor, db, upid, hypervisor_id))
+    status, (log, _) = await asyncio.gather(
+        client.get_task_status(upid, node),
+        task_logs.read(client, upid, node, since=0),
+    )
     return {
         "status": status,
-        "progress": progress,
-        "logs": logs[-5:] # Last 5 lines
+        "progress": log.progress,
+        "logs": log.since(log.offset - 5) # Last 5 lines
     }
 
+@router.get("/tasks/{upid}/stream")
+async def stream_task(
+    upid: str,
+    request: Request,
+    hypervisor_id: Optional[int] = None,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Server-sent events following a background task until it ends: a
+    "progress" event with status, progress and the new log lines whenever
+    something changed, then a final "end" event with the exit status, or an
+    "error" event if the task can't be followed (status unknown for
+    TASK_STREAM_MAX_UNKNOWN_POLLS polls in a row, or TASK_STREAM_MAX_SECONDS passed).
+    """
+    if current_user.role != models.UserRole.SYS_ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    node = upid_node(upid)
+    client = HypervisorManager.get_async_client(await run_in_threadpool(_task_hypervisor, db, upid, hypervisor_id))
+    # Don't hold a DB connection for the lifetime of the stream
+    db.close()
+
+    async def events():
+        seen, last_status, unknown = 0, None, 0
+        deadline = time.monotonic() + settings.TASK_STREAM_MAX_SECONDS
+        while not await request.is_disconnected():
+            status, (log, lines) = await asyncio.gather(
+                client.get_task_status(upid, node),
+                task_logs.read(client, upid, node, since=seen),
+            )
+            unknown = unknown + 1 if status.get("status") == "unknown" else 0
+            if unknown >= settings.TASK_STREAM_MAX_UNKNOWN_POLLS:
+                yield f"event: error\ndata: {json.dumps({'error': 'Task not found'})}\n\n"
+                task_logs.forget(upid)
+                return
+            stopped = status.get("status") == "stopped"
+            if stopped:
+                # Lines written between the two calls above
+                log, lines = await task_logs.read(client, upid, node, since=seen)
+            seen = log.offset
+
+            if lines or status.get("status") != last_status:
+                last_status = status.get("status")
+                event = {"status": last_status, "progress": log.progress, "lines": lines}
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+            else:
+                # Keep proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+
+            if stopped:
+                yield f"event: end\ndata: {json.dumps({'exitstatus': status.get('exitstatus')})}\n\n"
+                task_logs.forget(upid)
+                return
+            if time.monotonic() > deadline:
+                yield f"event: error\ndata: {json.dumps({'error': 'Stream time limit reached'})}\n\n"
+                task_logs.forget(upid)
+                return
+            await asyncio.sleep(settings.TASK_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @router.delete("/tasks/{upid}", response_model=Any)
-def cancel_task(
+async def cancel_task(
     upid: str,
+    hypervisor_id: Optional[int] = None,
+    db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
@@ -98,16 +193,9 @@ def cancel_task(
     if current_user.role != models.UserRole.SYS_ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    node = "pve"
-    try:
-        parts = upid.split(":")
-        if len(parts) > 1:
-            node = parts[1]
-    except:
-        pass
-
-    client = HypervisorManager.get_client()
-    success = client.cancel_task(upid, node)
+    node = upid_node(upid)
+    client = HypervisorManager.get_async_client(await run_in_threadpool(_task_hypervisor, db, upid, hypervisor_id))
+    success = await client.cancel_task(upid, node)
     if success:
         return {"message": "Task cancellation requested"}
     else:
@@ -0,0 +1,72 @@
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.api import deps
+from app.core.config import settings
+from app.db import models, search
+
+router = APIRouter()
+
+def _query(q: str = Query(..., description="Case-insensitive substring of the name")) -> str:
+    q = q.strip()
+    if len(q) < settings.SEARCH_MIN_CHARS:
+        raise HTTPException(status_code=400, detail=f"Search needs at least {settings.SEARCH_MIN_CHARS} characters")
+    return q
+
+Limit = Query(settings.SEARCH_DEFAULT_LIMIT, ge=1, le=settings.SEARCH_MAX_LIMIT)
+
+@router.get("/", response_model=Any)
+def search_all(
+    q: str = Depends(_query),
+    limit: int = Limit,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Search users (SysAdmin only), VMs and courses by name at once.
+    Each list is ranked exact match, prefix, then substring, and capped at `limit`.
+    """
+    return {
+        "users": search.search_users(db, q, limit) if current_user.role == models.UserRole.SYS_ADMIN else [],
+        "vms": search.search_vms(db, current_user, q, limit),
+        "courses": search.search_courses(db, current_user, q, limit),
+    }
+
+@router.get("/users", response_model=Any)
+def search_users(
+    q: str = Depends(_query),
+    limit: int = Limit,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Search users by username or email.
+    Restricted to SYS_ADMIN.
+    """
+    if current_user.role != models.UserRole.SYS_ADMIN:
+        raise HTTPException(status_code=403, detail="Only SysAdmins can search users")
+    return search.search_users(db, q, limit)
+
+@router.get("/vms", response_model=Any)
+def search_vms(
+    q: str = Depends(_query),
+    limit: int = Limit,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Search VMs by name, among the VMs GET /vms/ would list for the user.
+    """
+    return search.search_vms(db, current_user, q, limit)
+
+@router.get("/courses", response_model=Any)
+def search_courses(
+    q: str = Depends(_query),
+    limit: int = Limit,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Search courses by name, among the courses GET /courses/ would list for the user.
+    """
+    return search.search_courses(db, current_user, q, limit)
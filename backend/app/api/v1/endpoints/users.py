@@ -1,8 +1,8 @@
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from app.api import deps
-from app.db import models
+from app.db import models, repository
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -19,24 +19,23 @@ class UserResponse(BaseModel):
 
 @router.get("/", response_model=List[UserResponse])
 def list_users(
+    response: Response,
     role: Optional[str] = Query(None, description="Filter by user role"),
+    is_active: Optional[bool] = None,
+    page: deps.PageParams = Depends(),
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    List all users.
+    List all users, paginated by id (X-Total-Count / X-Next-Cursor headers).
     Restricted to SYS_ADMIN.
     """
     if current_user.role != models.UserRole.SYS_ADMIN:
         raise HTTPException(status_code=403, detail="Only SysAdmins can list users")
 
-    query = db.query(models.User)
-    
-    if role:
-        query = query.filter(models.User.role == role)
-        
-    users = query.all()
-    return users
+    return deps.send_page(response, page, lambda after, limit: repository.list_users(
+        db, after, limit, role=role, is_active=is_active
+    ))
 
 class UserDetailResponse(UserResponse):
     vms: List[Any] = []
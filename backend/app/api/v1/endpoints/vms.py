@@ -1,9 +1,22 @@
-from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, joinedload
 from app.api import deps
-from app.db import models
+from app.core.config import settings
+from app.db import models, repository
 from app.hypervisor.manager import HypervisorManager
+from app.services.catalog import catalog
+from app.services.idle import clear_idle
+from app.services.power import bulk_power
+from app.services.live_stats import sampler, stats_with_cost
+from app.services.tasks import register_task, tracker
+from app.services.templates import template_location, upsert_template, clone_source
+from app.services.vmids import reserve_vmids, mark_used, release
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -14,6 +27,8 @@ class VMCreate(BaseModel):
     course_id: int
     cpu: int = 2
     memory: int = 2048
+    # Defaults to the course's clone mode
+    clone_mode: Optional[Literal["full", "linked"]] = None
 
 class VMResponse(BaseModel):
     id: Optional[int] = None
@@ -24,22 +39,59 @@ class VMResponse(BaseModel):
     owner_email: Optional[str] = None
     course_name: Optional[str] = None
     details: Any = {}
+    # Maintained by the status reconciler
+    node: Optional[str] = None
+    cpu_usage: Optional[float] = None
+    cpus: Optional[int] = None
+    memory_used: Optional[int] = None
+    memory_total: Optional[int] = None
+    uptime: Optional[int] = None
+    synced_at: Optional[datetime] = None
+    # Set while the VM is hibernated / shut down by its course's idle policy
+    idle_action: Optional[str] = None
+    idle_reason: Optional[str] = None
+    idle_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
+def get_vm_by_vmid(db: Session, vm_id, hypervisor_id: Optional[int] = None) -> Optional[models.VirtualMachine]:
+    """VM row for a Proxmox vmid. vmids are only unique per cluster, pass hypervisor_id to disambiguate."""
+    # Hypervisor loaded with it: async callers pick the client without another query
+    query = db.query(models.VirtualMachine).options(joinedload(models.VirtualMachine.hypervisor)).filter(
+        models.VirtualMachine.vm_id == int(vm_id)
+    )
+    if hypervisor_id is not None:
+        query = query.filter(models.VirtualMachine.hypervisor_id == hypervisor_id)
+    return query.first()
+
 @router.get("/templates", response_model=List[Any])
-def list_templates(
+async def list_templates(
+    response: Response,
+    db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    List available VM templates from Proxmox.
+    List available VM templates of every hypervisor (served from the template catalog).
+    Each entry carries the hypervisor_id it lives on; clusters that could not
+    be read are listed in the X-Partial-Result header.
     """
-    client = HypervisorManager.get_client()
-    return client.list_templates()
+    results, errors = await HypervisorManager.fan_out(db, lambda hypervisor, client: catalog.get_templates(hypervisor))
+    if errors:
+        response.headers["X-Partial-Result"] = ", ".join(e["hypervisor"] for e in errors)
+    return [
+        {**template, "hypervisor_id": hypervisor.id if hypervisor else None}
+        for hypervisor, templates in results
+        for template in templates
+    ]
 
 @router.get("/", response_model=None)
 def list_vms(
+    response: Response,
+    status: Optional[str] = None,
+    course_id: Optional[int] = None,
+    owner_id: Optional[int] = None,
+    page: deps.PageParams = Depends(),
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
@@ -50,6 +102,10 @@ def list_vms(
     - PROFESSOR: VMs in owned courses
     - ASSISTANT: VMs in assisted courses
     - STUDENT: Only own VMs
+    IPs come from VirtualMachine.details, kept fresh by the background IP resolver.
+    Owner email and course name are joined in the same query.
+    Paginated by id (X-Total-Count / X-Next-Cursor headers); filter by
+    status, course_id and owner_id.
     """
 
     try:
@@ -58,40 +114,12 @@ def list_vms(
     except:
         pass
     try:
-        if current_user.role in [models.UserRole.SYS_ADMIN, models.UserRole.BUSINESS_ADMIN]:
-            vms = db.query(models.VirtualMachine).all()
-        elif current_user.role == models.UserRole.PROFESSOR:
-            vms = db.query(models.VirtualMachine).join(models.Course).filter(models.Course.professor_id == current_user.id).all()
-        elif current_user.role == models.UserRole.ASSISTANT:
-            course_ids = [c.id for c in current_user.assisting_courses]
-            vms = db.query(models.VirtualMachine).filter(models.VirtualMachine.course_id.in_(course_ids)).all()
-        else:
-            vms = db.query(models.VirtualMachine).filter(models.VirtualMachine.owner_id == current_user.id).all()
-
-        client = HypervisorManager.get_client()
-        results = []
-        for vm in vms:
-            try:
-                vm_data = VMResponse.model_validate(vm)
-                if vm.owner:
-                    vm_data.owner_email = vm.owner.email
-                if vm.course:
-                    vm_data.course_name = vm.course.name
-            except Exception as e:
-                with open("c:/Users/badda/Desktop/MastersProject/backend/validation_error.log", "w") as f:
-                    f.write(f"Validation Error for VM {vm.id}: {str(e)}\n")
-                    f.write(str(vm.__dict__))
-                raise e
-
-            if vm.status == "running":
-                try:
-                    details = client.get_vm_details(vm.vm_id)
-                    vm_data.ip_address = details.get("ip")
-                except:
-                    pass
-            results.append(vm_data)
-            
-        return results
+        # One joined, column-projected query; no ORM objects or per-row lazy loads
+        return deps.send_page(response, page, lambda after, limit: repository.list_vms(
+            db, current_user, after, limit, status=status, course_id=course_id, owner_id=owner_id
+        ))
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         with open("c:/Users/badda/Desktop/MastersProject/backend/error.log", "w") as f:
@@ -99,7 +127,7 @@ def list_vms(
         raise HTTPException(status_code=500, detail=f"List VMs Failed: {str(e)}")
 
 @router.post("/", response_model=Any)
-def create_vm(
+async def create_vm(
     vm_in: VMCreate,
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
@@ -111,136 +139,260 @@ def create_vm(
     if current_user.role not in [models.UserRole.PROFESSOR, models.UserRole.SYS_ADMIN]:
         raise HTTPException(status_code=403, detail="Students and Assistants cannot create VMs")
 
-    course = db.query(models.Course).filter(models.Course.id == vm_in.course_id).first()
+    # Sync DB work runs in the threadpool, never on the event loop
+    course = await run_in_threadpool(
+        lambda: db.query(models.Course).options(joinedload(models.Course.hypervisor)).filter(
+            models.Course.id == vm_in.course_id
+        ).first()
+    )
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
         
     if current_user.role == models.UserRole.PROFESSOR and course.professor_id != current_user.id:
         raise HTTPException(status_code=403, detail="You can only create VMs for your own courses")
 
-    client = HypervisorManager.get_client()
+    # Clones go to the cluster holding the course's template
+    client = HypervisorManager.get_async_client(course.hypervisor)
+    vmid_pool = course.hypervisor_id or 0
+    template = await run_in_threadpool(template_location, db, vm_in.template_id, course.hypervisor_id)
     
     try:
-        result = client.create_vm(vm_in.name, {
+        inventory = await client.get_inventory()
+        vmid = (await run_in_threadpool(reserve_vmids, db, 1, inventory.used_vmids(), vmid_pool))[0]
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        result = await client.create_vm(vm_in.name, {
             "template_id": vm_in.template_id,
+            **clone_source(template),
+            "clone_mode": vm_in.clone_mode or course.clone_mode,
+            "vmid": vmid,
             "cpu": vm_in.cpu,
             "memory": vm_in.memory
         })
     except Exception as e:
+        await run_in_threadpool(release, db, [vmid], vmid_pool)
         raise HTTPException(status_code=400, detail=str(e))
-    
-    vm = models.VirtualMachine(
-        name=vm_in.name,
-        owner_id=current_user.id,
-        vm_id=result.get("vmid"),
-        course_id=vm_in.course_id,
-        status="creating",
-        details={"node": result.get("node")}
+
+    def record():
+        mark_used(db, vmid, vmid_pool)
+        vm = models.VirtualMachine(
+            name=vm_in.name,
+            owner_id=current_user.id,
+            vm_id=result.get("vmid"),
+            hypervisor_id=course.hypervisor_id,
+            course_id=vm_in.course_id,
+            status="creating",
+            details={
+                "node": result.get("node"),
+                "clone_mode": result.get("clone_mode"),
+                "pending_config": result.get("pending_config"),
+            }
+        )
+        db.add(vm)
+        db.commit()
+        # The tracker applies pending_config and flips status from "creating" once the clone task ends
+        register_task(db, result.get("upid"), "clone", vm=vm, hypervisor_id=vm.hypervisor_id)
+
+    await run_in_threadpool(record)
+    return result
+
+class BulkPowerRequest(BaseModel):
+    # Database ids
+    vm_ids: List[int]
+
+@router.post("/bulk/{action}", response_model=Any)
+async def bulk_power_vms(
+    action: Literal["start", "stop", "shutdown"],
+    bulk_in: BulkPowerRequest,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Start, stop or shut down many VMs (database ids) in one request.
+    Returns one result per VM with its task UPID; failures don't abort the rest.
+    """
+    if current_user.role == models.UserRole.BUSINESS_ADMIN:
+        raise HTTPException(status_code=403, detail="Business Admins cannot perform actions")
+    if len(bulk_in.vm_ids) > settings.POWER_BULK_MAX_VMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.POWER_BULK_MAX_VMS} VMs per request")
+
+    vms = await run_in_threadpool(
+        lambda: db.query(models.VirtualMachine).options(joinedload(models.VirtualMachine.hypervisor)).filter(
+            models.VirtualMachine.id.in_(bulk_in.vm_ids)
+        ).all()
     )
-    db.add(vm)
-    db.commit()
-    
+    if len(vms) != len(set(bulk_in.vm_ids)):
+        raise HTTPException(status_code=404, detail="VM not found")
+    if current_user.role == models.UserRole.STUDENT and any(vm.owner_id != current_user.id for vm in vms):
+        raise HTTPException(status_code=403, detail=f"Not authorized to {action} these VMs")
+
+    result = await bulk_power(vms, action)
+    if action == "start":
+        await run_in_threadpool(clear_idle, db, [r["id"] for r in result["results"] if r["status"] == "ok"])
     return result
 
 @router.post("/{vm_id}/start", response_model=Any)
-def start_vm(
+async def start_vm(
     vm_id: str,
+    hypervisor_id: Optional[int] = None,
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     if current_user.role == models.UserRole.BUSINESS_ADMIN:
         raise HTTPException(status_code=403, detail="Business Admins cannot perform actions")
         
-    vm = db.query(models.VirtualMachine).filter(models.VirtualMachine.vm_id == int(vm_id)).first()
+    vm = await run_in_threadpool(get_vm_by_vmid, db, vm_id, hypervisor_id)
     if not vm:
         raise HTTPException(status_code=404, detail="VM not found")
         
     if current_user.role == models.UserRole.STUDENT and vm.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to start this VM")
         
-    client = HypervisorManager.get_client()
-    success = client.start_vm(vm_id)
+    client = HypervisorManager.get_async_client_for_vm(vm)
+    # A hibernated VM resumes from its saved state on a plain start
+    success = await client.start_vm(vm_id)
     if not success:
         raise HTTPException(status_code=400, detail="Failed to start VM")
+    if vm.idle_action:
+        hibernated = vm.idle_action == "hibernate"
+        await run_in_threadpool(clear_idle, db, [vm.id])
+        if hibernated:
+            return {"message": "VM resumed from hibernation"}
     return {"message": "VM started"}
 
 @router.post("/{vm_id}/stop", response_model=Any)
-def stop_vm(
+async def stop_vm(
     vm_id: str,
+    hypervisor_id: Optional[int] = None,
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     if current_user.role == models.UserRole.BUSINESS_ADMIN:
         raise HTTPException(status_code=403, detail="Business Admins cannot perform actions")
 
-    vm = db.query(models.VirtualMachine).filter(models.VirtualMachine.vm_id == int(vm_id)).first()
+    vm = await run_in_threadpool(get_vm_by_vmid, db, vm_id, hypervisor_id)
     if not vm:
         raise HTTPException(status_code=404, detail="VM not found")
         
     if current_user.role == models.UserRole.STUDENT and vm.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to stop this VM")
 
-    client = HypervisorManager.get_client()
-    success = client.stop_vm(vm_id)
+    client = HypervisorManager.get_async_client_for_vm(vm)
+    success = await client.stop_vm(vm_id)
     if not success:
         raise HTTPException(status_code=400, detail="Failed to stop VM")
     return {"message": "VM stopped"}
 
 @router.post("/{vm_id}/shutdown", response_model=Any)
-def shutdown_vm(
+async def shutdown_vm(
     vm_id: str,
+    hypervisor_id: Optional[int] = None,
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     if current_user.role == models.UserRole.BUSINESS_ADMIN:
         raise HTTPException(status_code=403, detail="Business Admins cannot perform actions")
 
-    vm = db.query(models.VirtualMachine).filter(models.VirtualMachine.vm_id == int(vm_id)).first()
+    vm = await run_in_threadpool(get_vm_by_vmid, db, vm_id, hypervisor_id)
     if not vm:
         raise HTTPException(status_code=404, detail="VM not found")
         
     if current_user.role == models.UserRole.STUDENT and vm.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to shutdown this VM")
 
-    client = HypervisorManager.get_client()
-    success = client.shutdown_vm(vm_id)
+    client = HypervisorManager.get_async_client_for_vm(vm)
+    success = await client.shutdown_vm(vm_id)
     if not success:
         raise HTTPException(status_code=400, detail="Failed to shutdown VM")
     return {"message": "VM shutdown initiated"}
 
 @router.get("/{vm_id}/stats", response_model=Any)
-def get_vm_stats(
+async def get_vm_stats(
     vm_id: str,
+    hypervisor_id: Optional[int] = None,
+    db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get real-time stats and cost estimation for a VM.
     """
-    client = HypervisorManager.get_client()
-    stats = client.get_vm_stats(vm_id)
+    vm = await run_in_threadpool(get_vm_by_vmid, db, vm_id, hypervisor_id)
+    if vm:
+        client = HypervisorManager.get_async_client_for_vm(vm)
+    else:
+        # Not one of ours (e.g. a template): look it up on the default cluster
+        client = HypervisorManager.get_async_client()
+    stats = await client.get_vm_stats(vm_id)
     
     if stats.get("status") == "error":
         raise HTTPException(status_code=404, detail=stats.get("details"))
         
-    # Temporary cost calculation model that will need to be replaced with the actual model in the future
-    details = client.get_vm_details(vm_id)
-    config = details.get("config", {})
-    
-    cores = int(config.get("cores", 1))
-    memory_mb = int(config.get("memory", 1024))
-    memory_gb = memory_mb / 1024
-    
-    monthly_cost = (cores * 5.0) + (memory_gb * 2.0)
-    
-    stats["cost_estimate"] = {
-        "monthly_usd": round(monthly_cost, 2),
-        "breakdown": f"${cores*5} (CPU) + ${round(memory_gb*2, 2)} (RAM)"
-    }
-    
-    return stats
+    # The status call already has cpus / maxmem, no need for a second config read
+    return stats_with_cost(stats)
+
+def _can_view_vm(user: models.User, vm: models.VirtualMachine) -> bool:
+    if user.role in [models.UserRole.SYS_ADMIN, models.UserRole.BUSINESS_ADMIN] or vm.owner_id == user.id:
+        return True
+    course = vm.course
+    if not course:
+        return False
+    if user.role == models.UserRole.PROFESSOR:
+        return course.professor_id == user.id
+    if user.role == models.UserRole.ASSISTANT:
+        return user in course.assistants
+    return False
+
+@router.get("/stats/stream")
+async def stream_vm_stats(
+    request: Request,
+    vm_ids: List[int] = Query(...),
+    interval: float = 5.0,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Server-sent events with live stats of one or more VMs (database ids),
+    every `interval` seconds. Each event is a JSON list with one entry per VM.
+    Viewers share one sampler, so watching a VM costs no extra Proxmox calls.
+    """
+    if len(vm_ids) > settings.LIVE_STATS_MAX_VMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.LIVE_STATS_MAX_VMS} VMs per stream")
+
+    def load():
+        vms = db.query(models.VirtualMachine).options(joinedload(models.VirtualMachine.hypervisor)).filter(
+            models.VirtualMachine.id.in_(vm_ids)
+        ).all()
+        if len(vms) != len(set(vm_ids)):
+            raise HTTPException(status_code=404, detail="VM not found")
+        if not all(_can_view_vm(current_user, vm) for vm in vms):
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        return vms
+
+    vms = await run_in_threadpool(load)
+
+    subscription = sampler.subscribe(vms, interval)
+    # Don't hold a DB connection for the lifetime of the stream
+    db.close()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    batch = await asyncio.wait_for(subscription.queue.get(), subscription.interval + settings.PROXMOX_FANOUT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    # Keep proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: stats\ndata: {json.dumps(batch)}\n\n"
+        finally:
+            sampler.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @router.post("/{vm_id}/console", response_model=Any)
-def get_vm_console(
+async def get_vm_console(
     vm_id: int,
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
@@ -248,23 +400,28 @@ def get_vm_console(
     """
     Get NoVNC console ticket for a VM.
     """
-    vm = db.query(models.VirtualMachine).filter(models.VirtualMachine.id == vm_id).first()
-    if not vm:
-        raise HTTPException(status_code=404, detail="VM not found")
+    def load():
+        vm = db.query(models.VirtualMachine).options(joinedload(models.VirtualMachine.hypervisor)).filter(
+            models.VirtualMachine.id == vm_id
+        ).first()
+        if not vm:
+            raise HTTPException(status_code=404, detail="VM not found")
+
+        if current_user.role not in [models.UserRole.SYS_ADMIN, models.UserRole.BUSINESS_ADMIN]:
+            if vm.owner_id != current_user.id:
+                course = vm.course
+                if current_user.role == models.UserRole.PROFESSOR and course.professor_id == current_user.id:
+                    pass
+                elif current_user.role == models.UserRole.ASSISTANT and current_user in course.assistants:
+                    pass
+                else:
+                    raise HTTPException(status_code=403, detail="Not enough permissions")
+        return vm
 
-    if current_user.role not in [models.UserRole.SYS_ADMIN, models.UserRole.BUSINESS_ADMIN]:
-        if vm.owner_id != current_user.id:
-            course = vm.course
-            if current_user.role == models.UserRole.PROFESSOR and course.professor_id == current_user.id:
-                pass
-            elif current_user.role == models.UserRole.ASSISTANT and current_user in course.assistants:
-                pass
-            else:
-                raise HTTPException(status_code=403, detail="Not enough permissions")
-
-    client = HypervisorManager.get_client()
+    vm = await run_in_threadpool(load)
+    client = HypervisorManager.get_async_client_for_vm(vm)
     try:
-        ticket_data = client.get_console_ticket(vm.vm_id)
+        ticket_data = await client.get_console_ticket(vm.vm_id)
         host = ticket_data['host']
         if ":" not in host:
              host = f"{host}:8006"
@@ -284,9 +441,11 @@ class TemplateBuildRequest(BaseModel):
     cpu: int = 2
     memory: int = 2048
     disk_size: str = "32G"
+    # Cluster to build on; the default one when omitted
+    hypervisor_id: Optional[int] = None
 
 @router.post("/templates/build", response_model=Any)
-def build_template_vm(
+async def build_template_vm(
     build_in: TemplateBuildRequest,
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
@@ -298,35 +457,56 @@ def build_template_vm(
     if current_user.role != models.UserRole.SYS_ADMIN:
         raise HTTPException(status_code=403, detail="Only SysAdmins can build templates")
 
-    client = HypervisorManager.get_client()
+    hypervisor = None
+    if build_in.hypervisor_id is not None:
+        hypervisor = await run_in_threadpool(
+            lambda: db.query(models.Hypervisor).filter(models.Hypervisor.id == build_in.hypervisor_id).first()
+        )
+        if not hypervisor:
+            raise HTTPException(status_code=404, detail="Hypervisor not found")
+    client = HypervisorManager.get_async_client(hypervisor)
+    vmid_pool = build_in.hypervisor_id or 0
+    vmid = None
     try:
-        result = client.create_vm_from_iso(
+        # Reserved like clones so cluster/nextid can't hand out an ID a
+        # concurrent provisioning run already holds
+        inventory = await client.get_inventory()
+        vmid = (await run_in_threadpool(reserve_vmids, db, 1, inventory.used_vmids(), vmid_pool))[0]
+        result = await client.create_vm_from_iso(
             name=build_in.name,
             iso_file=build_in.iso_file,
             config={
+                "vmid": vmid,
                 "cpu": build_in.cpu,
                 "memory": build_in.memory,
                 "disk_size": build_in.disk_size
             }
         )
-        
-        vm = models.VirtualMachine(
-            name=build_in.name,
-            owner_id=current_user.id,
-            vm_id=result.get("vmid"),
-            course_id=None, 
-            status="draft_template",
-            details={"node": result.get("node"), "iso": build_in.iso_file}
-        )
-        db.add(vm)
-        db.commit()
-        
+
+        def record():
+            mark_used(db, vmid, vmid_pool)
+            vm = models.VirtualMachine(
+                name=build_in.name,
+                owner_id=current_user.id,
+                vm_id=result.get("vmid"),
+                hypervisor_id=build_in.hypervisor_id,
+                course_id=None, 
+                status="draft_template",
+                details={"node": result.get("node"), "iso": build_in.iso_file}
+            )
+            db.add(vm)
+            db.commit()
+            register_task(db, result.get("upid"), "create", vm=vm, hypervisor_id=vm.hypervisor_id)
+
+        await run_in_threadpool(record)
         return result
     except Exception as e:
+        if vmid:
+            await run_in_threadpool(release, db, [vmid], vmid_pool)
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/templates/{vm_id}/finalize", response_model=Any)
-def finalize_template(
+async def finalize_template(
     vm_id: int,
     db: Session = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
@@ -338,16 +518,40 @@ def finalize_template(
     if current_user.role != models.UserRole.SYS_ADMIN:
         raise HTTPException(status_code=403, detail="Only SysAdmins can finalize templates")
 
-    vm = db.query(models.VirtualMachine).filter(models.VirtualMachine.id == vm_id).first()
+    # DB work runs in the threadpool; keep the VM readable here after those
+    # commits instead of reloading it on the event loop
+    db.expire_on_commit = False
+    vm = await run_in_threadpool(
+        lambda: db.query(models.VirtualMachine).options(joinedload(models.VirtualMachine.hypervisor)).filter(
+            models.VirtualMachine.id == vm_id
+        ).first()
+    )
     if not vm:
         raise HTTPException(status_code=404, detail="VM not found")
 
-    client = HypervisorManager.get_client()
+    client = HypervisorManager.get_async_client_for_vm(vm)
     try:
-        success = client.convert_to_template(vm.vm_id)
+        # Stop first and wait on the stop task through the tracker
+        stats = await client.get_vm_stats(vm.vm_id)
+        if stats.get("status") != "stopped":
+            upid = await client.power_action(vm.vm_id, "stop")
+            await run_in_threadpool(register_task, db, upid, "stop", vm=vm, hypervisor_id=vm.hypervisor_id)
+            try:
+                await tracker.wait(upid, settings.TEMPLATE_STOP_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                raise Exception("VM did not stop in time")
+
+        success = await client.convert_to_template(vm.vm_id)
         if success:
             vm.status = "template"
-            db.commit()
+            await run_in_threadpool(db.commit)
+            details = await client.get_vm_details(vm.vm_id)
+            if details:
+                await run_in_threadpool(
+                    upsert_template, db, vm.vm_id, vm.name, details["node"], details.get("config", {}),
+                    source_iso=(vm.details or {}).get("iso"), hypervisor_id=vm.hypervisor_id
+                )
+            catalog.invalidate("templates", vm.hypervisor)
             return {"message": "VM converted to template successfully"}
         else:
             raise Exception("Hypervisor failed to convert")
@@ -23,6 +23,102 @@ class Settings(BaseSettings):
     PROXMOX_USER: str = "root@pam"
     PROXMOX_PASSWORD: str = "password1!"
     PROXMOX_VERIFY_SSL: bool = False
+    # Proxmox tickets expire after 2h; pooled clients renew them before that
+    PROXMOX_TICKET_RENEW_SECONDS: int = 6600
+    # Upper bound on concurrent HTTP connections per async Proxmox client
+    PROXMOX_MAX_CONNECTIONS: int = 100
+    # Per-node / per-storage fan-out: max parallel calls and per-call timeout (s)
+    PROXMOX_FANOUT_WORKERS: int = 8
+    PROXMOX_FANOUT_TIMEOUT: float = 10.0
+    # Per-call deadline (s) and how long to wait for a TCP connection
+    PROXMOX_CALL_TIMEOUT: float = 10.0
+    PROXMOX_CONNECT_TIMEOUT: float = 3.0
+    # Reads failing because a node is unreachable are retried with jittered backoff
+    PROXMOX_READ_RETRIES: int = 2
+    PROXMOX_RETRY_BASE_DELAY: float = 0.2
+    PROXMOX_RETRY_MAX_DELAY: float = 2.0
+    # Per-node circuit breaker: open after N failures, probe again after M seconds
+    PROXMOX_BREAKER_FAILURES: int = 3
+    PROXMOX_BREAKER_RESET_SECONDS: float = 30.0
+    # Deadline (s) for one cluster's answer when fanning out over all hypervisors
+    HYPERVISOR_FANOUT_TIMEOUT: float = 20.0
+
+    # Node placement of new VMs: spread, pack or least-loaded ("" keeps the template/ISO node)
+    PLACEMENT_STRATEGY: str = "spread"
+    # Node/storage usage snapshot is reused this long (s) between placements
+    PLACEMENT_SNAPSHOT_SECONDS: float = 15.0
+    # Never plan a node's memory beyond this fraction
+    PLACEMENT_MAX_MEMORY_RATIO: float = 0.9
+
+    # Template / ISO catalog
+    CATALOG_REFRESH_SECONDS: int = 300
+    # How long a read waits on a refresh before serving the previous list
+    CATALOG_STALE_GRACE_SECONDS: float = 2.0
+
+    # VMID allocation / provisioning
+    VMID_MIN: int = 100
+    # A reservation not turned into a VM within this time is reclaimed
+    VMID_LEASE_SECONDS: int = 900
+    PROVISION_CONCURRENCY: int = 8
+
+    # Bulk power actions: overall and per-node actions in flight, VMs per request
+    POWER_CONCURRENCY: int = 32
+    POWER_NODE_CONCURRENCY: int = 4
+    POWER_BULK_MAX_VMS: int = 500
+
+    # List endpoints are keyset-paginated: rows per page by default and at most
+    PAGE_DEFAULT_LIMIT: int = 100
+    PAGE_MAX_LIMIT: int = 1000
+
+    # Name search: shortest query accepted, results per list by default and at most.
+    # pg_trgm indexes need 3 characters (one trigram) to serve ILIKE '%q%'
+    SEARCH_MIN_CHARS: int = 3
+    SEARCH_DEFAULT_LIMIT: int = 20
+    SEARCH_MAX_LIMIT: int = 100
+
+    # Idle VM policy (thresholds are per course): check interval, and the share
+    # of the window's 1-minute samples that must exist to judge a VM idle
+    IDLE_CHECK_SECONDS: float = 300.0
+    IDLE_MIN_COVERAGE: float = 0.75
+
+    # Hypervisor task tracking
+    TASK_POLL_SECONDS: float = 2.0
+    TEMPLATE_STOP_TIMEOUT_SECONDS: float = 120.0
+    # Task logs are read incrementally: lines per request, recent lines kept
+    # per task for pollers/streams, and how long an unread cursor is kept
+    TASK_LOG_PAGE_LINES: int = 500
+    TASK_LOG_BUFFER_LINES: int = 200
+    TASK_LOG_IDLE_SECONDS: float = 600.0
+    # Task streams give up after this many polls in a row with an unknown
+    # status (expired or foreign UPID), or after this long in total
+    TASK_STREAM_MAX_UNKNOWN_POLLS: int = 15
+    TASK_STREAM_MAX_SECONDS: float = 21600.0
+
+    # Background guest-agent IP resolution
+    IP_REFRESH_SECONDS: float = 30.0
+    # An IP older than this is looked up again
+    IP_TTL_SECONDS: float = 300.0
+    IP_BATCH_CONCURRENCY: int = 20
+
+    # VM status / usage columns are reconciled with the clusters this often (s)
+    RECONCILE_SECONDS: float = 15.0
+
+    # Usage history (rrddata): pulled every N seconds (rrddata keeps the last
+    # hour at 1-minute resolution), raw samples kept a day, 15-minute roll-ups a month
+    METRICS_INGEST_SECONDS: float = 300.0
+    METRICS_RAW_RETENTION_HOURS: int = 24
+    METRICS_ROLLUP_RETENTION_DAYS: int = 30
+    # Finished buckets younger than this are (re)checked for roll-up on each pass
+    METRICS_ROLLUP_LOOKBACK_SECONDS: int = 7200
+
+    # Live stats streams: shared sampling tick (s), also the shortest interval a viewer can ask for
+    LIVE_STATS_TICK_SECONDS: float = 2.0
+    LIVE_STATS_MAX_VMS: int = 200
+
+    # Analytics report: rebuilt in the background every N seconds; requests
+    # only wait on a rebuild once the report is older than the TTL
+    ANALYTICS_REFRESH_SECONDS: float = 20.0
+    ANALYTICS_TTL_SECONDS: float = 60.0
 
     class Config:
         case_sensitive = True
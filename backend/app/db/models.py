@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Enum as SQLEnum, JSON, DateTime, Table
+from sqlalchemy import BigInteger, Boolean, Column, DDL, Float, ForeignKey, Index, Integer, String, Enum as SQLEnum, JSON, DateTime, Table, UniqueConstraint, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -15,6 +15,18 @@ class HypervisorType(str, enum.Enum):
     PROXMOX = "proxmox"
     
 
+# Search (see app/db/search.py) matches names with ILIKE '%q%'; on Postgres
+# trigram GIN indexes make that an index scan instead of a full table scan
+event.listen(
+    Base.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+def trigram_index(name: str, column: str) -> Index:
+    return Index(
+        name, column, postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"}
+    ).ddl_if(dialect="postgresql")
+
 # Association Tables
 student_courses = Table('student_courses', Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id')),
@@ -28,6 +40,10 @@ assistant_courses = Table('assistant_courses', Base.metadata,
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        trigram_index("ix_users_email_trgm", "email"),
+        trigram_index("ix_users_username_trgm", "username"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
@@ -46,14 +62,27 @@ class User(Base):
 
 class Course(Base):
     __tablename__ = "courses"
+    __table_args__ = (trigram_index("ix_courses_name_trgm", "name"),)
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     description = Column(String)
     professor_id = Column(Integer, ForeignKey("users.id"))
     template_id = Column(Integer, nullable=True) 
+    # "full" copies the template disk, "linked" shares it copy-on-write
+    clone_mode = Column(String, default="full", server_default="full", nullable=False)
+    # Cluster the course's template lives on and its VMs are cloned to (None = default)
+    hypervisor_id = Column(Integer, ForeignKey("hypervisors.id"), nullable=True)
+    # Idle VM policy: "off", "hibernate" (suspend to disk) or "shutdown" once a
+    # running VM stayed under both thresholds for idle_minutes
+    idle_action = Column(String, default="off", server_default="off", nullable=False)
+    idle_minutes = Column(Integer, default=60, server_default=text("60"), nullable=False)
+    idle_cpu_percent = Column(Float, default=5.0, server_default=text("5.0"), nullable=False)
+    # Network threshold in kilobits per second (in + out)
+    idle_net_kbps = Column(Float, default=80.0, server_default=text("80.0"), nullable=False)
     
     professor = relationship("User", back_populates="owned_courses")
+    hypervisor = relationship("Hypervisor")
     students = relationship("User", secondary=student_courses, back_populates="enrolled_courses")
     assistants = relationship("User", secondary=assistant_courses, back_populates="assisting_courses")
     vms = relationship("VirtualMachine", back_populates="course")
@@ -71,8 +100,90 @@ class Hypervisor(Base):
 
     vms = relationship("VirtualMachine", back_populates="hypervisor")
 
+class Template(Base):
+    __tablename__ = "templates"
+
+    # Where each Proxmox template lives, so cloning doesn't have to scan nodes
+    id = Column(Integer, primary_key=True, index=True)
+    vm_id = Column(Integer, index=True, nullable=False)
+    name = Column(String)
+    node = Column(String, nullable=False)
+    storage = Column(String)
+    disk_size = Column(String)
+    disk_format = Column(String)
+    os_type = Column(String)
+    source_iso = Column(String)
+    hypervisor_id = Column(Integer, ForeignKey("hypervisors.id"), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    hypervisor = relationship("Hypervisor")
+
+class MetricSample(Base):
+    __tablename__ = "metric_samples"
+
+    # Usage history from Proxmox rrddata. resolution is the bucket size in
+    # seconds: 60 for raw samples (kept a day), 900 for roll-ups (kept a month)
+    id = Column(Integer, primary_key=True, index=True)
+    # "vm:<virtual_machines.id>" or "node:<hypervisor id or 0>:<node>"
+    subject = Column(String, nullable=False)
+    kind = Column(String, nullable=False)
+    hypervisor_id = Column(Integer, ForeignKey("hypervisors.id"), nullable=True)
+    node = Column(String, nullable=False)
+    vm_id = Column(Integer, ForeignKey("virtual_machines.id", ondelete="CASCADE"), nullable=True, index=True)
+    resolution = Column(Integer, nullable=False)
+    ts = Column(DateTime(timezone=True), nullable=False)
+
+    cpu = Column(Float)
+    cpu_max = Column(Float)
+    mem = Column(BigInteger)
+    mem_max = Column(BigInteger)
+    maxmem = Column(BigInteger)
+    # Bytes per second, averaged over the bucket
+    netin = Column(Float)
+    netout = Column(Float)
+    diskread = Column(Float)
+    diskwrite = Column(Float)
+
+    __table_args__ = (
+        # Also serves range queries (subject, resolution, ts between ...)
+        UniqueConstraint("subject", "resolution", "ts", name="uq_metric_sample"),
+    )
+
+class VMIDReservation(Base):
+    __tablename__ = "vmid_reservations"
+    # One row per VMID handed out to a clone that hasn't shown up in the cluster yet.
+    # The unique constraint is what makes concurrent allocators collision free.
+    __table_args__ = (UniqueConstraint("hypervisor_id", "vm_id", name="uq_vmid_reservation"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    vm_id = Column(Integer, nullable=False)
+    # 0 = the default cluster from settings, otherwise hypervisors.id
+    hypervisor_id = Column(Integer, nullable=False, default=0)
+    state = Column(String, default="reserved")
+    lease_expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class HypervisorTask(Base):
+    __tablename__ = "hypervisor_tasks"
+
+    # Proxmox tasks (clone, create, download...) we wait on; see app/services/tasks.py
+    id = Column(Integer, primary_key=True, index=True)
+    upid = Column(String, unique=True, index=True, nullable=False)
+    node = Column(String)
+    kind = Column(String, nullable=False)
+    status = Column(String, default="running", index=True)
+    exit_status = Column(String)
+    hypervisor_id = Column(Integer, ForeignKey("hypervisors.id"), nullable=True)
+    vm_id = Column(Integer, ForeignKey("virtual_machines.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    hypervisor = relationship("Hypervisor")
+    vm = relationship("VirtualMachine")
+
 class VirtualMachine(Base):
     __tablename__ = "virtual_machines"
+    __table_args__ = (trigram_index("ix_virtual_machines_name_trgm", "name"),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -89,3 +200,18 @@ class VirtualMachine(Base):
     
     details = Column(JSON, default={})
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Last state seen in the cluster, kept current by the status reconciler
+    node = Column(String, nullable=True)
+    cpu_usage = Column(Float, nullable=True)
+    cpus = Column(Integer, nullable=True)
+    memory_used = Column(BigInteger, nullable=True)
+    memory_total = Column(BigInteger, nullable=True)
+    uptime = Column(Integer, nullable=True)
+    # When the reconciler last changed any of the columns above
+    synced_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Set when the idle policy hibernated / shut the VM down, cleared on start
+    idle_action = Column(String, nullable=True)
+    idle_reason = Column(String, nullable=True)
+    idle_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,240 @@
+import base64
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+from sqlalchemy import case, false, func, literal, select, tuple_, union_all
+from sqlalchemy.orm import Query, Session
+from app.db import models
+
+# Read-side queries for list endpoints: role scoping, joins and column
+# projection happen in SQL, and results are plain dicts rather than ORM
+# objects, so listing N rows is one query instead of 1 + lazy loads per row.
+
+VM = models.VirtualMachine
+
+class Page(list):
+    """
+    One page of a list endpoint. Behaves like the plain list callers always
+    got, plus `total` (rows matching the filters) and `next_cursor` (None on
+    the last page).
+    """
+    def __init__(self, items=(), total: int = 0, next_cursor: Optional[str] = None):
+        super().__init__(items)
+        self.total = total
+        self.next_cursor = next_cursor
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Raises InvalidCursor for anything encode_cursor didn't produce."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+def _cursor_value(value: Any, key: Any) -> Any:
+    """A cursor value as its key column's Python type; InvalidCursor if it isn't one."""
+    if value is None or isinstance(value, (bool, list, dict)):
+        raise InvalidCursor("Invalid cursor")
+    python_type = key.type.python_type
+    try:
+        coerced = python_type(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor")
+    if isinstance(value, float) and coerced != value:
+        raise InvalidCursor("Invalid cursor")
+    return coerced
+
+def paginate(query: Query, keys: Sequence[Any], key_of: Callable[[Any], Sequence[Any]],
+             after: Optional[List[Any]], limit: int, row: Callable[[Any], Any] = lambda r: r) -> Page:
+    """
+    Keyset pagination: order by `keys` (unique together, ascending) and
+    return the `limit` rows after the `after` key values; key_of(row) gives
+    those values for a fetched row, row(row) what the page holds. Each page is an index range scan however
+    deep it is, unlike OFFSET. The total is a single COUNT over the same filters.
+    `after` must hold one value per key, of the key's type (InvalidCursor
+    otherwise), so a forged cursor never reaches the database.
+    """
+    if after is not None:
+        if len(after) != len(keys):
+            raise InvalidCursor("Invalid cursor")
+        after = [_cursor_value(v, key) for v, key in zip(after, keys)]
+    total = query.order_by(None).count()
+    if after is not None:
+        query = query.filter(tuple_(*keys) > tuple_(*[literal(v, key.type) for v, key in zip(after, keys)]))
+    rows = query.order_by(*keys).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key_of(rows[-1]))
+    return Page([row(r) for r in rows], total, next_cursor)
+
+VM_LIST_COLUMNS = (
+    VM.id, VM.name, VM.vm_id, VM.status, VM.details,
+    VM.node, VM.cpu_usage, VM.cpus, VM.memory_used, VM.memory_total, VM.uptime, VM.synced_at,
+    VM.idle_action, VM.idle_reason, VM.idle_at,
+)
+
+def scope_vms(query: Query, user: models.User) -> Query:
+    """
+    Restrict a VM query to what the user may see:
+    - SYS_ADMIN / BUSINESS_ADMIN: All VMs
+    - PROFESSOR: VMs in owned courses
+    - ASSISTANT: VMs in assisted courses
+    - STUDENT: Only own VMs
+    """
+    if user.role in [models.UserRole.SYS_ADMIN, models.UserRole.BUSINESS_ADMIN]:
+        return query
+    if user.role == models.UserRole.PROFESSOR:
+        return query.filter(models.Course.professor_id == user.id)
+    if user.role == models.UserRole.ASSISTANT:
+        assisted = select(models.assistant_courses.c.course_id).where(models.assistant_courses.c.user_id == user.id)
+        return query.filter(VM.course_id.in_(assisted))
+    return query.filter(VM.owner_id == user.id)
+
+def vm_list_query(db: Session, user: models.User) -> Query:
+    """Role-scoped VMs with owner email and course name, in one joined, projected query."""
+    query = db.query(
+        *VM_LIST_COLUMNS,
+        models.User.email.label("owner_email"),
+        models.Course.name.label("course_name"),
+    ).outerjoin(models.User, VM.owner_id == models.User.id).outerjoin(models.Course, VM.course_id == models.Course.id)
+    return scope_vms(query, user)
+
+def vm_row(row: Any) -> Dict[str, Any]:
+    """A projected VM row as the VMResponse-shaped dict list endpoints return."""
+    data = dict(row._mapping)
+    data["details"] = data["details"] or {}
+    # Kept fresh by the background IP resolver
+    data["ip_address"] = data["details"].get("ip")
+    return data
+
+def list_vms(db: Session, user: models.User, after: Optional[List[Any]], limit: int,
+             status: Optional[str] = None, course_id: Optional[int] = None, owner_id: Optional[int] = None) -> Page:
+    query = vm_list_query(db, user)
+    if status is not None:
+        query = query.filter(VM.status == status)
+    if course_id is not None:
+        query = query.filter(VM.course_id == course_id)
+    if owner_id is not None:
+        query = query.filter(VM.owner_id == owner_id)
+    return paginate(query, [VM.id], lambda r: [r.id], after, limit, row=vm_row)
+
+def list_users(db: Session, after: Optional[List[Any]], limit: int,
+               role: Optional[str] = None, is_active: Optional[bool] = None) -> Page:
+    query = db.query(models.User)
+    if role:
+        query = query.filter(models.User.role == role)
+    if is_active is not None:
+        query = query.filter(models.User.is_active == is_active)
+    return paginate(query, [models.User.id], lambda u: [u.id], after, limit)
+
+def scope_courses(query: Query, user: models.User) -> Query:
+    """Restrict a Course query to the courses the user may see (see list_courses)."""
+    Course = models.Course
+    if user.role == models.UserRole.SYS_ADMIN:
+        return query
+    if user.role == models.UserRole.PROFESSOR:
+        return query.filter(Course.professor_id == user.id)
+    if user.role == models.UserRole.ASSISTANT:
+        return query.filter(Course.id.in_(
+            select(models.assistant_courses.c.course_id).where(models.assistant_courses.c.user_id == user.id)
+        ))
+    if user.role == models.UserRole.STUDENT:
+        return query.filter(Course.id.in_(
+            select(models.student_courses.c.course_id).where(models.student_courses.c.user_id == user.id)
+        ))
+    return query.filter(false())
+
+def list_courses(db: Session, user: models.User, after: Optional[List[Any]], limit: int,
+                 professor_id: Optional[int] = None) -> Page:
+    """
+    Courses the user may see:
+    - Students: Only enrolled courses.
+    - Assistants: Only assisting courses.
+    - Professors: Only owned courses.
+    - Sys Admin: All courses.
+    """
+    query = scope_courses(db.query(models.Course), user)
+    if professor_id is not None:
+        query = query.filter(models.Course.professor_id == professor_id)
+    return paginate(query, [models.Course.id], lambda c: [c.id], after, limit)
+
+ROSTER_ROLES = ("professor", "assistant", "student")
+
+def _members(course_id: int):
+    """(user_id, role) of everyone in a course, as one UNION ALL subquery."""
+    return union_all(
+        select(models.Course.professor_id.label("user_id"), literal("professor").label("role"))
+            .where(models.Course.id == course_id, models.Course.professor_id.isnot(None)),
+        select(models.assistant_courses.c.user_id, literal("assistant"))
+            .where(models.assistant_courses.c.course_id == course_id),
+        select(models.student_courses.c.user_id, literal("student"))
+            .where(models.student_courses.c.course_id == course_id),
+    ).subquery()
+
+def is_course_assistant(db: Session, course_id: int, user_id: int) -> bool:
+    return db.query(select(models.assistant_courses).where(
+        models.assistant_courses.c.course_id == course_id,
+        models.assistant_courses.c.user_id == user_id,
+    ).exists()).scalar()
+
+# Professor first, then assistants, then students
+_ROLE_RANK = {role: i for i, role in enumerate(ROSTER_ROLES)}
+
+def _roster_query(db: Session, course_id: int, roles: Iterable[str]):
+    """
+    People of a course with their VM in it, in one query: course members
+    outer-joined to their (first) VM of the course. Returns the query and
+    its ordering keys (role, username, id).
+    """
+    members = _members(course_id)
+    # Lowest VM id per owner, in case someone has more than one VM in the course
+    first_vm = select(VM.owner_id, func.min(VM.id).label("vm_id")).where(
+        VM.course_id == course_id
+    ).group_by(VM.owner_id).subquery()
+
+    query = db.query(
+        members.c.role, models.User.id, models.User.username, models.User.email,
+        VM.id.label("vm_id"), VM.name.label("vm_name"), VM.status.label("vm_status"), VM.details.label("vm_details"),
+    ).join(models.User, models.User.id == members.c.user_id).outerjoin(
+        first_vm, first_vm.c.owner_id == models.User.id
+    ).outerjoin(VM, VM.id == first_vm.c.vm_id).filter(
+        members.c.role.in_(list(roles))
+    )
+    keys = [case(_ROLE_RANK, value=members.c.role), models.User.username, models.User.id]
+    return query, keys
+
+def _roster_key(row: Any) -> List[Any]:
+    return [_ROLE_RANK[row.role], row.username, row.id]
+
+def _roster_row(row: Any) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "role": row.role,
+        "username": row.username,
+        "email": row.email,
+        "vm": {
+            "id": row.vm_id,
+            "name": row.vm_name,
+            "status": row.vm_status,
+            "ip": (row.vm_details or {}).get("ip"),
+        } if row.vm_id else None,
+    }
+
+def course_roster(db: Session, course_id: int, roles: Iterable[str] = ROSTER_ROLES) -> List[Dict[str, Any]]:
+    """The whole roster, ordered by role then username."""
+    query, keys = _roster_query(db, course_id, roles)
+    return [_roster_row(row) for row in query.order_by(*keys)]
+
+def course_roster_page(db: Session, course_id: int, after: Optional[List[Any]], limit: int,
+                       roles: Iterable[str] = ("student",), row: Callable[[Any], Any] = _roster_row) -> Page:
+    query, keys = _roster_query(db, course_id, roles)
+    return paginate(query, keys, _roster_key, after, limit, row=row)
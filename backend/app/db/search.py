@@ -0,0 +1,69 @@
+from typing import Any, Dict, List
+from sqlalchemy import case, func, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.db import models, repository
+
+# Case-insensitive name search for support lookups. Matching is ILIKE
+# '%q%', which the trigram GIN indexes declared on the models serve on
+# Postgres; results are ranked exact match, then prefix, then substring,
+# shorter names first, and capped at `limit`.
+
+SEARCH_INDEXED = (models.User, models.Course, models.VirtualMachine)
+
+def ensure_indexes(engine: Engine):
+    """
+    create_all only indexes tables it creates: add the trigram indexes (and
+    pg_trgm) to existing Postgres databases too. No-op on other databases.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for model in SEARCH_INDEXED:
+            for index in model.__table__.indexes:
+                if index.name.endswith("_trgm"):
+                    index.create(conn, checkfirst=True)
+
+# "!" rather than a backslash: no string-literal quoting differences to worry about
+_ESCAPE = "!"
+
+def _escape(q: str) -> str:
+    return q.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+def _matches(column, q: str):
+    return column.ilike(f"%{_escape(q)}%", escape=_ESCAPE)
+
+def _rank(q: str, *columns):
+    """0 if any column equals q, 1 if one starts with it, else 2 (lower is better)."""
+    return case(
+        *[(func.lower(c) == q.lower(), 0) for c in columns],
+        *[(c.ilike(f"{_escape(q)}%", escape=_ESCAPE), 1) for c in columns],
+        else_=2,
+    )
+
+def search_users(db: Session, q: str, limit: int) -> List[Dict[str, Any]]:
+    User = models.User
+    rows = db.query(User.id, User.username, User.email, User.role, User.is_active).filter(
+        _matches(User.username, q) | _matches(User.email, q)
+    ).order_by(_rank(q, User.username, User.email), func.length(User.username), User.id).limit(limit)
+    return [
+        {"id": r.id, "username": r.username, "email": r.email, "role": r.role, "is_active": r.is_active}
+        for r in rows
+    ]
+
+def search_vms(db: Session, user: models.User, q: str, limit: int) -> List[Dict[str, Any]]:
+    """Role-scoped like GET /vms/; rows come from the same projected query."""
+    VM = models.VirtualMachine
+    rows = repository.vm_list_query(db, user).filter(_matches(VM.name, q)).order_by(
+        _rank(q, VM.name), func.length(VM.name), VM.id
+    ).limit(limit)
+    return [repository.vm_row(r) for r in rows]
+
+def search_courses(db: Session, user: models.User, q: str, limit: int) -> List[Dict[str, Any]]:
+    Course = models.Course
+    query = db.query(Course.id, Course.name, Course.description, Course.professor_id)
+    rows = repository.scope_courses(query, user).filter(_matches(Course.name, q)).order_by(
+        _rank(q, Course.name), func.length(Course.name), Course.id
+    ).limit(limit)
+    return [dict(r._mapping) for r in rows]
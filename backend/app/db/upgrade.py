@@ -0,0 +1,57 @@
+from sqlalchemy import Column, inspect, text
+from sqlalchemy.engine import Engine
+from app.db import models
+
+# create_all only creates missing tables, never missing columns: columns
+# added to tables that already exist in deployed databases are listed here
+# and added at startup by ensure_columns. NOT NULL ones need a
+# server_default so the ALTER works on tables that already have rows.
+
+ADDED_COLUMNS = [
+    # Linked clones
+    models.Course.__table__.c.clone_mode,
+    models.Template.__table__.c.disk_format,
+    # Per-course hypervisor
+    models.Course.__table__.c.hypervisor_id,
+    # Cluster state cached by the status reconciler
+    models.VirtualMachine.__table__.c.node,
+    models.VirtualMachine.__table__.c.cpu_usage,
+    models.VirtualMachine.__table__.c.cpus,
+    models.VirtualMachine.__table__.c.memory_used,
+    models.VirtualMachine.__table__.c.memory_total,
+    models.VirtualMachine.__table__.c.uptime,
+    models.VirtualMachine.__table__.c.synced_at,
+    # Idle VM policy
+    models.Course.__table__.c.idle_action,
+    models.Course.__table__.c.idle_minutes,
+    models.Course.__table__.c.idle_cpu_percent,
+    models.Course.__table__.c.idle_net_kbps,
+    models.VirtualMachine.__table__.c.idle_action,
+    models.VirtualMachine.__table__.c.idle_reason,
+    models.VirtualMachine.__table__.c.idle_at,
+]
+
+def _column_ddl(engine: Engine, column: Column) -> str:
+    compiler = engine.dialect.ddl_compiler(engine.dialect, None)
+    ddl = compiler.get_column_specification(column)
+    for fk in column.foreign_keys:
+        ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+    return ddl
+
+def ensure_columns(engine: Engine):
+    """
+    ALTER TABLE ... ADD COLUMN for every ADDED_COLUMNS entry the database
+    doesn't have yet. Idempotent: existing columns are skipped (and Postgres
+    gets IF NOT EXISTS, in case several workers start at once).
+    """
+    inspector = inspect(engine)
+    existing = {}
+    if_not_exists = "IF NOT EXISTS " if engine.dialect.name == "postgresql" else ""
+    with engine.begin() as conn:
+        for column in ADDED_COLUMNS:
+            table = column.table.name
+            if table not in existing:
+                existing[table] = {c["name"] for c in inspector.get_columns(table)}
+            if column.name in existing[table]:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {if_not_exists}{_column_ddl(engine, column)}"))
@@ -1,13 +1,23 @@
 
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List
+from .inventory import ClusterInventory
 
 class HypervisorClient(ABC):
+    def ensure_session(self) -> bool:
+        """Refresh authentication on a pooled client before it is handed out"""
+        return True
+
     @abstractmethod
     def get_status(self) -> Dict[str, Any]:
         """Check if hypervisor is reachable"""
         pass
 
+    @abstractmethod
+    def get_inventory(self) -> ClusterInventory:
+        """Snapshot of all VMs and templates (status, usage, node) in one call"""
+        pass
+
     @abstractmethod
     def list_vms(self) -> List[Dict[str, Any]]:
         """List all VMs"""
@@ -23,11 +33,26 @@ class HypervisorClient(ABC):
         """Get details of a specific VM"""
         pass
 
+    @abstractmethod
+    def get_vm_ip(self, vm_id: str) -> str:
+        """Get the guest agent reported IPv4 of a VM"""
+        pass
+
     @abstractmethod
     def create_vm(self, name: str, config: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new VM"""
         pass
 
+    @abstractmethod
+    def update_vm_config(self, vm_id: str, **params) -> None:
+        """Set VM config options (cores, memory...) on the VM's node"""
+        pass
+
+    @abstractmethod
+    def power_action(self, vm_id: str, action: str, **params) -> str:
+        """Run a power action (start, stop, shutdown, suspend...) and return its Task UPID"""
+        pass
+
     @abstractmethod
     def start_vm(self, vm_id: str) -> bool:
         """Start a VM"""
@@ -48,6 +73,21 @@ class HypervisorClient(ABC):
         """Get system-wide analytics (e.g. total CPU/RAM usage of the cluster)"""
         pass
 
+    @abstractmethod
+    def list_nodes(self) -> List[Dict[str, Any]]:
+        """List cluster nodes with their online status"""
+        pass
+
+    @abstractmethod
+    def get_node_rrddata(self, node: str, timeframe: str = "hour") -> List[Dict[str, Any]]:
+        """Historical (RRD) usage samples of a node"""
+        pass
+
+    @abstractmethod
+    def get_vm_rrddata(self, vm_id: str, timeframe: str = "hour") -> List[Dict[str, Any]]:
+        """Historical (RRD) usage samples of a VM"""
+        pass
+
     @abstractmethod
     def get_vm_stats(self, vm_id: str) -> Dict[str, Any]:
         """Get real-time statistics for a specific VM (CPU, RAM, Uptime, etc)"""
@@ -70,7 +110,7 @@ class HypervisorClient(ABC):
 
     @abstractmethod
     def convert_to_template(self, vm_id: str) -> bool:
-        """Convert a VM to a template"""
+        """Convert a (stopped) VM to a template"""
         pass
 
     @abstractmethod
@@ -84,11 +124,159 @@ class HypervisorClient(ABC):
         pass
 
     @abstractmethod
-    def get_task_log(self, upid: str, node: str) -> List[str]:
-        """Get the log of a background task"""
+    def get_task_log(self, upid: str, node: str, start: int = 0, limit: int = 500) -> List[str]:
+        """Get up to `limit` lines of a task log, from line `start` (0-based) on"""
+        pass
+
+    @abstractmethod
+    def list_cluster_tasks(self) -> List[Dict[str, Any]]:
+        """Recent and running tasks of the whole cluster in one call"""
         pass
 
     @abstractmethod
     def cancel_task(self, upid: str, node: str) -> bool:
         """Cancel a background task"""
         pass
+
+class AsyncHypervisorClient(ABC):
+    """
+    asyncio counterpart of HypervisorClient, used by the async endpoints so
+    slow hypervisor calls don't hold a threadpool worker each.
+    """
+    async def ensure_session(self) -> bool:
+        """Refresh authentication on a pooled client before it is used"""
+        return True
+
+    async def aclose(self):
+        """Release pooled connections"""
+        pass
+
+    @abstractmethod
+    async def get_status(self) -> Dict[str, Any]:
+        """Check if hypervisor is reachable"""
+        pass
+
+    @abstractmethod
+    async def get_inventory(self) -> ClusterInventory:
+        """Snapshot of all VMs and templates (status, usage, node) in one call"""
+        pass
+
+    @abstractmethod
+    async def list_vms(self) -> List[Dict[str, Any]]:
+        """List all VMs"""
+        pass
+
+    @abstractmethod
+    async def list_templates(self) -> List[Dict[str, Any]]:
+        """List all available templates"""
+        pass
+
+    @abstractmethod
+    async def get_vm_details(self, vm_id: str) -> Dict[str, Any]:
+        """Get details of a specific VM"""
+        pass
+
+    @abstractmethod
+    async def get_vm_ip(self, vm_id: str) -> str:
+        """Get the guest agent reported IPv4 of a VM"""
+        pass
+
+    @abstractmethod
+    async def create_vm(self, name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new VM"""
+        pass
+
+    @abstractmethod
+    async def update_vm_config(self, vm_id: str, **params) -> None:
+        """Set VM config options (cores, memory...) on the VM's node"""
+        pass
+
+    @abstractmethod
+    async def power_action(self, vm_id: str, action: str, **params) -> str:
+        """Run a power action (start, stop, shutdown, suspend...) and return its Task UPID"""
+        pass
+
+    @abstractmethod
+    async def start_vm(self, vm_id: str) -> bool:
+        """Start a VM"""
+        pass
+
+    @abstractmethod
+    async def stop_vm(self, vm_id: str) -> bool:
+        """Stop a VM (Hard Stop)"""
+        pass
+
+    @abstractmethod
+    async def shutdown_vm(self, vm_id: str) -> bool:
+        """Shutdown a VM (Graceful)"""
+        pass
+
+    @abstractmethod
+    async def get_analytics(self) -> Dict[str, Any]:
+        """Get system-wide analytics (e.g. total CPU/RAM usage of the cluster)"""
+        pass
+
+    @abstractmethod
+    async def list_nodes(self) -> List[Dict[str, Any]]:
+        """List cluster nodes with their online status"""
+        pass
+
+    @abstractmethod
+    async def get_node_rrddata(self, node: str, timeframe: str = "hour") -> List[Dict[str, Any]]:
+        """Historical (RRD) usage samples of a node"""
+        pass
+
+    @abstractmethod
+    async def get_vm_rrddata(self, vm_id: str, timeframe: str = "hour") -> List[Dict[str, Any]]:
+        """Historical (RRD) usage samples of a VM"""
+        pass
+
+    @abstractmethod
+    async def get_vm_stats(self, vm_id: str) -> Dict[str, Any]:
+        """Get real-time statistics for a specific VM (CPU, RAM, Uptime, etc)"""
+        pass
+
+    @abstractmethod
+    async def get_console_ticket(self, vm_id: str) -> Dict[str, Any]:
+        """Generate a VNC ticket for NoVNC access"""
+        pass
+
+    @abstractmethod
+    async def list_isos(self) -> List[Dict[str, Any]]:
+        """List available ISO images in storage"""
+        pass
+
+    @abstractmethod
+    async def create_vm_from_iso(self, name: str, iso_file: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a VM from an ISO image"""
+        pass
+
+    @abstractmethod
+    async def convert_to_template(self, vm_id: str) -> bool:
+        """Convert a (stopped) VM to a template"""
+        pass
+
+    @abstractmethod
+    async def download_iso(self, url: str, file_name: str, storage: str = "local") -> str:
+        """Trigger an ISO download from a URL. Returns the Task UPID (Unique Process ID)"""
+        pass
+
+    @abstractmethod
+    async def get_task_status(self, upid: str, node: str) -> Dict[str, Any]:
+        """Get the status of a background task"""
+        pass
+
+    @abstractmethod
+    async def get_task_log(self, upid: str, node: str, start: int = 0, limit: int = 500) -> List[str]:
+        """Get up to `limit` lines of a task log, from line `start` (0-based) on"""
+        pass
+
+    @abstractmethod
+    async def list_cluster_tasks(self) -> List[Dict[str, Any]]:
+        """Recent and running tasks of the whole cluster in one call"""
+        pass
+
+    @abstractmethod
+    async def cancel_task(self, upid: str, node: str) -> bool:
+        """Cancel a background task"""
+        pass
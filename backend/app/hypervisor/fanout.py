@@ -0,0 +1,69 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+class FanoutResults(list):
+    """
+    Merged results of a fan-out. Behaves like the plain list callers always
+    got, plus `errors`: one {"node", ["storage"], "error"} dict per failed call.
+    """
+    def __init__(self, items=(), errors: List[Dict[str, Any]] = None):
+        super().__init__(items)
+        self.errors = errors or []
+
+def _error(context: Dict[str, Any], message: str) -> Dict[str, Any]:
+    return {**context, "error": message}
+
+def fan_out(
+    calls: List[Tuple[Dict[str, Any], Callable[[], Any]]],
+    max_workers: int,
+    timeout: float,
+) -> Tuple[List[Tuple[Dict[str, Any], Any]], List[Dict[str, Any]]]:
+    """
+    Run blocking calls concurrently on a bounded thread pool.
+    `calls` pairs a context (e.g. {"node": "pve1"}) with a no-arg callable.
+    Returns ([(context, result)], [error]) in input order; calls that raise or
+    are still running after `timeout` seconds are reported as errors.
+    """
+    if not calls:
+        return [], []
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(calls)))
+    try:
+        futures = [pool.submit(fn) for _, fn in calls]
+        wait(futures, timeout=timeout)
+        results, errors = [], []
+        for (context, _), future in zip(calls, futures):
+            if not future.done():
+                errors.append(_error(context, f"timed out after {timeout}s"))
+            elif future.exception() is not None:
+                errors.append(_error(context, str(future.exception())))
+            else:
+                results.append((context, future.result()))
+        return results, errors
+    finally:
+        # Don't let a hung node keep the request waiting past the deadline
+        pool.shutdown(wait=False, cancel_futures=True)
+
+async def afan_out(
+    calls: List[Tuple[Dict[str, Any], Callable[[], Awaitable[Any]]]],
+    limit: int,
+    timeout: float,
+) -> Tuple[List[Tuple[Dict[str, Any], Any]], List[Dict[str, Any]]]:
+    """asyncio version of fan_out: at most `limit` calls in flight, each bounded by `timeout`."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(fn):
+        async with semaphore:
+            return await asyncio.wait_for(fn(), timeout)
+
+    outcomes = await asyncio.gather(*[run(fn) for _, fn in calls], return_exceptions=True)
+    results, errors = [], []
+    for (context, _), outcome in zip(calls, outcomes):
+        if isinstance(outcome, asyncio.TimeoutError):
+            errors.append(_error(context, f"timed out after {timeout}s"))
+        elif isinstance(outcome, Exception):
+            errors.append(_error(context, str(outcome)))
+        else:
+            results.append((context, outcome))
+    return results, errors
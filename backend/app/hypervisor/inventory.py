@@ -0,0 +1,165 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Set
+
+@dataclass
+class VMResource:
+    """One qemu guest (VM or template) as reported by /cluster/resources."""
+    vmid: int
+    name: str
+    node: str
+    status: str
+    template: bool = False
+    cpu: float = 0.0
+    maxcpu: int = 0
+    mem: int = 0
+    maxmem: int = 0
+    disk: int = 0
+    maxdisk: int = 0
+    uptime: int = 0
+    netin: int = 0
+    netout: int = 0
+    diskread: int = 0
+    diskwrite: int = 0
+
+    @classmethod
+    def from_resource(cls, r: Dict[str, Any]) -> "VMResource":
+        return cls(
+            vmid=int(r["vmid"]),
+            name=r.get("name", ""),
+            node=r.get("node", ""),
+            status=r.get("status", "unknown"),
+            template=r.get("template") == 1,
+            cpu=r.get("cpu", 0) or 0,
+            maxcpu=r.get("maxcpu", 0) or 0,
+            mem=r.get("mem", 0) or 0,
+            maxmem=r.get("maxmem", 0) or 0,
+            disk=r.get("disk", 0) or 0,
+            maxdisk=r.get("maxdisk", 0) or 0,
+            uptime=r.get("uptime", 0) or 0,
+            netin=r.get("netin", 0) or 0,
+            netout=r.get("netout", 0) or 0,
+            diskread=r.get("diskread", 0) or 0,
+            diskwrite=r.get("diskwrite", 0) or 0,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same shape the per-node qemu listing used to return (plus node)."""
+        return {
+            "vmid": self.vmid,
+            "name": self.name,
+            "node": self.node,
+            "status": self.status,
+            "template": 1 if self.template else 0,
+            "cpu": self.cpu,
+            "cpus": self.maxcpu,
+            "mem": self.mem,
+            "maxmem": self.maxmem,
+            "disk": self.disk,
+            "maxdisk": self.maxdisk,
+            "uptime": self.uptime,
+            "netin": self.netin,
+            "netout": self.netout,
+            "diskread": self.diskread,
+            "diskwrite": self.diskwrite,
+        }
+
+@dataclass
+class ClusterInventory:
+    """Point-in-time view of every guest in the cluster, taken in a single API call."""
+    resources: List[VMResource] = field(default_factory=list)
+    # VMIDs of every guest, containers included: qemu and lxc share one ID space
+    guest_vmids: Set[int] = field(default_factory=set)
+    taken_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_resources(cls, resources: List[Dict[str, Any]]) -> "ClusterInventory":
+        return cls(
+            resources=[VMResource.from_resource(r) for r in resources if r.get("type") == "qemu"],
+            guest_vmids={int(r["vmid"]) for r in resources if r.get("type") in ("qemu", "lxc")},
+        )
+
+    @property
+    def vms(self) -> List[VMResource]:
+        return [r for r in self.resources if not r.template]
+
+    @property
+    def templates(self) -> List[VMResource]:
+        return [r for r in self.resources if r.template]
+
+    def get(self, vmid) -> VMResource:
+        vmid = int(vmid)
+        for r in self.resources:
+            if r.vmid == vmid:
+                return r
+        return None
+
+    def node_map(self) -> Dict[int, str]:
+        return {r.vmid: r.node for r in self.resources}
+
+    def used_vmids(self) -> Set[int]:
+        """VMIDs a new guest can't take (node_map() only covers qemu guests)."""
+        return self.guest_vmids | {r.vmid for r in self.resources}
+
+def _ratio(used, total) -> float:
+    return used / total if total else 0.0
+
+def summarize_cluster(resources: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Per-node utilization, cluster totals and guest counts by state from one
+    (unfiltered) /cluster/resources listing.
+    """
+    nodes = {}
+    for r in resources:
+        if r.get("type") == "node":
+            nodes[r["node"]] = {
+                "node": r["node"],
+                "status": r.get("status", "unknown"),
+                "cpus": r.get("maxcpu", 0) or 0,
+                "cpu_utilization": r.get("cpu", 0) or 0,
+                "mem_used": r.get("mem", 0) or 0,
+                "mem_total": r.get("maxmem", 0) or 0,
+                "disk_used": r.get("disk", 0) or 0,
+                "disk_total": r.get("maxdisk", 0) or 0,
+                "uptime": r.get("uptime", 0) or 0,
+                "vms": 0,
+                "vms_running": 0,
+            }
+
+    by_state: Dict[str, int] = {}
+    templates = 0
+    for r in resources:
+        if r.get("type") != "qemu":
+            continue
+        if r.get("template") == 1:
+            templates += 1
+            continue
+        state = r.get("status", "unknown")
+        by_state[state] = by_state.get(state, 0) + 1
+        node = nodes.get(r.get("node"))
+        if node:
+            node["vms"] += 1
+            node["vms_running"] += 1 if state == "running" else 0
+
+    for node in nodes.values():
+        node["mem_utilization"] = _ratio(node["mem_used"], node["mem_total"])
+
+    online = [n for n in nodes.values() if n["status"] == "online"]
+    cpus = sum(n["cpus"] for n in online)
+    cpu_used = sum(n["cpus"] * n["cpu_utilization"] for n in online)
+    mem_total = sum(n["mem_total"] for n in online)
+    mem_used = sum(n["mem_used"] for n in online)
+    return {
+        "nodes": list(nodes.values()),
+        "totals": {
+            "nodes_total": len(nodes),
+            "nodes_online": len(online),
+            "cpus": cpus,
+            "cpus_used": cpu_used,
+            "mem_total": mem_total,
+            "mem_used": mem_used,
+            "disk_total": sum(n["disk_total"] for n in online),
+            "disk_used": sum(n["disk_used"] for n in online),
+        },
+        "vms": {"by_state": by_state, "total": sum(by_state.values()), "templates": templates},
+    }
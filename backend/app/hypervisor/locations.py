@@ -0,0 +1,34 @@
+import threading
+from typing import Dict, Optional
+
+class VMLocationIndex:
+    """
+    vmid -> node map for one Proxmox cluster.
+    Seeded from a single cluster-wide query, updated when we create or clone
+    VMs, and entries are dropped whenever a call on the cached node says the
+    VM is not there anymore (migration, deletion).
+    """
+    def __init__(self):
+        self._nodes: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, vm_id) -> Optional[str]:
+        with self._lock:
+            return self._nodes.get(int(vm_id))
+
+    def set(self, vm_id, node: str):
+        with self._lock:
+            self._nodes[int(vm_id)] = node
+
+    def forget(self, vm_id):
+        with self._lock:
+            self._nodes.pop(int(vm_id), None)
+
+    def replace(self, nodes: Dict[int, str]):
+        """Swap in a full mapping taken from a fresh cluster-wide snapshot."""
+        with self._lock:
+            self._nodes = {int(vmid): node for vmid, node in nodes.items()}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._nodes)
@@ -1,12 +1,32 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.db import models
+from .fanout import afan_out
 from .proxmox import ProxmoxClient
-from .base import HypervisorClient
+from .proxmox_async import AsyncProxmoxClient
+from .base import HypervisorClient, AsyncHypervisorClient
 
 class HypervisorManager:
+    # Process-wide pool of authenticated clients, one per hypervisor connection.
+    # Building a ProxmoxClient performs a full ticket login, so clients are kept
+    # alive and shared between requests instead of being rebuilt every call.
+    _clients: Dict[Tuple, HypervisorClient] = {}
+    _async_clients: Dict[Tuple, AsyncHypervisorClient] = {}
+    _lock = threading.Lock()
+
     @staticmethod
-    def get_client(hypervisor: models.Hypervisor = None) -> HypervisorClient:
-        
+    def _registry_key(hypervisor: models.Hypervisor = None) -> Tuple:
+        if hypervisor:
+            # Credentials are part of the key so editing a Hypervisor row
+            # transparently builds a new client on the next call.
+            return (hypervisor.id, hypervisor.url, hypervisor.auth_user, hypervisor.auth_token, hypervisor.verify_ssl)
+        return ("default", settings.PROXMOX_URL, settings.PROXMOX_USER, settings.PROXMOX_PASSWORD, settings.PROXMOX_VERIFY_SSL)
+
+    @staticmethod
+    def _build_client(hypervisor: models.Hypervisor = None) -> HypervisorClient:
         if hypervisor:
             if hypervisor.type == models.HypervisorType.PROXMOX:
                 return ProxmoxClient(
@@ -22,3 +42,115 @@ class HypervisorManager:
             password=settings.PROXMOX_PASSWORD,
             verify_ssl=settings.PROXMOX_VERIFY_SSL
         )
+
+    @classmethod
+    def get_client(cls, hypervisor: models.Hypervisor = None) -> HypervisorClient:
+        key = cls._registry_key(hypervisor)
+        with cls._lock:
+            client = cls._clients.get(key)
+            if client is None:
+                client = cls._build_client(hypervisor)
+                cls._clients[key] = client
+
+        # Renews the ticket / reconnects after a failed login, outside the lock
+        client.ensure_session()
+        return client
+
+    @staticmethod
+    def _build_async_client(hypervisor: models.Hypervisor = None) -> AsyncHypervisorClient:
+        if hypervisor:
+            if hypervisor.type == models.HypervisorType.PROXMOX:
+                return AsyncProxmoxClient(
+                    host=hypervisor.url,
+                    user=hypervisor.auth_user,
+                    password=hypervisor.auth_token,
+                    verify_ssl=hypervisor.verify_ssl
+                )
+
+        return AsyncProxmoxClient(
+            host=settings.PROXMOX_URL,
+            user=settings.PROXMOX_USER,
+            password=settings.PROXMOX_PASSWORD,
+            verify_ssl=settings.PROXMOX_VERIFY_SSL
+        )
+
+    @classmethod
+    def get_async_client(cls, hypervisor: models.Hypervisor = None) -> AsyncHypervisorClient:
+        """
+        Pooled asyncio client for async endpoints and background loops.
+        No I/O happens here: the client logs in on its first request.
+        """
+        key = cls._registry_key(hypervisor)
+        with cls._lock:
+            client = cls._async_clients.get(key)
+            if client is None:
+                client = cls._build_async_client(hypervisor)
+                cls._async_clients[key] = client
+        return client
+
+    @classmethod
+    def get_async_client_for_vm(cls, vm: models.VirtualMachine) -> AsyncHypervisorClient:
+        """Client of the cluster the VM lives on (the default one if unset)."""
+        return cls.get_async_client(vm.hypervisor)
+
+    @classmethod
+    def get_client_for_vm(cls, vm: models.VirtualMachine) -> HypervisorClient:
+        return cls.get_client(vm.hypervisor)
+
+    @staticmethod
+    def targets(db: Session) -> List[Optional[models.Hypervisor]]:
+        """
+        Every cluster we manage: the default one from settings (None) plus
+        each registered Hypervisor row. The default is skipped when a row
+        already points at the same host, so it isn't counted twice.
+        """
+        hypervisors = db.query(models.Hypervisor).order_by(models.Hypervisor.id).all()
+        default_host = settings.PROXMOX_URL.split("://")[-1]
+        if any(h.url.split("://")[-1] == default_host for h in hypervisors):
+            return hypervisors
+        return [None] + hypervisors
+
+    @classmethod
+    async def fan_out(
+        cls,
+        db: Session,
+        fn: Callable[[Optional[models.Hypervisor], AsyncHypervisorClient], Awaitable[Any]],
+    ) -> Tuple[List[Tuple[Optional[models.Hypervisor], Any]], List[Dict[str, Any]]]:
+        """
+        Await fn(hypervisor, client) on every cluster concurrently.
+        Returns ([(hypervisor, result)], [error]); an unreachable cluster is
+        reported in the errors instead of failing the whole call.
+        """
+        # Sync DB query: run it off the event loop
+        targets = await asyncio.to_thread(cls.targets, db)
+        calls = [
+            ({"hypervisor_id": h.id if h else None, "hypervisor": h.name if h else "default"},
+             lambda h=h: fn(h, cls.get_async_client(h)))
+            for h in targets
+        ]
+        by_id = {h.id if h else None: h for h in targets}
+        results, errors = await afan_out(calls, len(calls), settings.HYPERVISOR_FANOUT_TIMEOUT)
+        return [(by_id[context["hypervisor_id"]], result) for context, result in results], errors
+
+    @classmethod
+    def invalidate(cls, hypervisor: models.Hypervisor = None):
+        """Drop the pooled clients so the next get_client() logs in again."""
+        key = cls._registry_key(hypervisor)
+        with cls._lock:
+            cls._clients.pop(key, None)
+            cls._async_clients.pop(key, None)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._clients.clear()
+            cls._async_clients.clear()
+
+    @classmethod
+    async def aclose(cls):
+        """Close pooled async HTTP connections (application shutdown)."""
+        with cls._lock:
+            clients = list(cls._async_clients.values())
+            cls._async_clients.clear()
+        for client in clients:
+            await client.aclose()
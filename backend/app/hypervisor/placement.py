@@ -0,0 +1,211 @@
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+# Strategy name -> score(node, storage, request); the highest score wins
+STRATEGIES: Dict[str, Callable[["NodeCapacity", Optional["StorageCapacity"], "PlacementRequest"], float]] = {}
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+def parse_size(size) -> int:
+    """Proxmox size string ("32G", "512M") or number of bytes -> bytes (0 if unknown)."""
+    if size is None:
+        return 0
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = _SIZE.match(str(size))
+    if not match:
+        return 0
+    return int(float(match.group(1)) * _UNITS[match.group(2).upper()])
+
+def strategy(name: str):
+    """Decorator registering a placement strategy under `name`."""
+    def register(fn):
+        STRATEGIES[name] = fn
+        return fn
+    return register
+
+@dataclass
+class NodeCapacity:
+    node: str
+    online: bool
+    cpu: float = 0.0
+    maxcpu: int = 0
+    mem: int = 0
+    maxmem: int = 0
+
+    @property
+    def free_mem(self) -> int:
+        return max(self.maxmem - self.mem, 0)
+
+    @property
+    def mem_ratio(self) -> float:
+        return self.free_mem / self.maxmem if self.maxmem else 0.0
+
+@dataclass
+class StorageCapacity:
+    node: str
+    storage: str
+    shared: bool
+    disk: int = 0
+    maxdisk: int = 0
+
+    @property
+    def free(self) -> int:
+        return max(self.maxdisk - self.disk, 0)
+
+    @property
+    def free_ratio(self) -> float:
+        return self.free / self.maxdisk if self.maxdisk else 0.0
+
+@dataclass
+class PlacementRequest:
+    memory: int = 0
+    cores: int = 0
+    disk: int = 0
+    # Storage the new disk lands on (None: don't check storage headroom)
+    storage: Optional[str] = None
+    # Restrict placement to these nodes (e.g. where a local template lives)
+    nodes: Optional[List[str]] = None
+
+@dataclass
+class CapacitySnapshot:
+    """Nodes and storages of one cluster, from a single /cluster/resources call."""
+    nodes: Dict[str, NodeCapacity] = field(default_factory=dict)
+    storages: Dict[tuple, StorageCapacity] = field(default_factory=dict)
+    taken_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def from_resources(cls, resources: List[Dict[str, Any]]) -> "CapacitySnapshot":
+        snapshot = cls()
+        for r in resources:
+            if r.get("type") == "node":
+                snapshot.nodes[r["node"]] = NodeCapacity(
+                    node=r["node"],
+                    online=r.get("status") == "online",
+                    cpu=r.get("cpu", 0) or 0,
+                    maxcpu=r.get("maxcpu", 0) or 0,
+                    mem=r.get("mem", 0) or 0,
+                    maxmem=r.get("maxmem", 0) or 0,
+                )
+            elif r.get("type") == "storage":
+                storage = StorageCapacity(
+                    node=r.get("node", ""),
+                    storage=r.get("storage", ""),
+                    shared=bool(r.get("shared")),
+                    disk=r.get("disk", 0) or 0,
+                    maxdisk=r.get("maxdisk", 0) or 0,
+                )
+                snapshot.storages[(storage.node, storage.storage)] = storage
+        return snapshot
+
+    def storage(self, node: str, storage: str) -> Optional[StorageCapacity]:
+        return self.storages.get((node, storage))
+
+    def is_shared(self, storage: str) -> bool:
+        return any(s.shared for (_, name), s in self.storages.items() if name == storage)
+
+    def reserve(self, node: str, request: PlacementRequest):
+        """
+        Account for a VM we just placed, so the next placements made from this
+        (cached) snapshot don't all pick the same node before it is refreshed.
+        """
+        capacity = self.nodes.get(node)
+        if capacity:
+            capacity.mem += request.memory
+            if capacity.maxcpu:
+                capacity.cpu = min(capacity.cpu + request.cores / capacity.maxcpu, 1.0)
+        if request.storage:
+            storage = self.storage(node, request.storage)
+            if storage and not storage.shared:
+                storage.disk += request.disk
+
+    def fits(self, node: NodeCapacity, request: PlacementRequest, max_mem_ratio: float) -> bool:
+        if not node.online or (request.nodes is not None and node.node not in request.nodes):
+            return False
+        if node.maxmem and node.mem + request.memory > node.maxmem * max_mem_ratio:
+            return False
+        if request.storage:
+            storage = self.storage(node.node, request.storage)
+            if storage is None:
+                return False
+            if not storage.shared and storage.maxdisk and storage.free < request.disk:
+                return False
+        return True
+
+    def choose(self, request: PlacementRequest, strategy_name: str, max_mem_ratio: float = 1.0) -> Optional[str]:
+        """Best node for `request` under `strategy_name`, None if nothing fits."""
+        score = STRATEGIES.get(strategy_name)
+        if score is None:
+            raise Exception(f"Unknown placement strategy: {strategy_name}")
+        candidates = [n for n in self.nodes.values() if self.fits(n, request, max_mem_ratio)]
+        if not candidates:
+            return None
+        best = max(
+            candidates,
+            key=lambda n: (score(n, self.storage(n.node, request.storage) if request.storage else None, request), n.node),
+        )
+        return best.node
+
+@strategy("spread")
+def _spread(node: NodeCapacity, storage: Optional[StorageCapacity], request: PlacementRequest) -> float:
+    """Most headroom overall: free memory first, then idle CPU, then free disk."""
+    free_mem = (node.free_mem - request.memory) / node.maxmem if node.maxmem else 0.0
+    storage_free = storage.free_ratio if storage and not storage.shared else 1.0
+    return 0.5 * free_mem + 0.3 * (1 - node.cpu) + 0.2 * storage_free
+
+@strategy("least-loaded")
+def _least_loaded(node: NodeCapacity, storage: Optional[StorageCapacity], request: PlacementRequest) -> float:
+    """Lowest CPU load; free memory only breaks ties."""
+    return (1 - node.cpu) + 0.01 * node.mem_ratio
+
+@strategy("pack")
+def _pack(node: NodeCapacity, storage: Optional[StorageCapacity], request: PlacementRequest) -> float:
+    """Fill the busiest node that still fits, keeping others free for large VMs."""
+    return -_spread(node, storage, request)
+
+def clone_request(snapshot: CapacitySnapshot, config: Dict[str, Any], template_node: str) -> PlacementRequest:
+    """
+    What a clone needs. Proxmox can only clone to another node when the
+    template's disk is on shared storage, so otherwise (or when we don't know
+    the storage) the template node is the only candidate.
+    """
+    disk = config.get("template_disk") or {}
+    storage = disk.get("storage")
+    shared = bool(storage) and snapshot.is_shared(storage)
+    return PlacementRequest(
+        memory=int(config.get("memory", 2048)) * 1024 ** 2,
+        cores=int(config.get("cpu", 1)),
+        # A linked clone only writes its delta
+        disk=parse_size(disk.get("size")) if config.get("clone_mode") != "linked" else 0,
+        storage=storage,
+        nodes=None if shared else [template_node],
+    )
+
+class CapacityCache:
+    """Last capacity snapshot of one cluster, reused for `ttl` seconds."""
+    def __init__(self):
+        self._snapshot: Optional[CapacitySnapshot] = None
+        self._lock = threading.Lock()
+
+    def fresh(self, ttl: float) -> Optional[CapacitySnapshot]:
+        with self._lock:
+            if self._snapshot and time.monotonic() - self._snapshot.taken_at < ttl:
+                return self._snapshot
+            return None
+
+    def put(self, snapshot: CapacitySnapshot) -> CapacitySnapshot:
+        with self._lock:
+            self._snapshot = snapshot
+            return snapshot
+
+    def place(self, snapshot: CapacitySnapshot, request: PlacementRequest, strategy_name: str, max_mem_ratio: float) -> Optional[str]:
+        """choose() and reserve() as one step, so parallel clones see each other."""
+        with self._lock:
+            node = snapshot.choose(request, strategy_name, max_mem_ratio)
+            if node:
+                snapshot.reserve(node, request)
+            return node
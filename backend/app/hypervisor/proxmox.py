@@ -1,7 +1,121 @@
 from typing import Dict, Any, List
 from proxmoxer import ProxmoxAPI
+from proxmoxer.core import ResourceException
+from app.core.config import settings
 from .base import HypervisorClient
+from .fanout import FanoutResults, fan_out
+from .inventory import ClusterInventory, summarize_cluster
+from .locations import VMLocationIndex
+from .placement import CapacityCache, CapacitySnapshot, PlacementRequest, clone_request, parse_size
+from . import resilience
 import requests
+import threading
+import time
+
+# Marks a request replayed after a re-login so a second 401 is not retried again
+REAUTH_HEADER = "X-Proxmox-Reauth"
+
+class VMNotFoundError(Exception):
+    pass
+
+def _raise_unavailable(response):
+    """Turn a node-unreachable response into an error the breaker counts."""
+    if response.status_code in resilience.UNAVAILABLE_STATUSES:
+        raise ResourceException(response.status_code, response.reason, response.text)
+
+def _is_missing_vm(e: Exception) -> bool:
+    """Proxmox answers 500 'Configuration file ... does not exist' when a VM is not on the node we asked"""
+    if not isinstance(e, ResourceException):
+        return False
+    message = str(e).lower()
+    return e.status_code == 404 or "does not exist" in message or "no such" in message
+
+def first_ipv4(interfaces: Dict[str, Any]) -> str:
+    """First non-loopback IPv4 from a guest agent network-get-interfaces answer"""
+    for iface in interfaces.get('result', []):
+        if iface['name'] != 'lo':
+            for ip_info in iface.get('ip-addresses', []):
+                if ip_info['ip-address-type'] == 'ipv4':
+                    return ip_info['ip-address']
+    return None
+
+DISK_KEYS = ("scsi0", "virtio0", "sata0", "ide0")
+
+def boot_disk(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Storage, volume, size and format of the first disk in a qemu config,
+    e.g. scsi0 = "local-lvm:base-100-disk-0,size=32G".
+    """
+    for key in DISK_KEYS:
+        value = config.get(key)
+        if not value or "media=cdrom" in value:
+            continue
+        volume, _, options = value.partition(",")
+        opts = dict(o.split("=", 1) for o in options.split(",") if "=" in o)
+        disk_format = opts.get("format") or (volume.rsplit(".", 1)[1] if "." in volume else "raw")
+        return {
+            "storage": volume.split(":")[0],
+            "volume": volume,
+            "size": opts.get("size"),
+            "format": disk_format,
+        }
+    return {}
+
+# Storage types where Proxmox can make a copy-on-write (linked) clone of a template.
+# File based storages only can when the template disk is qcow2.
+LINKED_CLONE_BLOCK_STORAGES = {"lvmthin", "zfspool", "rbd"}
+LINKED_CLONE_FILE_STORAGES = {"dir", "nfs", "cifs", "glusterfs", "cephfs"}
+
+def linked_clone_supported(storage_type: str, disk_format: str) -> bool:
+    if storage_type in LINKED_CLONE_BLOCK_STORAGES:
+        return True
+    return storage_type in LINKED_CLONE_FILE_STORAGES and disk_format == "qcow2"
+
+def cdrom_iso(config: Dict[str, Any]) -> str:
+    """ISO volume attached as cdrom (e.g. ide2 = "local:iso/ubuntu.iso,media=cdrom"), if any"""
+    for key, value in config.items():
+        if isinstance(value, str) and "media=cdrom" in value:
+            volume = value.split(",")[0]
+            if volume not in ("none", "cdrom"):
+                return volume
+    return None
+
+def vm_stats(vm_status: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "status": vm_status.get("status", "unknown"),
+        "uptime_seconds": vm_status.get("uptime", 0),
+        "cpu_usage_percent": vm_status.get("cpu", 0) * 100, 
+        "cpus": vm_status.get("cpus", 0),
+        "memory_used_bytes": vm_status.get("mem", 0),
+        "memory_total_bytes": vm_status.get("maxmem", 0),
+        "network_in_bytes": vm_status.get("netin", 0),
+        "network_out_bytes": vm_status.get("netout", 0),
+        "disk_read_bytes": vm_status.get("diskread", 0),
+        "disk_write_bytes": vm_status.get("diskwrite", 0)
+    }
+
+def iso_vm_params(vmid: int, name: str, iso_file: str, storage: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """qemu create parameters for a draft VM booting from an ISO"""
+    params = {
+        "vmid": vmid,
+        "name": name,
+        "memory": config.get("memory", 2048),
+        "sockets": 1,
+        "cores": config.get("cpu", 2),
+        "net0": "virtio,bridge=vmbr0",
+        "scsihw": "virtio-scsi-pci",
+        "cdrom": iso_file, 
+        "boot": "order=scsi0;ide2;net0", 
+        "bootdisk": "scsi0",
+        "ostype": "l26" 
+    }
+    
+    disk_size = config.get("disk_size", "32")
+    if isinstance(disk_size, str) and disk_size.upper().endswith("G"):
+        disk_size = disk_size[:-1]
+        
+    params["scsi0"] = f"{storage}:{disk_size}"
+    return params
 
 class ProxmoxClient(HypervisorClient):
     def __init__(self, host: str, user: str, password: str, verify_ssl: bool = False):
@@ -10,27 +124,138 @@ class ProxmoxClient(HypervisorClient):
             self.host = host.split("://")[1]
         else:
             self.host = host
-            
-        
+
+        self._user = user
+        self._password = password
+        self._verify_ssl = verify_ssl
+        self._auth_lock = threading.Lock()
+        self.locations = VMLocationIndex()
+        self._storage_types: Dict[str, str] = {}
+        self.capacity = CapacityCache()
+        self.proxmox = None
+        self._connect()
+
+    def _connect(self):
         try:
             try:
                 with open("c:/Users/badda/Desktop/MastersProject/backend/debug_trace.log", "a") as f:
-                    f.write(f"PROXMOX: Connecting to {self.host} with user {user}\n")
+                    f.write(f"PROXMOX: Connecting to {self.host} with user {self._user}\n")
             except:
                 pass
-            print(f"Connecting to Proxmox at {self.host} with user {user}")
-            self.proxmox = ProxmoxAPI(
+            print(f"Connecting to Proxmox at {self.host} with user {self._user}")
+            proxmox = ProxmoxAPI(
                 self.host, 
-                user=user, 
-                password=password, 
-                verify_ssl=verify_ssl
+                user=self._user, 
+                password=self._password, 
+                verify_ssl=self._verify_ssl,
+                timeout=(settings.PROXMOX_CONNECT_TIMEOUT, settings.PROXMOX_CALL_TIMEOUT)
             )
+            # Renew the ticket ourselves a little before Proxmox expires it (2h)
+            proxmox._backend.auth.renew_age = settings.PROXMOX_TICKET_RENEW_SECONDS
+            # Keep-alive session shared by every call made through this client
+            session = proxmox._store["session"]
+            session.hooks["response"].append(self._reauth_on_401)
+            session.request = self._guarded(session.request)
+            self.proxmox = proxmox
         except Exception as e:
             print(f"Failed to connect to Proxmox: {e}")
             import traceback
             traceback.print_exc()
             self.proxmox = None
 
+    def _login(self):
+        """Fetch a fresh ticket with the stored password."""
+        auth = self.proxmox._backend.auth
+        with self._auth_lock:
+            auth._get_new_tokens(password=self._password)
+
+    def ensure_session(self) -> bool:
+        """
+        Make sure this (long-lived) client holds a usable ticket.
+        Reconnects if the initial login failed and renews the ticket with the
+        password once it is older than the renew age, so an idle client never
+        tries to renew with an already expired ticket.
+        """
+        if not self.proxmox:
+            self._connect()
+            return self.proxmox is not None
+
+        auth = self.proxmox._backend.auth
+        if time.monotonic() - auth.birth_time >= auth.renew_age:
+            try:
+                self._login()
+            except Exception as e:
+                print(f"Proxmox ticket renewal failed, reconnecting: {e}")
+                self._connect()
+        return self.proxmox is not None
+
+    def _guarded(self, request):
+        """Route every API call through the per-node breaker and read retries."""
+        def guarded(method, url, **kwargs):
+            return resilience.call(self.host, method, url, lambda: request(method, url, **kwargs), _raise_unavailable)
+        return guarded
+
+    def _reauth_on_401(self, response, **kwargs):
+        """
+        requests response hook: when Proxmox rejects our ticket (restart, revoked
+        session...), log in again and replay the request once.
+        """
+        if response.status_code != 401 or response.request.headers.get(REAUTH_HEADER):
+            return response
+
+        try:
+            self._login()
+        except Exception as e:
+            print(f"Proxmox re-authentication failed: {e}")
+            return response
+
+        auth = self.proxmox._backend.auth
+        retry = response.request.copy()
+        retry.headers[REAUTH_HEADER] = "1"
+        retry.headers["Cookie"] = f"{auth.service}AuthCookie={auth.pve_auth_ticket}"
+        if "CSRFPreventionToken" in retry.headers:
+            retry.headers["CSRFPreventionToken"] = auth.csrf_prevention_token
+        return self.proxmox._store["session"].send(retry, **kwargs)
+
+    def _seed_locations(self):
+        """Rebuild the vmid -> node index from one /cluster/resources call."""
+        self.get_inventory()
+
+    def _locate(self, vm_id) -> str:
+        node = self.locations.get(vm_id)
+        if node:
+            return node
+        try:
+            self._seed_locations()
+        except Exception as e:
+            print(f"Failed to seed VM location index: {e}")
+            return None
+        return self.locations.get(vm_id)
+
+    def _on_vm_node(self, vm_id, action):
+        """
+        Run action(node) against the node hosting vm_id.
+        A stale index entry (VM migrated or deleted) is dropped and the index
+        reseeded once before giving up with VMNotFoundError.
+        """
+        if not self.proxmox:
+            raise VMNotFoundError(f"VM {vm_id} not found")
+
+        node = self._locate(vm_id)
+        if not node:
+            raise VMNotFoundError(f"VM {vm_id} not found")
+        try:
+            return action(node)
+        except Exception as e:
+            if not _is_missing_vm(e):
+                raise
+            self.locations.forget(vm_id)
+
+        new_node = self._locate(vm_id)
+        if not new_node or new_node == node:
+            raise VMNotFoundError(f"VM {vm_id} not found")
+        return action(new_node)
+
     def get_status(self) -> Dict[str, Any]:
         if not self.proxmox:
             return {"status": "error", "details": "Not connected"}
@@ -40,56 +265,48 @@ class ProxmoxClient(HypervisorClient):
         except Exception as e:
             return {"status": "error", "details": str(e)}
 
-    def list_vms(self) -> List[Dict[str, Any]]:
+    def get_inventory(self) -> ClusterInventory:
+        """
+        All VMs and templates of every node from a single /cluster/resources call.
+        Also refreshes the vmid -> node index since we get placement for free.
+        """
         if not self.proxmox:
-            return []
-        vms = []
-        for node in self.proxmox.nodes.get():
-            node_vms = self.proxmox.nodes(node['node']).qemu.get()
-            for vm in node_vms:
-                if vm.get('template') != 1:
-                    vm['node'] = node['node']
-                    vms.append(vm)
-        return vms
+            return ClusterInventory()
+        inventory = ClusterInventory.from_resources(self.proxmox.cluster.resources.get(type="vm"))
+        self.locations.replace(inventory.node_map())
+        return inventory
+
+    def list_vms(self) -> List[Dict[str, Any]]:
+        return [vm.to_dict() for vm in self.get_inventory().vms]
 
     def list_templates(self) -> List[Dict[str, Any]]:
-        if not self.proxmox:
-            return []
-        templates = []
-        for node in self.proxmox.nodes.get():
-            node_vms = self.proxmox.nodes(node['node']).qemu.get()
-            for vm in node_vms:
-                if vm.get('template') == 1:
-                    vm['node'] = node['node']
-                    templates.append(vm)
-        return templates
+        return [vm.to_dict() for vm in self.get_inventory().templates]
+
+    def get_vm_ip(self, vm_id: str) -> str:
+        """IPv4 reported by the guest agent (one call), None when unavailable."""
+        try:
+            interfaces = self._on_vm_node(vm_id, lambda node: self.proxmox.nodes(node).qemu(vm_id).agent('network-get-interfaces').get())
+            return first_ipv4(interfaces)
+        except:
+            return None
 
     def get_vm_details(self, vm_id: str) -> Dict[str, Any]:
-        if not self.proxmox:
-            return {}
-        
-        for node in self.proxmox.nodes.get():
+        def fetch(node):
+            vm = self.proxmox.nodes(node).qemu(vm_id).status.current.get()
+            config = self.proxmox.nodes(node).qemu(vm_id).config.get()
+            ip_address = None
             try:
-                vm = self.proxmox.nodes(node['node']).qemu(vm_id).status.current.get()
-                config = self.proxmox.nodes(node['node']).qemu(vm_id).config.get()
-                ip_address = None
-                try:
-                    interfaces = self.proxmox.nodes(node['node']).qemu(vm_id).agent.network_get_interfaces.get()
-                    for iface in interfaces.get('result', []):
-                        if iface['name'] != 'lo':
-                            for ip_info in iface.get('ip-addresses', []):
-                                if ip_info['ip-address-type'] == 'ipv4':
-                                    ip_address = ip_info['ip-address']
-                                    break
-                        if ip_address:
-                            break
-                except:
-                    pass 
-                
-                return {"config": config, "status": vm, "node": node['node'], "ip": ip_address}
+                interfaces = self.proxmox.nodes(node).qemu(vm_id).agent.network_get_interfaces.get()
+                ip_address = first_ipv4(interfaces)
             except:
-                continue
-        return {}
+                pass 
+            
+            return {"config": config, "status": vm, "node": node, "ip": ip_address}
+
+        try:
+            return self._on_vm_node(vm_id, fetch)
+        except:
+            return {}
 
     def create_vm(self, name: str, config: Dict[str, Any]) -> Dict[str, Any]:
         if not self.proxmox:
@@ -99,125 +316,122 @@ class ProxmoxClient(HypervisorClient):
         if not template_id:
             raise Exception("Template ID is required")
 
-        template_node = None
-        for node in self.proxmox.nodes.get():
-            try:
-                self.proxmox.nodes(node['node']).qemu(template_id).config.get()
-                template_node = node['node']
-                break
-            except:
-                continue
-        
-        if not template_node:
+        # Node from the templates registry when the caller has it; a stale
+        # entry is corrected by _on_vm_node like any other cached location
+        if config.get("template_node"):
+            self.locations.set(template_id, config["template_node"])
+        if not self._locate(template_id):
             raise Exception(f"Template {template_id} not found")
 
-        new_vmid = self.proxmox.cluster.nextid.get()
+        # Callers provisioning in parallel pass a VMID reserved by the allocator
+        new_vmid = config.get("vmid") or self.proxmox.cluster.nextid.get()
+
+        try:
+            clone_mode, fallback = self._clone_mode(template_id, config)
+        except Exception as e:
+            clone_mode, fallback = "full", f"could not check template storage: {e}"
+        if fallback:
+            print(f"Linked clone of {template_id} not possible, using full clone: {fallback}")
 
         clone_params = {
             "newid": new_vmid,
             "name": name,
-            "full": 1 
+            "full": 1 if clone_mode == "full" else 0
         }
         
+        def clone(node):
+            target = config.get("target_node") or self._place(
+                lambda snapshot: clone_request(snapshot, {**config, "clone_mode": clone_mode}, node), config
+            ) or node
+            params = {**clone_params, "target": target} if target != node else clone_params
+            return node, target, self.proxmox.nodes(node).qemu(template_id).clone.post(**params)
+
         try:
-            self.proxmox.nodes(template_node).qemu(template_id).clone.post(**clone_params)
+            _, target_node, upid = self._on_vm_node(template_id, clone)
         except Exception as e:
             raise Exception(f"Failed to clone VM: {e}")
+        self.locations.set(new_vmid, target_node)
 
-        update_params = {}
+        # The new VM stays locked until the clone task ends, so cores/memory
+        # are returned for the "clone" task handler to apply afterwards
+        pending_config = {}
         if "cpu" in config:
-            update_params["cores"] = config["cpu"]
+            pending_config["cores"] = config["cpu"]
         if "memory" in config:
-            update_params["memory"] = config["memory"]
-            
-        if update_params:
-            try:
-                self.proxmox.nodes(template_node).qemu(new_vmid).config.post(**update_params)
-            except Exception as e:
-                print(f"Warning: Failed to update VM config: {e}")
+            pending_config["memory"] = config["memory"]
 
-        return {"vmid": new_vmid, "node": template_node}
+        return {
+            "vmid": new_vmid, "node": target_node, "upid": upid, "clone_mode": clone_mode,
+            "clone_fallback": fallback, "pending_config": pending_config,
+        }
+
+    def update_vm_config(self, vm_id: str, **params) -> None:
+        self._on_vm_node(vm_id, lambda node: self.proxmox.nodes(node).qemu(vm_id).config.post(**params))
+
+    def power_action(self, vm_id: str, action: str, **params) -> str:
+        """POST status/<action> (start, stop, shutdown, suspend...) and return the task UPID."""
+        return self._on_vm_node(vm_id, lambda node: self.proxmox.nodes(node).qemu(vm_id).status(action).post(**params))
 
     def start_vm(self, vm_id: str) -> bool:
-        details = self.get_vm_details(vm_id)
-        if not details:
-            return False
-        node = details['node']
         try:
-            self.proxmox.nodes(node).qemu(vm_id).status.start.post()
+            self.power_action(vm_id, "start")
             return True
         except:
             return False
 
     def stop_vm(self, vm_id: str) -> bool:
-        details = self.get_vm_details(vm_id)
-        if not details:
-            return False
-        node = details['node']
         try:
-            self.proxmox.nodes(node).qemu(vm_id).status.stop.post()
+            self.power_action(vm_id, "stop")
             return True
         except:
             return False
 
     def shutdown_vm(self, vm_id: str) -> bool:
-        details = self.get_vm_details(vm_id)
-        if not details:
-            return False
-        node = details['node']
         try:
-            self.proxmox.nodes(node).qemu(vm_id).status.shutdown.post()
+            self.power_action(vm_id, "shutdown")
             return True
         except:
             return False
 
     def get_analytics(self) -> Dict[str, Any]:
+        """Cluster totals, per-node utilization and guest counts from one /cluster/resources call."""
         if not self.proxmox:
             return {}
-        
-        total_cpu = 0
-        total_mem = 0
-        used_mem = 0
-        
-        nodes_stats = []
-        for node in self.proxmox.nodes.get():
-            status = self.proxmox.nodes(node['node']).status.get()
-            nodes_stats.append(status)
-            
-        return {"nodes": nodes_stats}
+        resources = self.proxmox.cluster.resources.get()
+        # Same listing placement and the location index are built from
+        self.capacity.put(CapacitySnapshot.from_resources(resources))
+        self.locations.replace(ClusterInventory.from_resources(resources).node_map())
+        return summarize_cluster(resources)
+
+    def list_nodes(self) -> List[Dict[str, Any]]:
+        if not self.proxmox:
+            return []
+        return self.proxmox.nodes.get()
+
+    def get_node_rrddata(self, node: str, timeframe: str = "hour") -> List[Dict[str, Any]]:
+        """One sample per minute for timeframe=hour, coarser for longer timeframes."""
+        return self.proxmox.nodes(node).rrddata.get(timeframe=timeframe, cf="AVERAGE")
+
+    def get_vm_rrddata(self, vm_id: str, timeframe: str = "hour") -> List[Dict[str, Any]]:
+        return self._on_vm_node(vm_id, lambda node: self.proxmox.nodes(node).qemu(vm_id).rrddata.get(timeframe=timeframe, cf="AVERAGE"))
 
     def get_vm_stats(self, vm_id: str) -> Dict[str, Any]:
         """Get real-time statistics for a specific VM."""
-        details = self.get_vm_details(vm_id)
-        if not details:
+        try:
+            vm_status = self._on_vm_node(vm_id, lambda node: self.proxmox.nodes(node).qemu(vm_id).status.current.get())
+        except:
             return {"status": "error", "details": "VM not found"}
-            
-        vm_status = details.get("status", {})
-        
-        stats = {
-            "status": vm_status.get("status", "unknown"),
-            "uptime_seconds": vm_status.get("uptime", 0),
-            "cpu_usage_percent": vm_status.get("cpu", 0) * 100, 
-            "memory_used_bytes": vm_status.get("mem", 0),
-            "memory_total_bytes": vm_status.get("maxmem", 0),
-            "network_in_bytes": vm_status.get("netin", 0),
-            "network_out_bytes": vm_status.get("netout", 0),
-            "disk_read_bytes": vm_status.get("diskread", 0),
-            "disk_write_bytes": vm_status.get("diskwrite", 0)
-        }
-        
-        return stats
+        return vm_stats(vm_status)
 
     def get_console_ticket(self, vm_id: str) -> Dict[str, Any]:
         """Generate a VNC ticket for NoVNC access."""
-        details = self.get_vm_details(vm_id)
-        if not details:
+        node = self._locate(vm_id) if self.proxmox else None
+        if not node:
             raise Exception("VM not found")
-            
-        node = details['node']
         
         try:
-            res = self.proxmox.nodes(node).qemu(vm_id).vncproxy.post(websocket=1)
+            res = self._on_vm_node(vm_id, lambda n: self.proxmox.nodes(n).qemu(vm_id).vncproxy.post(websocket=1))
+            node = self.locations.get(vm_id) or node
             ticket = res.get("ticket")
             port = res.get("port")
             cert = res.get("cert")
@@ -235,24 +449,106 @@ class ProxmoxClient(HypervisorClient):
         except Exception as e:
             raise Exception(f"Failed to generate console ticket: {e}")
 
+    def _fan_out(self, calls):
+        return fan_out(calls, settings.PROXMOX_FANOUT_WORKERS, settings.PROXMOX_FANOUT_TIMEOUT)
+
+    def _storage_node(self, storage: str) -> str:
+        """First node (in cluster order) that has `storage`, probing all nodes at once."""
+        calls = [
+            ({"node": node['node']}, lambda n=node['node']: self.proxmox.nodes(n).storage(storage).status.get())
+            for node in self.proxmox.nodes.get()
+        ]
+        results, _ = self._fan_out(calls)
+        return results[0][0]["node"] if results else None
+
+    def _capacity(self) -> CapacitySnapshot:
+        """Node and storage usage, from one /cluster/resources call (cached briefly)."""
+        snapshot = self.capacity.fresh(settings.PLACEMENT_SNAPSHOT_SECONDS)
+        if snapshot is None:
+            snapshot = self.capacity.put(CapacitySnapshot.from_resources(self.proxmox.cluster.resources.get()))
+        return snapshot
+
+    def _place(self, build_request, config: Dict[str, Any]) -> str:
+        """
+        Node picked by the placement strategy for build_request(snapshot).
+        None when placement is disabled, nothing fits or the snapshot can't be
+        read; callers then keep their old choice of node.
+        """
+        strategy_name = config.get("placement", settings.PLACEMENT_STRATEGY)
+        if not strategy_name:
+            return None
+        try:
+            snapshot = self._capacity()
+            return self.capacity.place(snapshot, build_request(snapshot), strategy_name, settings.PLACEMENT_MAX_MEMORY_RATIO)
+        except Exception as e:
+            print(f"Placement failed, using default node: {e}")
+            return None
+
+    def _iso_nodes(self, snapshot: CapacitySnapshot, iso_file: str) -> List[str]:
+        """Nodes that can boot iso_file: every node with its storage if shared, else the ones holding it."""
+        storage = iso_file.split(":")[0]
+        nodes = [node for (node, name) in snapshot.storages if name == storage]
+        if snapshot.is_shared(storage):
+            return nodes
+        calls = [
+            ({"node": n}, lambda n=n: self.proxmox.nodes(n).storage(storage).content.get(content="iso"))
+            for n in nodes
+        ]
+        results, _ = self._fan_out(calls)
+        return [context["node"] for context, content in results if any(c.get("volid") == iso_file for c in content)]
+
+    def _storage_type(self, storage: str) -> str:
+        """Storage type from the cluster storage config (cached, it never changes under us)."""
+        if storage not in self._storage_types:
+            self._storage_types[storage] = self.proxmox.storage(storage).get().get("type")
+        return self._storage_types[storage]
+
+    def _clone_mode(self, template_id, config: Dict[str, Any]):
+        """
+        Clone mode to actually use and, when a linked clone was requested but
+        the template's storage can't do it, the reason we fell back to full.
+        """
+        if config.get("clone_mode") != "linked":
+            return "full", None
+        disk = config.get("template_disk")
+        if not disk or not disk.get("storage"):
+            template_config = self._on_vm_node(template_id, lambda node: self.proxmox.nodes(node).qemu(template_id).config.get())
+            disk = boot_disk(template_config)
+        storage_type = self._storage_type(disk["storage"])
+        if linked_clone_supported(storage_type, disk.get("format")):
+            return "linked", None
+        return "full", f"storage {disk['storage']} ({storage_type}) does not support linked clones"
+
     def list_isos(self) -> List[Dict[str, Any]]:
         if not self.proxmox:
-            return []
-        isos = []
-        for node in self.proxmox.nodes.get():
-            try:
-                storages = self.proxmox.nodes(node['node']).storage.get()
-                for storage in storages:
-                    try:
-                        contents = self.proxmox.nodes(node['node']).storage(storage['storage']).content.get(content='iso')
-                        for item in contents:
-                            item['node'] = node['node']
-                            item['storage'] = storage['storage']
-                            isos.append(item)
-                    except:
-                        continue
-            except:
-                continue
+            return FanoutResults()
+
+        # Only storages that can hold ISOs, one listing per node in parallel
+        node_calls = [
+            ({"node": node['node']}, lambda n=node['node']: self.proxmox.nodes(n).storage.get(content='iso', enabled=1))
+            for node in self.proxmox.nodes.get()
+        ]
+        node_storages, errors = self._fan_out(node_calls)
+
+        content_calls = []
+        for context, storages in node_storages:
+            for storage in storages:
+                n, sid = context["node"], storage['storage']
+                content_calls.append((
+                    {"node": n, "storage": sid},
+                    lambda n=n, sid=sid: self.proxmox.nodes(n).storage(sid).content.get(content='iso')
+                ))
+        contents, content_errors = self._fan_out(content_calls)
+        errors += content_errors
+
+        isos = FanoutResults(errors=errors)
+        for context, items in contents:
+            for item in items:
+                item['node'] = context["node"]
+                item['storage'] = context["storage"]
+                isos.append(item)
+        for error in errors:
+            print(f"list_isos: skipped {error}")
         return isos
 
     def create_vm_from_iso(self, name: str, iso_file: str, config: Dict[str, Any]) -> Dict[str, Any]:
@@ -260,15 +556,12 @@ class ProxmoxClient(HypervisorClient):
             raise Exception("Not connected to Proxmox")
 
         storage_name = iso_file.split(":")[0]
-        target_node = None
-        
-        for node in self.proxmox.nodes.get():
-            try:
-                self.proxmox.nodes(node['node']).storage(storage_name).status.get()
-                target_node = node['node']
-                break
-            except:
-                continue
+        target_node = self._place(lambda snapshot: PlacementRequest(
+            memory=int(config.get("memory", 2048)) * 1024 ** 2,
+            cores=int(config.get("cpu", 2)),
+            disk=parse_size(config.get("disk_size")),
+            nodes=self._iso_nodes(snapshot, iso_file),
+        ), config) or self._storage_node(storage_name)
         
         if not target_node:
             try:
@@ -276,60 +569,32 @@ class ProxmoxClient(HypervisorClient):
             except:
                 raise Exception("No nodes found")
 
-        new_vmid = self.proxmox.cluster.nextid.get()
+        # Callers provisioning in parallel pass a VMID reserved by the allocator
+        new_vmid = config.get("vmid") or self.proxmox.cluster.nextid.get()
 
-        params = {
-            "vmid": new_vmid,
-            "name": name,
-            "memory": config.get("memory", 2048),
-            "sockets": 1,
-            "cores": config.get("cpu", 2),
-            "net0": "virtio,bridge=vmbr0",
-            "scsihw": "virtio-scsi-pci",
-            "cdrom": iso_file, 
-            "boot": "order=scsi0;ide2;net0", 
-            "bootdisk": "scsi0",
-            "ostype": "l26" 
-        }
-        
-        disk_size = config.get("disk_size", "32")
-        if isinstance(disk_size, str) and disk_size.upper().endswith("G"):
-            disk_size = disk_size[:-1]
-            
         target_storage = "local-lvm"
         try:
             self.proxmox.nodes(target_node).storage("local-lvm").status.get()
         except:
             target_storage = "local" 
             
-        params["scsi0"] = f"{target_storage}:{disk_size}"
+        params = iso_vm_params(new_vmid, name, iso_file, target_storage, config)
 
         try:
-            self.proxmox.nodes(target_node).qemu.post(**params)
+            upid = self.proxmox.nodes(target_node).qemu.post(**params)
         except Exception as e:
             raise Exception(f"Failed to create VM: {e}")
+        self.locations.set(new_vmid, target_node)
 
-        return {"vmid": new_vmid, "node": target_node}
+        return {"vmid": new_vmid, "node": target_node, "upid": upid}
 
     def convert_to_template(self, vm_id: str) -> bool:
-        details = self.get_vm_details(vm_id)
-        if not details:
+        """The VM must already be stopped; callers wait on the stop task first."""
+        if not self.proxmox or not self._locate(vm_id):
             return False
-        node = details['node']
-        
-        try:
-            self.stop_vm(vm_id)
-            import time
-            for _ in range(10):
-                status = self.get_vm_stats(vm_id)
-                if status.get("status") == "stopped":
-                    break
-                time.sleep(1)
-        except:
-            pass
             
         try:
-            self.proxmox.nodes(node).qemu(vm_id).template.post()
+            self._on_vm_node(vm_id, lambda node: self.proxmox.nodes(node).qemu(vm_id).template.post())
             return True
         except Exception as e:
             print(f"Failed to convert to template: {e}")
@@ -339,14 +604,7 @@ class ProxmoxClient(HypervisorClient):
         if not self.proxmox:
             raise Exception("Not connected to Proxmox")
             
-        target_node = None
-        for node in self.proxmox.nodes.get():
-            try:
-                self.proxmox.nodes(node['node']).storage(storage).status.get()
-                target_node = node['node']
-                break
-            except:
-                continue
+        target_node = self._storage_node(storage)
         
         if not target_node:
             raise Exception(f"Storage '{storage}' not found on any node")
@@ -369,15 +627,20 @@ class ProxmoxClient(HypervisorClient):
         except:
             return {"status": "unknown"}
 
-    def get_task_log(self, upid: str, node: str) -> List[str]:
+    def get_task_log(self, upid: str, node: str, start: int = 0, limit: int = 500) -> List[str]:
         if not self.proxmox:
             return []
         try:
-            logs = self.proxmox.nodes(node).tasks(upid).log.get()
+            logs = self.proxmox.nodes(node).tasks(upid).log.get(start=start, limit=limit)
             return [l.get('t', '') for l in logs]
         except:
             return []
 
+    def list_cluster_tasks(self) -> List[Dict[str, Any]]:
+        if not self.proxmox:
+            return []
+        return self.proxmox.cluster.tasks.get()
+
     def cancel_task(self, upid: str, node: str) -> bool:
         if not self.proxmox:
             return False
@@ -0,0 +1,493 @@
+import asyncio
+import time
+from http import client as httplib
+from typing import Dict, Any, List
+import httpx
+from proxmoxer.core import ResourceException
+from app.core.config import settings
+from .base import AsyncHypervisorClient
+from .fanout import FanoutResults, afan_out
+from .inventory import ClusterInventory, summarize_cluster
+from .locations import VMLocationIndex
+from .placement import CapacityCache, CapacitySnapshot, PlacementRequest, clone_request, parse_size
+from . import resilience
+from .proxmox import VMNotFoundError, _is_missing_vm, first_ipv4, vm_stats, iso_vm_params, boot_disk, linked_clone_supported
+
+def _http_error(response: httpx.Response) -> ResourceException:
+    return ResourceException(
+        response.status_code,
+        httplib.responses.get(response.status_code, ""),
+        response.reason_phrase,
+        errors=response.text,
+    )
+
+class AsyncProxmoxClient(AsyncHypervisorClient):
+    """
+    Proxmox VE client on httpx.AsyncClient. Mirrors ProxmoxClient call for call
+    but never blocks the event loop, so one worker can have many Proxmox
+    requests in flight.
+    """
+    def __init__(self, host: str, user: str, password: str, verify_ssl: bool = False):
+        if "://" in host:
+            self.host = host.split("://")[1]
+        else:
+            self.host = host
+
+        host_port = self.host if ":" in self.host else f"{self.host}:8006"
+        self.base_url = f"https://{host_port}/api2/json"
+
+        self._user = user
+        self._password = password
+        self._ticket = None
+        self._csrf_token = None
+        self._ticket_time = 0.0
+        self._auth_lock = asyncio.Lock()
+        self.locations = VMLocationIndex()
+        self._storage_types: Dict[str, str] = {}
+        self.capacity = CapacityCache()
+        self.http = httpx.AsyncClient(
+            verify=verify_ssl,
+            timeout=httpx.Timeout(settings.PROXMOX_CALL_TIMEOUT, connect=settings.PROXMOX_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=settings.PROXMOX_MAX_CONNECTIONS),
+        )
+
+    async def _login(self):
+        response = await self.http.post(
+            f"{self.base_url}/access/ticket",
+            data={"username": self._user, "password": self._password},
+        )
+        data = response.json().get("data") if response.status_code == 200 else None
+        if not data:
+            raise Exception(f"Couldn't authenticate user: {self._user} to {self.base_url}")
+        self._ticket = data["ticket"]
+        self._csrf_token = data["CSRFPreventionToken"]
+        self._ticket_time = time.monotonic()
+
+    async def ensure_session(self) -> bool:
+        """Log in lazily and renew the ticket before Proxmox expires it."""
+        if self._ticket and time.monotonic() - self._ticket_time < settings.PROXMOX_TICKET_RENEW_SECONDS:
+            return True
+        async with self._auth_lock:
+            # Another coroutine may have logged in while we waited for the lock
+            if self._ticket and time.monotonic() - self._ticket_time < settings.PROXMOX_TICKET_RENEW_SECONDS:
+                return True
+            await self._login()
+        return True
+
+    async def _request(self, method: str, path: str, params: Dict[str, Any] = None, data: Dict[str, Any] = None) -> Any:
+        await self.ensure_session()
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        data = {k: v for k, v in (data or {}).items() if v is not None}
+
+        async def send():
+            for attempt in range(2):
+                headers = {"Cookie": f"PVEAuthCookie={self._ticket}"}
+                if method != "GET":
+                    headers["CSRFPreventionToken"] = self._csrf_token
+                response = await self.http.request(
+                    method, f"{self.base_url}{path}", params=params or None, data=data or None, headers=headers
+                )
+                if response.status_code == 401 and attempt == 0:
+                    # Ticket was rejected (Proxmox restart, revoked session): log in again once
+                    async with self._auth_lock:
+                        await self._login()
+                    continue
+                return response
+
+        def check(response):
+            if response.status_code in resilience.UNAVAILABLE_STATUSES:
+                raise _http_error(response)
+
+        # Per-node breaker plus jittered retries for reads (see resilience.py)
+        response = await resilience.acall(self.host, method, path, send, check)
+        if response.status_code >= 400:
+            raise _http_error(response)
+        return response.json().get("data")
+
+    async def _get(self, path: str, **params) -> Any:
+        return await self._request("GET", path, params=params)
+
+    async def _post(self, path: str, **data) -> Any:
+        return await self._request("POST", path, data=data)
+
+    async def _delete(self, path: str, **params) -> Any:
+        return await self._request("DELETE", path, params=params)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def _locate(self, vm_id) -> str:
+        node = self.locations.get(vm_id)
+        if node:
+            return node
+        try:
+            await self.get_inventory()
+        except Exception as e:
+            print(f"Failed to seed VM location index: {e}")
+            return None
+        return self.locations.get(vm_id)
+
+    async def _on_vm_node(self, vm_id, action):
+        """
+        Await action(node) against the node hosting vm_id, reseeding the
+        location index once if the cached node turns out to be stale.
+        """
+        node = await self._locate(vm_id)
+        if not node:
+            raise VMNotFoundError(f"VM {vm_id} not found")
+        try:
+            return await action(node)
+        except Exception as e:
+            if not _is_missing_vm(e):
+                raise
+            self.locations.forget(vm_id)
+
+        new_node = await self._locate(vm_id)
+        if not new_node or new_node == node:
+            raise VMNotFoundError(f"VM {vm_id} not found")
+        return await action(new_node)
+
+    async def _fan_out(self, calls):
+        return await afan_out(calls, settings.PROXMOX_FANOUT_WORKERS, settings.PROXMOX_FANOUT_TIMEOUT)
+
+    async def _storage_node(self, storage: str) -> str:
+        """First node (in cluster order) that has `storage`, probing all nodes at once."""
+        calls = [
+            ({"node": node['node']}, lambda n=node['node']: self._get(f"/nodes/{n}/storage/{storage}/status"))
+            for node in await self._get("/nodes")
+        ]
+        results, _ = await self._fan_out(calls)
+        return results[0][0]["node"] if results else None
+
+    async def _capacity(self) -> CapacitySnapshot:
+        """Node and storage usage, from one /cluster/resources call (cached briefly)."""
+        snapshot = self.capacity.fresh(settings.PLACEMENT_SNAPSHOT_SECONDS)
+        if snapshot is None:
+            snapshot = self.capacity.put(CapacitySnapshot.from_resources(await self._get("/cluster/resources")))
+        return snapshot
+
+    async def _place(self, build_request, config: Dict[str, Any]) -> str:
+        """Node picked by the placement strategy for await build_request(snapshot), None to keep the default."""
+        strategy_name = config.get("placement", settings.PLACEMENT_STRATEGY)
+        if not strategy_name:
+            return None
+        try:
+            snapshot = await self._capacity()
+            request = await build_request(snapshot)
+            return self.capacity.place(snapshot, request, strategy_name, settings.PLACEMENT_MAX_MEMORY_RATIO)
+        except Exception as e:
+            print(f"Placement failed, using default node: {e}")
+            return None
+
+    async def _iso_nodes(self, snapshot: CapacitySnapshot, iso_file: str) -> List[str]:
+        """Nodes that can boot iso_file: every node with its storage if shared, else the ones holding it."""
+        storage = iso_file.split(":")[0]
+        nodes = [node for (node, name) in snapshot.storages if name == storage]
+        if snapshot.is_shared(storage):
+            return nodes
+        calls = [
+            ({"node": n}, lambda n=n: self._get(f"/nodes/{n}/storage/{storage}/content", content="iso"))
+            for n in nodes
+        ]
+        results, _ = await self._fan_out(calls)
+        return [context["node"] for context, content in results if any(c.get("volid") == iso_file for c in content)]
+
+    async def _storage_type(self, storage: str) -> str:
+        if storage not in self._storage_types:
+            self._storage_types[storage] = (await self._get(f"/storage/{storage}")).get("type")
+        return self._storage_types[storage]
+
+    async def _clone_mode(self, template_id, config: Dict[str, Any]):
+        """Clone mode to use, plus the reason when a requested linked clone falls back to full."""
+        if config.get("clone_mode") != "linked":
+            return "full", None
+        disk = config.get("template_disk")
+        if not disk or not disk.get("storage"):
+            template_config = await self._on_vm_node(template_id, lambda node: self._get(f"/nodes/{node}/qemu/{template_id}/config"))
+            disk = boot_disk(template_config)
+        storage_type = await self._storage_type(disk["storage"])
+        if linked_clone_supported(storage_type, disk.get("format")):
+            return "linked", None
+        return "full", f"storage {disk['storage']} ({storage_type}) does not support linked clones"
+
+    async def get_status(self) -> Dict[str, Any]:
+        try:
+            version = await self._get("/version")
+            return {"status": "online", "version": version}
+        except Exception as e:
+            return {"status": "error", "details": str(e)}
+
+    async def get_inventory(self) -> ClusterInventory:
+        inventory = ClusterInventory.from_resources(await self._get("/cluster/resources", type="vm"))
+        self.locations.replace(inventory.node_map())
+        return inventory
+
+    async def list_vms(self) -> List[Dict[str, Any]]:
+        return [vm.to_dict() for vm in (await self.get_inventory()).vms]
+
+    async def list_templates(self) -> List[Dict[str, Any]]:
+        return [vm.to_dict() for vm in (await self.get_inventory()).templates]
+
+    async def get_vm_ip(self, vm_id: str) -> str:
+        """IPv4 reported by the guest agent (one call), None when unavailable."""
+        try:
+            interfaces = await self._on_vm_node(vm_id, lambda node: self._get(f"/nodes/{node}/qemu/{vm_id}/agent/network-get-interfaces"))
+            return first_ipv4(interfaces)
+        except:
+            return None
+
+    async def get_vm_details(self, vm_id: str) -> Dict[str, Any]:
+        async def fetch(node):
+            vm, config = await asyncio.gather(
+                self._get(f"/nodes/{node}/qemu/{vm_id}/status/current"),
+                self._get(f"/nodes/{node}/qemu/{vm_id}/config"),
+            )
+            ip_address = None
+            try:
+                interfaces = await self._get(f"/nodes/{node}/qemu/{vm_id}/agent/network-get-interfaces")
+                ip_address = first_ipv4(interfaces)
+            except:
+                pass
+            return {"config": config, "status": vm, "node": node, "ip": ip_address}
+
+        try:
+            return await self._on_vm_node(vm_id, fetch)
+        except:
+            return {}
+
+    async def create_vm(self, name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        template_id = config.get("template_id")
+        if not template_id:
+            raise Exception("Template ID is required")
+
+        if config.get("template_node"):
+            self.locations.set(template_id, config["template_node"])
+        if not await self._locate(template_id):
+            raise Exception(f"Template {template_id} not found")
+
+        new_vmid = config.get("vmid") or await self._get("/cluster/nextid")
+
+        try:
+            clone_mode, fallback = await self._clone_mode(template_id, config)
+        except Exception as e:
+            clone_mode, fallback = "full", f"could not check template storage: {e}"
+        if fallback:
+            print(f"Linked clone of {template_id} not possible, using full clone: {fallback}")
+
+        async def clone(node):
+            async def build_request(snapshot):
+                return clone_request(snapshot, {**config, "clone_mode": clone_mode}, node)
+            target = config.get("target_node") or await self._place(build_request, config) or node
+            upid = await self._post(
+                f"/nodes/{node}/qemu/{template_id}/clone",
+                newid=new_vmid, name=name, full=1 if clone_mode == "full" else 0,
+                target=target if target != node else None
+            )
+            return node, target, upid
+
+        try:
+            _, target_node, upid = await self._on_vm_node(template_id, clone)
+        except Exception as e:
+            raise Exception(f"Failed to clone VM: {e}")
+        self.locations.set(new_vmid, target_node)
+
+        # The new VM stays locked until the clone task ends, so cores/memory
+        # are returned for the "clone" task handler to apply afterwards
+        pending_config = {}
+        if "cpu" in config:
+            pending_config["cores"] = config["cpu"]
+        if "memory" in config:
+            pending_config["memory"] = config["memory"]
+
+        return {
+            "vmid": new_vmid, "node": target_node, "upid": upid, "clone_mode": clone_mode,
+            "clone_fallback": fallback, "pending_config": pending_config,
+        }
+
+    async def update_vm_config(self, vm_id: str, **params) -> None:
+        await self._on_vm_node(vm_id, lambda node: self._post(f"/nodes/{node}/qemu/{vm_id}/config", **params))
+
+    async def power_action(self, vm_id: str, action: str, **params) -> str:
+        """POST status/<action> (start, stop, shutdown, suspend...) and return the task UPID."""
+        return await self._on_vm_node(vm_id, lambda node: self._post(f"/nodes/{node}/qemu/{vm_id}/status/{action}", **params))
+
+    async def _power(self, vm_id: str, action: str) -> bool:
+        try:
+            await self.power_action(vm_id, action)
+            return True
+        except:
+            return False
+
+    async def start_vm(self, vm_id: str) -> bool:
+        return await self._power(vm_id, "start")
+
+    async def stop_vm(self, vm_id: str) -> bool:
+        return await self._power(vm_id, "stop")
+
+    async def shutdown_vm(self, vm_id: str) -> bool:
+        return await self._power(vm_id, "shutdown")
+
+    async def get_analytics(self) -> Dict[str, Any]:
+        """Cluster totals, per-node utilization and guest counts from one /cluster/resources call."""
+        resources = await self._get("/cluster/resources")
+        # Same listing placement and the location index are built from
+        self.capacity.put(CapacitySnapshot.from_resources(resources))
+        self.locations.replace(ClusterInventory.from_resources(resources).node_map())
+        return summarize_cluster(resources)
+
+    async def list_nodes(self) -> List[Dict[str, Any]]:
+        return await self._get("/nodes")
+
+    async def get_node_rrddata(self, node: str, timeframe: str = "hour") -> List[Dict[str, Any]]:
+        """One sample per minute for timeframe=hour, coarser for longer timeframes."""
+        return await self._get(f"/nodes/{node}/rrddata", timeframe=timeframe, cf="AVERAGE")
+
+    async def get_vm_rrddata(self, vm_id: str, timeframe: str = "hour") -> List[Dict[str, Any]]:
+        return await self._on_vm_node(vm_id, lambda node: self._get(f"/nodes/{node}/qemu/{vm_id}/rrddata", timeframe=timeframe, cf="AVERAGE"))
+
+    async def get_vm_stats(self, vm_id: str) -> Dict[str, Any]:
+        """Get real-time statistics for a specific VM."""
+        try:
+            vm_status = await self._on_vm_node(vm_id, lambda node: self._get(f"/nodes/{node}/qemu/{vm_id}/status/current"))
+        except:
+            return {"status": "error", "details": "VM not found"}
+        return vm_stats(vm_status)
+
+    async def get_console_ticket(self, vm_id: str) -> Dict[str, Any]:
+        """Generate a VNC ticket for NoVNC access."""
+        node = await self._locate(vm_id)
+        if not node:
+            raise Exception("VM not found")
+
+        try:
+            res = await self._on_vm_node(vm_id, lambda n: self._post(f"/nodes/{n}/qemu/{vm_id}/vncproxy", websocket=1))
+            node = self.locations.get(vm_id) or node
+            ticket = res.get("ticket")
+            if not ticket:
+                raise Exception("Failed to get VNC ticket")
+
+            return {
+                "ticket": ticket,
+                "port": res.get("port"),
+                "cert": res.get("cert"),
+                "node": node,
+                "host": self.host
+            }
+        except Exception as e:
+            raise Exception(f"Failed to generate console ticket: {e}")
+
+    async def list_isos(self) -> List[Dict[str, Any]]:
+        # Only storages that can hold ISOs, one listing per node in parallel
+        node_calls = [
+            ({"node": node['node']}, lambda n=node['node']: self._get(f"/nodes/{n}/storage", content="iso", enabled=1))
+            for node in await self._get("/nodes")
+        ]
+        node_storages, errors = await self._fan_out(node_calls)
+
+        content_calls = []
+        for context, storages in node_storages:
+            for storage in storages:
+                n, sid = context["node"], storage['storage']
+                content_calls.append((
+                    {"node": n, "storage": sid},
+                    lambda n=n, sid=sid: self._get(f"/nodes/{n}/storage/{sid}/content", content="iso")
+                ))
+        contents, content_errors = await self._fan_out(content_calls)
+        errors += content_errors
+
+        isos = FanoutResults(errors=errors)
+        for context, items in contents:
+            for item in items:
+                item['node'] = context["node"]
+                item['storage'] = context["storage"]
+                isos.append(item)
+        for error in errors:
+            print(f"list_isos: skipped {error}")
+        return isos
+
+    async def create_vm_from_iso(self, name: str, iso_file: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        storage_name = iso_file.split(":")[0]
+
+        async def build_request(snapshot):
+            return PlacementRequest(
+                memory=int(config.get("memory", 2048)) * 1024 ** 2,
+                cores=int(config.get("cpu", 2)),
+                disk=parse_size(config.get("disk_size")),
+                nodes=await self._iso_nodes(snapshot, iso_file),
+            )
+        target_node = await self._place(build_request, config) or await self._storage_node(storage_name)
+
+        if not target_node:
+            try:
+                target_node = (await self._get("/nodes"))[0]['node']
+            except:
+                raise Exception("No nodes found")
+
+        new_vmid = config.get("vmid") or await self._get("/cluster/nextid")
+
+        target_storage = "local-lvm"
+        try:
+            await self._get(f"/nodes/{target_node}/storage/local-lvm/status")
+        except:
+            target_storage = "local"
+
+        params = iso_vm_params(new_vmid, name, iso_file, target_storage, config)
+
+        try:
+            upid = await self._post(f"/nodes/{target_node}/qemu", **params)
+        except Exception as e:
+            raise Exception(f"Failed to create VM: {e}")
+        self.locations.set(new_vmid, target_node)
+
+        return {"vmid": new_vmid, "node": target_node, "upid": upid}
+
+    async def convert_to_template(self, vm_id: str) -> bool:
+        """The VM must already be stopped; callers wait on the stop task first."""
+        if not await self._locate(vm_id):
+            return False
+
+        try:
+            await self._on_vm_node(vm_id, lambda node: self._post(f"/nodes/{node}/qemu/{vm_id}/template"))
+            return True
+        except Exception as e:
+            print(f"Failed to convert to template: {e}")
+            raise e
+
+    async def download_iso(self, url: str, file_name: str, storage: str = "local") -> str:
+        target_node = await self._storage_node(storage)
+        if not target_node:
+            raise Exception(f"Storage '{storage}' not found on any node")
+
+        try:
+            upid = await self._post(
+                f"/nodes/{target_node}/storage/{storage}/download-url",
+                content="iso",
+                filename=file_name,
+                url=url
+            )
+            return str(upid)
+        except Exception as e:
+            raise Exception(f"Failed to start download: {e}")
+
+    async def get_task_status(self, upid: str, node: str) -> Dict[str, Any]:
+        try:
+            return await self._get(f"/nodes/{node}/tasks/{upid}/status")
+        except:
+            return {"status": "unknown"}
+
+    async def get_task_log(self, upid: str, node: str, start: int = 0, limit: int = 500) -> List[str]:
+        try:
+            logs = await self._get(f"/nodes/{node}/tasks/{upid}/log", start=start, limit=limit)
+            return [l.get('t', '') for l in logs]
+        except:
+            return []
+
+    async def list_cluster_tasks(self) -> List[Dict[str, Any]]:
+        return await self._get("/cluster/tasks")
+
+    async def cancel_task(self, upid: str, node: str) -> bool:
+        try:
+            await self._delete(f"/nodes/{node}/tasks/{upid}")
+            return True
+        except:
+            return False
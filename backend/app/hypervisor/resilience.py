@@ -0,0 +1,156 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+import httpx
+import requests
+from proxmoxer.core import ResourceException
+from app.core.config import settings
+
+# Statuses meaning "the node (or pveproxy in front of it) is unreachable",
+# as opposed to Proxmox refusing the request itself (missing VM, bad params...)
+UNAVAILABLE_STATUSES = {502, 503, 504, 595, 596}
+
+# Key used for calls that are not addressed to a specific node
+CLUSTER = "cluster"
+
+_NODE_PATH = re.compile(r"/nodes/([^/?]+)")
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a node whose breaker is open."""
+    pass
+
+def node_of(url: str) -> str:
+    match = _NODE_PATH.search(url)
+    return match.group(1) if match else CLUSTER
+
+def is_unavailable(e: Exception) -> bool:
+    """True for failures that say something about the node's health."""
+    if isinstance(e, (requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+        return True
+    return isinstance(e, ResourceException) and e.status_code in UNAVAILABLE_STATUSES
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff, so concurrent retries don't line up."""
+    cap = min(settings.PROXMOX_RETRY_MAX_DELAY, settings.PROXMOX_RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, cap)
+
+class CircuitBreaker:
+    """
+    closed -> open after PROXMOX_BREAKER_FAILURES consecutive failures.
+    While open every call fails at once; after PROXMOX_BREAKER_RESET_SECONDS
+    a single probe call is let through (half-open): success closes the
+    breaker, failure opens it for another period.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= settings.PROXMOX_BREAKER_RESET_SECONDS:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"Proxmox: {self.name} is reachable again, closing circuit")
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= settings.PROXMOX_BREAKER_FAILURES:
+                if self.state != "open":
+                    print(f"Proxmox: opening circuit for {self.name} after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def breaker_for(host: str, node: str) -> CircuitBreaker:
+    """Breakers are shared by the sync and async client of the same host."""
+    key = (host, node)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(f"{host}/{node}")
+            _breakers[key] = breaker
+        return breaker
+
+def breaker_states(host: str) -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        return {node: b.snapshot() for (h, node), b in _breakers.items() if h == host}
+
+def _attempts(method: str) -> int:
+    # Only reads are replayed; a retried POST could clone or start twice
+    return 1 + (settings.PROXMOX_READ_RETRIES if method.upper() == "GET" else 0)
+
+def call(host: str, method: str, url: str, send: Callable[[], Any], check: Callable[[Any], None] = None) -> Any:
+    """
+    Run one blocking Proxmox HTTP call behind the node's breaker, retrying
+    idempotent reads that failed for availability reasons.
+    `check(result)` may raise to turn a response into a failure.
+    """
+    breaker = breaker_for(host, node_of(url))
+    attempts = _attempts(method)
+    for attempt in range(attempts):
+        breaker.allow()
+        try:
+            result = send()
+            if check:
+                check(result)
+        except Exception as e:
+            if not is_unavailable(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt + 1 >= attempts:
+                raise
+            time.sleep(backoff(attempt))
+            continue
+        breaker.record_success()
+        return result
+
+async def acall(host: str, method: str, url: str, send: Callable[[], Any], check: Callable[[Any], None] = None) -> Any:
+    """asyncio version of call(); `send` returns an awaitable."""
+    breaker = breaker_for(host, node_of(url))
+    attempts = _attempts(method)
+    for attempt in range(attempts):
+        breaker.allow()
+        try:
+            result = await send()
+            if check:
+                check(result)
+        except Exception as e:
+            if not is_unavailable(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt + 1 >= attempts:
+                raise
+            await asyncio.sleep(backoff(attempt))
+            continue
+        breaker.record_success()
+        return result
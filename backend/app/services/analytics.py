@@ -0,0 +1,122 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.base import SessionLocal
+from app.hypervisor.manager import HypervisorManager
+
+_TOTAL_KEYS = ("nodes_total", "nodes_online", "cpus", "cpus_used", "mem_total", "mem_used", "disk_total", "disk_used")
+
+def _ratio(used, total) -> float:
+    return used / total if total else 0.0
+
+def course_allocation(db: Session) -> List[Dict[str, Any]]:
+    """VMs, running VMs, vCPUs and memory per course, in one grouped query."""
+    VM = models.VirtualMachine
+    rows = db.query(
+        models.Course.id,
+        models.Course.name,
+        func.count(VM.id),
+        func.sum(case((VM.status == "running", 1), else_=0)),
+        func.coalesce(func.sum(VM.cpus), 0),
+        func.coalesce(func.sum(VM.memory_total), 0),
+    ).outerjoin(VM, VM.course_id == models.Course.id).group_by(models.Course.id, models.Course.name).all()
+    return [
+        {"course_id": cid, "name": name, "vms": vms, "running": running or 0, "cpus": int(cpus), "memory_bytes": int(memory)}
+        for cid, name, vms, running, cpus, memory in rows
+    ]
+
+def merge_clusters(results: List, errors: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-hypervisor summarize_cluster() outputs into one report."""
+    totals = {k: 0 for k in _TOTAL_KEYS}
+    nodes, by_state = [], {}
+    vm_total = templates = 0
+    for hypervisor, summary in results:
+        if not summary:
+            continue
+        hypervisor_id = hypervisor.id if hypervisor else None
+        nodes.extend({**node, "hypervisor_id": hypervisor_id} for node in summary["nodes"])
+        for k in _TOTAL_KEYS:
+            totals[k] += summary["totals"][k]
+        for state, count in summary["vms"]["by_state"].items():
+            by_state[state] = by_state.get(state, 0) + count
+        vm_total += summary["vms"]["total"]
+        templates += summary["vms"]["templates"]
+
+    totals["cpu_utilization"] = _ratio(totals["cpus_used"], totals["cpus"])
+    totals["mem_utilization"] = _ratio(totals["mem_used"], totals["mem_total"])
+    totals["disk_utilization"] = _ratio(totals["disk_used"], totals["disk_total"])
+    return {
+        "totals": totals,
+        "nodes": nodes,
+        "vms": {"by_state": by_state, "total": vm_total, "templates": templates},
+        "errors": errors,
+    }
+
+class AnalyticsEngine:
+    """
+    Pre-computed analytics report shared by every viewer.
+    The report (cluster totals, per-node utilization, VMs by state, per-course
+    allocation) is rebuilt in the background every ANALYTICS_REFRESH_SECONDS
+    from one /cluster/resources call per hypervisor plus one grouped query.
+    Requests just return it; only when it is older than ANALYTICS_TTL_SECONDS
+    do they wait on a rebuild, and concurrent callers share that one rebuild.
+    """
+    def __init__(self):
+        self._report: Optional[Dict[str, Any]] = None
+        self._computed_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def _compute(self) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            results, errors = await HypervisorManager.fan_out(db, lambda hypervisor, client: client.get_analytics())
+            report = merge_clusters(results, errors)
+            report["courses"] = await asyncio.to_thread(course_allocation, db)
+        finally:
+            db.close()
+        report["generated_at"] = datetime.now(timezone.utc).isoformat()
+        self._report = report
+        self._computed_at = time.monotonic()
+        return report
+
+    def _refresh(self) -> asyncio.Task:
+        """Start a rebuild unless one is already running (single flight)."""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._compute())
+        return self._refreshing
+
+    async def get(self) -> Dict[str, Any]:
+        if self._report is not None and time.monotonic() - self._computed_at < settings.ANALYTICS_TTL_SECONDS:
+            return self._report
+        try:
+            return await asyncio.shield(self._refresh())
+        except Exception as e:
+            if self._report is None:
+                raise
+            print(f"Analytics: rebuild failed, serving previous report: {e}")
+            return self._report
+
+    async def run(self):
+        while True:
+            try:
+                await self._refresh()
+            except Exception as e:
+                print(f"Analytics: rebuild failed: {e}")
+            await asyncio.sleep(settings.ANALYTICS_REFRESH_SECONDS)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+analytics = AnalyticsEngine()
@@ -0,0 +1,139 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.db import models
+from app.db.base import SessionLocal
+from app.hypervisor.manager import HypervisorManager
+from app.services.tasks import tracker
+from app.services.templates import sync_templates
+
+KINDS = ("templates", "isos")
+
+class _Entry:
+    def __init__(self, client, hypervisor_id=None):
+        self.client = client
+        self.hypervisor_id = hypervisor_id
+        self.value = None
+        self.fetched_at = 0.0
+        self.valid = False
+        self.refreshing: Optional[asyncio.Task] = None
+
+class CatalogService:
+    """
+    In-memory template and ISO lists per hypervisor.
+    Both change a few times a semester, so they are refreshed in the
+    background every CATALOG_REFRESH_SECONDS and invalidated explicitly when
+    we change them (template finalized, ISO download finished). Reads never
+    wait more than CATALOG_STALE_GRACE_SECONDS on a slow Proxmox when an older
+    copy is available (stale-while-revalidate).
+    """
+    def __init__(self):
+        self._entries: Dict[Tuple[Any, str], _Entry] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(kind: str, hypervisor: models.Hypervisor = None) -> Tuple[Any, str]:
+        return (hypervisor.id if hypervisor else None, kind)
+
+    def _entry(self, kind: str, hypervisor: models.Hypervisor = None) -> _Entry:
+        key = self._key(kind, hypervisor)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = _Entry(HypervisorManager.get_async_client(hypervisor), key[0])
+            self._entries[key] = entry
+        return entry
+
+    async def _fetch(self, kind: str, entry: _Entry):
+        if kind == "templates":
+            value = await entry.client.list_templates()
+            try:
+                await sync_templates(entry.client, value, entry.hypervisor_id)
+            except Exception as e:
+                print(f"Catalog: failed to sync templates table: {e}")
+        else:
+            value = await entry.client.list_isos()
+        entry.value = value
+        entry.fetched_at = time.monotonic()
+        entry.valid = True
+        return value
+
+    def _refresh(self, kind: str, entry: _Entry) -> asyncio.Task:
+        """Start a refresh unless one is already running (single flight)."""
+        if entry.refreshing is None or entry.refreshing.done():
+            entry.refreshing = asyncio.create_task(self._fetch(kind, entry))
+            entry.refreshing.add_done_callback(lambda t: self._log_failure(kind, t))
+        return entry.refreshing
+
+    @staticmethod
+    def _log_failure(kind: str, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Catalog: failed to refresh {kind}: {task.exception()}")
+
+    async def get(self, kind: str, hypervisor: models.Hypervisor = None) -> List[Dict[str, Any]]:
+        entry = self._entry(kind, hypervisor)
+        age = time.monotonic() - entry.fetched_at
+        if entry.valid and age < settings.CATALOG_REFRESH_SECONDS:
+            return entry.value
+
+        task = self._refresh(kind, entry)
+        if entry.value is None:
+            return await task
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), settings.CATALOG_STALE_GRACE_SECONDS)
+        except Exception as e:
+            # Proxmox slow or failing: serve what we have, the refresh keeps going
+            print(f"Catalog: serving stale {kind} ({str(e) or 'refresh still running'})")
+            return entry.value
+
+    async def get_templates(self, hypervisor: models.Hypervisor = None) -> List[Dict[str, Any]]:
+        return await self.get("templates", hypervisor)
+
+    async def get_isos(self, hypervisor: models.Hypervisor = None) -> List[Dict[str, Any]]:
+        return await self.get("isos", hypervisor)
+
+    def invalidate(self, kind: str = None, hypervisor: models.Hypervisor = None):
+        """Mark lists as outdated and refresh them right away."""
+        for k in ([kind] if kind else KINDS):
+            entry = self._entries.get(self._key(k, hypervisor))
+            if entry is None:
+                continue
+            entry.valid = False
+            try:
+                self._refresh(k, entry)
+            except RuntimeError:
+                # No running loop (called from sync code): next read refreshes
+                pass
+
+    async def run(self):
+        """Background loop: keep every known list warm, for every hypervisor."""
+        db = SessionLocal()
+        try:
+            for hypervisor in await asyncio.to_thread(HypervisorManager.targets, db):
+                for kind in KINDS:
+                    self._entry(kind, hypervisor)
+        finally:
+            db.close()
+        while True:
+            for (_, kind), entry in list(self._entries.items()):
+                try:
+                    await self._refresh(kind, entry)
+                except Exception:
+                    pass  # already logged by _log_failure
+            await asyncio.sleep(settings.CATALOG_REFRESH_SECONDS)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+catalog = CatalogService()
+
+@tracker.on_complete("download_iso")
+def _iso_downloaded(db, task: models.HypervisorTask):
+    catalog.invalidate("isos", task.hypervisor)
@@ -0,0 +1,143 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.orm import Session, joinedload
+from app.core.config import settings
+from app.db import models
+from app.db.base import SessionLocal
+from app.hypervisor.fanout import afan_out
+from app.hypervisor.manager import HypervisorManager
+from app.services.metrics import RAW, _utc
+
+IDLE_ACTIONS = ("off", "hibernate", "shutdown")
+
+# (ts, cpu fraction, netin bytes/s, netout bytes/s)
+Sample = Tuple[datetime, Optional[float], Optional[float], Optional[float]]
+
+def idle_reason(samples: List[Sample], course: models.Course) -> Optional[str]:
+    """
+    Why the VM counts as idle over the course's window, or None if it doesn't:
+    every sample under both thresholds, and enough samples to be sure
+    (gaps in the history never make a VM look idle).
+    """
+    expected = course.idle_minutes * 60 / RAW
+    if not samples or len(samples) < settings.IDLE_MIN_COVERAGE * expected:
+        return None
+    cpu_peak = max((cpu or 0) for _, cpu, _, _ in samples) * 100
+    # Samples are bytes/s, the threshold kilobits/s
+    net_peak = max((netin or 0) + (netout or 0) for _, _, netin, netout in samples) * 8 / 1000
+    if cpu_peak > course.idle_cpu_percent or net_peak > course.idle_net_kbps:
+        return None
+    return (
+        f"idle for {course.idle_minutes} min: CPU peak {cpu_peak:.1f}% (limit {course.idle_cpu_percent:g}%), "
+        f"network peak {net_peak:.1f} kbit/s (limit {course.idle_net_kbps:g} kbit/s)"
+    )
+
+def clear_idle(db: Session, vm_ids: Iterable[int]):
+    """Forget idle-policy marks of VMs that were started again."""
+    vm_ids = list(vm_ids)
+    if vm_ids:
+        db.execute(
+            update(models.VirtualMachine).where(models.VirtualMachine.id.in_(vm_ids)).values(
+                idle_action=None, idle_reason=None, idle_at=None
+            )
+        )
+        db.commit()
+
+class IdlePolicy:
+    """
+    Every IDLE_CHECK_SECONDS looks for running VMs of courses with an idle
+    policy whose stored usage history (see metrics.py) stayed under the
+    course's CPU and network thresholds for idle_minutes, and hibernates
+    (suspend to disk, frees the RAM; the next start resumes the session) or
+    shuts them down. The action and reason are recorded on the VM. DB work
+    runs in worker threads, off the event loop.
+    """
+    def __init__(self):
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def find_idle(self, db: Session, now: datetime) -> List[Tuple[models.VirtualMachine, str, str]]:
+        candidates = []
+        for vm, course in db.query(models.VirtualMachine, models.Course).join(
+            models.Course, models.VirtualMachine.course_id == models.Course.id
+        ).options(joinedload(models.VirtualMachine.hypervisor)).filter(
+            models.Course.idle_action != "off",
+            models.VirtualMachine.status == "running",
+        ):
+            window = timedelta(minutes=course.idle_minutes)
+            # Up for the whole window, and not acted on already in it
+            if (vm.uptime or 0) < window.total_seconds():
+                continue
+            if vm.idle_at and now - _utc(vm.idle_at) < window:
+                continue
+            candidates.append((vm, course))
+        if not candidates:
+            return []
+
+        longest = max(course.idle_minutes for _, course in candidates)
+        samples = defaultdict(list)
+        for vm_id, *sample in db.query(
+            models.MetricSample.vm_id, models.MetricSample.ts, models.MetricSample.cpu,
+            models.MetricSample.netin, models.MetricSample.netout,
+        ).filter(
+            models.MetricSample.resolution == RAW,
+            models.MetricSample.vm_id.in_([vm.id for vm, _ in candidates]),
+            models.MetricSample.ts >= now - timedelta(minutes=longest),
+        ):
+            samples[vm_id].append(tuple(sample))
+
+        idle = []
+        for vm, course in candidates:
+            start = now - timedelta(minutes=course.idle_minutes)
+            reason = idle_reason([s for s in samples[vm.id] if _utc(s[0]) >= start], course)
+            if reason:
+                idle.append((vm, course.idle_action, reason))
+        return idle
+
+    async def check_once(self):
+        db = SessionLocal()
+        try:
+            now = datetime.now(timezone.utc)
+            idle = await asyncio.to_thread(self.find_idle, db, now)
+            calls = []
+            for vm, action, reason in idle:
+                client = HypervisorManager.get_async_client_for_vm(vm)
+                if action == "hibernate":
+                    call = lambda c=client, v=vm.vm_id: c.power_action(v, "suspend", todisk=1)
+                else:
+                    call = lambda c=client, v=vm.vm_id: c.power_action(v, "shutdown")
+                calls.append(({"vm": vm, "action": action, "reason": reason}, call))
+
+            results, errors = await afan_out(calls, settings.POWER_CONCURRENCY, settings.PROXMOX_FANOUT_TIMEOUT)
+            for context, upid in results:
+                vm = context["vm"]
+                vm.idle_action = context["action"]
+                vm.idle_reason = context["reason"]
+                vm.idle_at = now
+                print(f"Idle policy: {context['action']} VM {vm.vm_id} ({vm.name}), {context['reason']}")
+            for e in errors:
+                print(f"Idle policy: failed to {e['action']} VM {e['vm'].vm_id}: {e['error']}")
+            await asyncio.to_thread(db.commit)
+        finally:
+            db.close()
+
+    async def run(self):
+        while True:
+            try:
+                await self.check_once()
+            except Exception as e:
+                print(f"Idle policy: pass failed: {e}")
+            await asyncio.sleep(settings.IDLE_CHECK_SECONDS)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+idle_policy = IdlePolicy()
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.db import models
+from app.db.base import SessionLocal
+from app.hypervisor.fanout import afan_out
+from app.hypervisor.manager import HypervisorManager
+
+def _is_stale(details: dict, now: datetime) -> bool:
+    updated = (details or {}).get("ip_updated_at")
+    if not updated:
+        return True
+    return now - datetime.fromisoformat(updated) > timedelta(seconds=settings.IP_TTL_SECONDS)
+
+class IPResolver:
+    """
+    Keeps VirtualMachine.details["ip"] (plus "ip_updated_at") current so list
+    endpoints never have to ask guest agents while a user waits.
+    Running VMs are taken from the status columns the reconciler maintains;
+    the agents of the stale ones are queried concurrently (IP_BATCH_CONCURRENCY).
+    DB work runs in worker threads so the event loop is never blocked on it.
+    """
+    def __init__(self):
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def refresh_once(self):
+        # Not expired on commit: the loop reads these rows between worker-thread commits
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            for hypervisor in await asyncio.to_thread(HypervisorManager.targets, db):
+                try:
+                    await self._refresh_hypervisor(db, hypervisor)
+                except Exception as e:
+                    print(f"IP resolver: refresh of {hypervisor.name if hypervisor else 'default'} failed: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def _stale_vms(db, hypervisor: Optional[models.Hypervisor], now: datetime) -> List[models.VirtualMachine]:
+        vms = db.query(models.VirtualMachine).filter(
+            models.VirtualMachine.hypervisor_id == (hypervisor.id if hypervisor else None),
+            models.VirtualMachine.status == "running"
+        ).all()
+        return [vm for vm in vms if _is_stale(vm.details, now)]
+
+    @staticmethod
+    def _store(db, vms: List[models.VirtualMachine], ips: Dict[int, str], stamp: str):
+        for vm in vms:
+            if vm.vm_id not in ips:
+                continue
+            # Reassign so SQLAlchemy notices the JSON change
+            vm.details = {**(vm.details or {}), "ip": ips[vm.vm_id], "ip_updated_at": stamp}
+        db.commit()
+
+    async def _refresh_hypervisor(self, db, hypervisor: models.Hypervisor = None):
+        client = HypervisorManager.get_async_client(hypervisor)
+        now = datetime.now(timezone.utc)
+
+        stale = await asyncio.to_thread(self._stale_vms, db, hypervisor, now)
+        if not stale:
+            return
+
+        calls = [({"vm_id": vm.vm_id}, lambda v=vm.vm_id: client.get_vm_ip(v)) for vm in stale]
+        results, errors = await afan_out(calls, settings.IP_BATCH_CONCURRENCY, settings.PROXMOX_FANOUT_TIMEOUT)
+        ips = {context["vm_id"]: ip for context, ip in results}
+
+        await asyncio.to_thread(self._store, db, stale, ips, now.isoformat())
+        if errors:
+            print(f"IP resolver: {len(errors)} agents did not answer")
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                print(f"IP resolver: refresh failed: {e}")
+            await asyncio.sleep(settings.IP_REFRESH_SECONDS)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+ip_resolver = IPResolver()
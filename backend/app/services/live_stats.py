@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.db import models
+from app.hypervisor.fanout import afan_out
+from app.hypervisor.manager import HypervisorManager
+from app.hypervisor.proxmox import vm_stats
+
+def cost_estimate(cores: int, memory_bytes: int) -> Dict[str, Any]:
+    # Temporary cost calculation model that will need to be replaced with the actual model in the future
+    cores = int(cores or 1)
+    memory_gb = (memory_bytes or 1024 ** 3) / 1024 ** 3
+    monthly_cost = (cores * 5.0) + (memory_gb * 2.0)
+    return {
+        "monthly_usd": round(monthly_cost, 2),
+        "breakdown": f"${cores*5} (CPU) + ${round(memory_gb*2, 2)} (RAM)"
+    }
+
+def stats_with_cost(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """vm_stats() output plus the cost estimate, from the VM's own cpus / maxmem."""
+    return {**stats, "cost_estimate": cost_estimate(stats.get("cpus"), stats.get("memory_total_bytes"))}
+
+class Subscription:
+    """One viewer: the VMs it watches and a queue of stat batches for it."""
+    def __init__(self, vms: List[models.VirtualMachine], interval: float):
+        # (hypervisor_id, vmid) -> database id
+        self.targets: Dict[Tuple[Optional[int], int], int] = {(vm.hypervisor_id, vm.vm_id): vm.id for vm in vms}
+        self.hypervisors = {vm.hypervisor_id: vm.hypervisor for vm in vms}
+        self.interval = max(interval, settings.LIVE_STATS_TICK_SECONDS)
+        self.next_due = 0.0
+        # Only the latest batch matters; a slow reader skips stale ones
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    def push(self, batch: List[Dict[str, Any]]):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(batch)
+
+class StatsSampler:
+    """
+    Shared source of live VM stats for streaming endpoints.
+    While anyone is subscribed, every LIVE_STATS_TICK_SECONDS it takes one
+    /cluster/resources snapshot per hypervisor that has watched VMs and hands
+    each subscriber the stats of its VMs once its own interval is due. N
+    viewers of the same VMs cost one hypervisor query per tick, not N.
+    """
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def subscribe(self, vms: List[models.VirtualMachine], interval: float) -> Subscription:
+        subscription = Subscription(vms, interval)
+        self._subscriptions.add(subscription)
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self.run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    async def tick(self):
+        now = time.monotonic()
+        due = [s for s in self._subscriptions if s.next_due <= now]
+        if not due:
+            return
+
+        hypervisors = {}
+        for s in due:
+            hypervisors.update(s.hypervisors)
+        calls = [
+            ({"hypervisor_id": hypervisor_id}, lambda h=hypervisor: HypervisorManager.get_async_client(h).get_inventory())
+            for hypervisor_id, hypervisor in hypervisors.items()
+        ]
+        results, errors = await afan_out(calls, len(calls), settings.PROXMOX_FANOUT_TIMEOUT)
+        inventories = {context["hypervisor_id"]: inventory for context, inventory in results}
+        failed = {e["hypervisor_id"]: e["error"] for e in errors}
+
+        for s in due:
+            batch = []
+            for (hypervisor_id, vmid), vm_id in s.targets.items():
+                entry = {"id": vm_id, "vm_id": vmid}
+                if hypervisor_id in failed:
+                    entry.update({"status": "error", "details": failed[hypervisor_id]})
+                else:
+                    resource = inventories[hypervisor_id].get(vmid)
+                    if resource is None:
+                        entry.update({"status": "error", "details": "VM not found"})
+                    else:
+                        entry.update(stats_with_cost(vm_stats(resource.to_dict())))
+                batch.append(entry)
+            s.push(batch)
+            s.next_due = now + s.interval
+
+    async def run(self):
+        while self._subscriptions:
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"Live stats: tick failed: {e}")
+            await asyncio.sleep(settings.LIVE_STATS_TICK_SECONDS)
+
+    async def stop(self):
+        self._subscriptions.clear()
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+sampler = StatsSampler()
@@ -0,0 +1,291 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.base import SessionLocal
+from app.hypervisor.fanout import afan_out
+from app.hypervisor.manager import HypervisorManager
+
+RAW = 60
+ROLLUP = 900
+RESOLUTIONS = (RAW, ROLLUP)
+
+# rrddata field names differ between nodes and guests
+_NODE_FIELDS = {"cpu": "cpu", "mem": "memused", "maxmem": "memtotal", "netin": "netin", "netout": "netout"}
+_VM_FIELDS = {
+    "cpu": "cpu", "mem": "mem", "maxmem": "maxmem", "netin": "netin", "netout": "netout",
+    "diskread": "diskread", "diskwrite": "diskwrite",
+}
+_VALUES = ("cpu", "mem", "maxmem", "netin", "netout", "diskread", "diskwrite")
+
+def _utc(dt: datetime) -> datetime:
+    # SQLite hands back naive datetimes; everything we store is UTC
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+def _epoch(dt: datetime) -> int:
+    return int(_utc(dt).timestamp())
+
+def vm_subject(vm_id: int) -> str:
+    return f"vm:{vm_id}"
+
+def node_subject(hypervisor_id: Optional[int], node: str) -> str:
+    return f"node:{hypervisor_id or 0}:{node}"
+
+def rrd_samples(points: List[Dict[str, Any]], kind: str) -> List[Dict[str, Any]]:
+    """rrddata points -> {"ts", cpu, mem, ...}; points without data (gaps) are dropped."""
+    fields = _NODE_FIELDS if kind == "node" else _VM_FIELDS
+    samples = []
+    for p in points or []:
+        if p.get("time") is None or p.get("cpu") is None:
+            continue
+        sample = {"ts": datetime.fromtimestamp(int(p["time"]), timezone.utc)}
+        for column, key in fields.items():
+            sample[column] = p.get(key)
+        samples.append(sample)
+    return samples
+
+def _rollup_bucket(rows: List[models.MetricSample]) -> Dict[str, Any]:
+    def avg(values):
+        values = [v for v in values if v is not None]
+        return sum(values) / len(values) if values else None
+    def peak(values):
+        values = [v for v in values if v is not None]
+        return max(values) if values else None
+
+    bucket = {c: avg(getattr(r, c) for r in rows) for c in _VALUES}
+    bucket["mem"] = int(bucket["mem"]) if bucket["mem"] is not None else None
+    bucket["maxmem"] = peak(r.maxmem for r in rows)
+    bucket["cpu_max"] = peak(r.cpu_max for r in rows)
+    bucket["mem_max"] = peak(r.mem_max for r in rows)
+    return bucket
+
+def store_samples(db: Session, subject: str, kind: str, node: str, samples: List[Dict[str, Any]],
+                  hypervisor_id: Optional[int] = None, vm_id: Optional[int] = None, since: Optional[datetime] = None) -> int:
+    """Add raw samples newer than `since` (the latest one already stored for the subject)."""
+    since_epoch = _epoch(since) if since else 0
+    added = 0
+    for s in samples:
+        if _epoch(s["ts"]) <= since_epoch:
+            continue
+        db.add(models.MetricSample(
+            subject=subject, kind=kind, node=node, hypervisor_id=hypervisor_id, vm_id=vm_id,
+            resolution=RAW, ts=s["ts"],
+            cpu_max=s.get("cpu"), mem_max=s.get("mem"),
+            **{c: s.get(c) for c in _VALUES},
+        ))
+        added += 1
+    return added
+
+def roll_up(db: Session, now: datetime) -> int:
+    """
+    Fold raw samples of every finished 15-minute bucket (within the last
+    METRICS_ROLLUP_LOOKBACK_SECONDS) into one ROLLUP row per subject.
+    """
+    # Sessions don't autoflush: make samples added in this pass visible first
+    db.flush()
+    # rrddata lags a little behind real time: leave the last samples a moment to arrive
+    settled = _epoch(now) - 2 * RAW
+    end = datetime.fromtimestamp(settled // ROLLUP * ROLLUP, timezone.utc)
+    start = end - timedelta(seconds=settings.METRICS_ROLLUP_LOOKBACK_SECONDS)
+
+    done = {
+        (subject, _epoch(ts)) for subject, ts in db.query(models.MetricSample.subject, models.MetricSample.ts).filter(
+            models.MetricSample.resolution == ROLLUP,
+            models.MetricSample.ts >= start,
+        )
+    }
+    buckets = defaultdict(list)
+    for row in db.query(models.MetricSample).filter(
+        models.MetricSample.resolution == RAW,
+        models.MetricSample.ts >= start,
+        models.MetricSample.ts < end,
+    ):
+        bucket = _epoch(row.ts) // ROLLUP * ROLLUP
+        if (row.subject, bucket) not in done:
+            buckets[(row.subject, bucket)].append(row)
+
+    for (subject, bucket), rows in buckets.items():
+        first = rows[0]
+        db.add(models.MetricSample(
+            subject=subject, kind=first.kind, node=rows[-1].node, hypervisor_id=first.hypervisor_id,
+            vm_id=first.vm_id, resolution=ROLLUP, ts=datetime.fromtimestamp(bucket, timezone.utc),
+            **_rollup_bucket(rows),
+        ))
+    return len(buckets)
+
+def prune(db: Session, now: datetime) -> int:
+    deleted = 0
+    for resolution, keep in (
+        (RAW, timedelta(hours=settings.METRICS_RAW_RETENTION_HOURS)),
+        (ROLLUP, timedelta(days=settings.METRICS_ROLLUP_RETENTION_DAYS)),
+    ):
+        deleted += db.query(models.MetricSample).filter(
+            models.MetricSample.resolution == resolution,
+            models.MetricSample.ts < now - keep,
+        ).delete(synchronize_session=False)
+    return deleted
+
+def pick_resolution(start: datetime, now: datetime, resolution: Optional[int] = None) -> int:
+    """Raw samples while they are still kept for the whole range, roll-ups otherwise."""
+    if resolution in RESOLUTIONS:
+        return resolution
+    raw_horizon = now - timedelta(hours=settings.METRICS_RAW_RETENTION_HOURS)
+    return RAW if _utc(start) >= raw_horizon else ROLLUP
+
+def query_series(db: Session, start: datetime, end: datetime, resolution: Optional[int] = None,
+                 subjects: Iterable[str] = None, vm_ids: Iterable[int] = None) -> Dict[str, Any]:
+    """
+    Stored history for some subjects (or VMs), merged per timestamp: CPU is
+    averaged over the merged series, memory and I/O are summed (so a course
+    series is the footprint of all its VMs). Includes a summary of the range.
+    """
+    resolution = pick_resolution(start, datetime.now(timezone.utc), resolution)
+    query = db.query(models.MetricSample).filter(
+        models.MetricSample.resolution == resolution,
+        models.MetricSample.ts >= start,
+        models.MetricSample.ts <= end,
+    )
+    if subjects is not None:
+        query = query.filter(models.MetricSample.subject.in_(list(subjects)))
+    if vm_ids is not None:
+        query = query.filter(models.MetricSample.vm_id.in_(list(vm_ids)))
+
+    by_ts = defaultdict(list)
+    for row in query.order_by(models.MetricSample.ts):
+        by_ts[_epoch(row.ts)].append(row)
+
+    def total(rows, column):
+        values = [getattr(r, column) for r in rows if getattr(r, column) is not None]
+        return sum(values) if values else None
+
+    points = []
+    for epoch, rows in sorted(by_ts.items()):
+        cpus = [r.cpu for r in rows if r.cpu is not None]
+        points.append({
+            "ts": datetime.fromtimestamp(epoch, timezone.utc),
+            "series": len(rows),
+            "cpu": sum(cpus) / len(cpus) if cpus else None,
+            "cpu_max": max((r.cpu_max for r in rows if r.cpu_max is not None), default=None),
+            **{c: total(rows, c) for c in ("mem", "mem_max", "maxmem", "netin", "netout", "diskread", "diskwrite")},
+        })
+
+    cpu_values = [p["cpu"] for p in points if p["cpu"] is not None]
+    mem_values = [p["mem"] for p in points if p["mem"] is not None]
+    summary = {
+        "cpu_avg": sum(cpu_values) / len(cpu_values) if cpu_values else None,
+        "cpu_peak": max((p["cpu_max"] for p in points if p["cpu_max"] is not None), default=None),
+        "mem_avg": sum(mem_values) / len(mem_values) if mem_values else None,
+        "mem_peak": max((p["mem_max"] for p in points if p["mem_max"] is not None), default=None),
+    }
+    return {"resolution": resolution, "start": start, "end": end, "points": points, "summary": summary}
+
+class MetricsCollector:
+    """
+    Every METRICS_INGEST_SECONDS pulls the last hour of rrddata (1-minute
+    samples) of every online node and running VM, stores what is new, rolls
+    finished 15-minute buckets up and drops samples past their retention.
+    Dashboards then read history from the database only. DB work runs in
+    worker threads, off the event loop.
+    """
+    def __init__(self):
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _running_vms(db: Session, hypervisor_id: Optional[int]) -> List[models.VirtualMachine]:
+        return db.query(models.VirtualMachine).filter(
+            models.VirtualMachine.hypervisor_id == hypervisor_id,
+            models.VirtualMachine.status == "running",
+        ).all()
+
+    @staticmethod
+    def _store(db: Session, hypervisor_id: Optional[int], results: List[Tuple[Dict[str, Any], Any]]) -> int:
+        batches = []
+        for context, points in results:
+            if context["kind"] == "node":
+                subject = node_subject(hypervisor_id, context["node"])
+                batches.append((subject, "node", context["node"], None, rrd_samples(points, "node")))
+            else:
+                vm = context["vm"]
+                batches.append((vm_subject(vm.id), "vm", vm.node or (vm.details or {}).get("node") or "",
+                                vm.id, rrd_samples(points, "vm")))
+        oldest = min((s["ts"] for *_, samples in batches for s in samples), default=None)
+        if oldest is None:
+            return 0
+
+        # Latest stored sample of just these subjects, within the fetched window
+        # (an older one can't hide any fetched sample): an index range scan on
+        # (subject, resolution, ts) instead of a GROUP BY over all retained rows
+        latest = dict(db.query(models.MetricSample.subject, func.max(models.MetricSample.ts)).filter(
+            models.MetricSample.subject.in_([subject for subject, *_ in batches]),
+            models.MetricSample.resolution == RAW,
+            models.MetricSample.ts >= oldest,
+        ).group_by(models.MetricSample.subject).all())
+
+        added = 0
+        for subject, kind, node, vm_id, samples in batches:
+            added += store_samples(db, subject, kind, node, samples, hypervisor_id=hypervisor_id, vm_id=vm_id,
+                                   since=latest.get(subject))
+        # Per cluster: a later cluster failing can't roll these samples back
+        db.commit()
+        return added
+
+    @staticmethod
+    def _finish_pass(db: Session, now: datetime):
+        roll_up(db, now)
+        prune(db, now)
+        db.commit()
+
+    async def _collect(self, db: Session, hypervisor: Optional[models.Hypervisor]) -> int:
+        client = HypervisorManager.get_async_client(hypervisor)
+        hypervisor_id = hypervisor.id if hypervisor else None
+
+        nodes = [n["node"] for n in await client.list_nodes() if n.get("status") == "online"]
+        vms = await asyncio.to_thread(self._running_vms, db, hypervisor_id)
+
+        calls = [({"kind": "node", "node": n}, lambda n=n: client.get_node_rrddata(n)) for n in nodes]
+        calls += [
+            ({"kind": "vm", "vm": vm}, lambda v=vm.vm_id: client.get_vm_rrddata(v))
+            for vm in vms
+        ]
+        results, errors = await afan_out(calls, settings.PROXMOX_FANOUT_WORKERS, settings.PROXMOX_FANOUT_TIMEOUT)
+        if errors:
+            print(f"Metrics: {len(errors)} rrddata calls failed")
+        return await asyncio.to_thread(self._store, db, hypervisor_id, results)
+
+    async def collect_once(self):
+        # Not expired on commit: the loop reads these rows between worker-thread commits
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            for hypervisor in await asyncio.to_thread(HypervisorManager.targets, db):
+                try:
+                    await self._collect(db, hypervisor)
+                except Exception as e:
+                    # Only drops what this cluster left uncommitted
+                    await asyncio.to_thread(db.rollback)
+                    print(f"Metrics: collection from {hypervisor.name if hypervisor else 'default'} failed: {e}")
+            await asyncio.to_thread(self._finish_pass, db, datetime.now(timezone.utc))
+        finally:
+            db.close()
+
+    async def run(self):
+        while True:
+            try:
+                await self.collect_once()
+            except Exception as e:
+                print(f"Metrics: pass failed: {e}")
+            await asyncio.sleep(settings.METRICS_INGEST_SECONDS)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+collector = MetricsCollector()
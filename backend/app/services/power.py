@@ -0,0 +1,84 @@
+import asyncio
+from collections import Counter, defaultdict, deque
+from typing import Any, Dict, List
+from app.core.config import settings
+from app.db import models
+from app.hypervisor.manager import HypervisorManager
+
+POWER_ACTIONS = ("start", "stop", "shutdown")
+
+# State a VM ends up in after the action; VMs already there are skipped
+_TARGET_STATE = {"start": "running", "stop": "stopped", "shutdown": "stopped"}
+
+def _result(vm: models.VirtualMachine, status: str, **extra) -> Dict[str, Any]:
+    return {"id": vm.id, "vm_id": vm.vm_id, "name": vm.name, "status": status, **extra}
+
+async def _power_cluster(hypervisor, vms: List[models.VirtualMachine], action: str) -> List[Dict[str, Any]]:
+    client = HypervisorManager.get_async_client(hypervisor)
+    try:
+        # One snapshot resolves every VM's node (and reseeds the client's location index)
+        inventory = await client.get_inventory()
+    except Exception as e:
+        return [_result(vm, "error", error=f"Cluster unavailable: {e}") for vm in vms]
+
+    by_vmid = {r.vmid: r for r in inventory.resources}
+    results = []
+    by_node = defaultdict(deque)
+    for vm in vms:
+        resource = by_vmid.get(int(vm.vm_id))
+        if resource is None or resource.template:
+            results.append(_result(vm, "error", error="VM not found"))
+        elif resource.status == _TARGET_STATE[action]:
+            results.append(_result(vm, "skipped", node=resource.node, state=resource.status))
+        else:
+            by_node[resource.node].append(vm)
+
+    cluster_slots = asyncio.Semaphore(settings.POWER_CONCURRENCY)
+
+    async def act(vm: models.VirtualMachine, node: str) -> Dict[str, Any]:
+        # Taken once the node has room, so VMs queued behind a busy node
+        # never hold a slot other nodes could use. The deadline starts here too
+        async with cluster_slots:
+            try:
+                upid = await asyncio.wait_for(client.power_action(vm.vm_id, action), settings.PROXMOX_FANOUT_TIMEOUT)
+            except asyncio.TimeoutError:
+                return _result(vm, "error", node=node, error=f"timed out after {settings.PROXMOX_FANOUT_TIMEOUT}s")
+            except Exception as e:
+                return _result(vm, "error", node=node, error=str(e))
+        return _result(vm, "ok", node=node, upid=str(upid))
+
+    async def node_worker(node: str, queue: deque) -> List[Dict[str, Any]]:
+        done = []
+        while queue:
+            done.append(await act(queue.popleft(), node))
+        return done
+
+    # POWER_NODE_CONCURRENCY workers per node drain that node's VMs
+    workers = [
+        node_worker(node, queue)
+        for node, queue in by_node.items()
+        for _ in range(min(settings.POWER_NODE_CONCURRENCY, len(queue)))
+    ]
+    for done in await asyncio.gather(*workers):
+        results += done
+    return results
+
+async def bulk_power(vms: List[models.VirtualMachine], action: str) -> Dict[str, Any]:
+    """
+    Run a power action on many VMs at once: one inventory call per cluster
+    instead of a node lookup per VM, then all actions concurrently with at
+    most POWER_NODE_CONCURRENCY in flight per node. Returns a per-VM result
+    (ok with the task UPID, skipped if already in the target state, or error).
+    """
+    by_hypervisor = defaultdict(list)
+    for vm in vms:
+        by_hypervisor[vm.hypervisor_id].append(vm)
+    per_cluster = await asyncio.gather(*[
+        _power_cluster(group[0].hypervisor, group, action) for group in by_hypervisor.values()
+    ])
+    results = sorted((r for cluster in per_cluster for r in cluster), key=lambda r: r["id"])
+    return {
+        "action": action,
+        "results": results,
+        "summary": dict(Counter(r["status"] for r in results)),
+    }
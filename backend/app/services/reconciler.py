@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.base import SessionLocal
+from app.hypervisor.inventory import ClusterInventory
+from app.hypervisor.manager import HypervisorManager
+
+# Lifecycle states owned by our own workflows (clone tracking, template
+# building, failed clones); the reconciler leaves these rows alone
+MANAGED_STATUSES = {"creating", "draft_template", "template", "error"}
+
+# Status of a VM that is in the DB but no longer in its cluster
+MISSING = "missing"
+
+_COLUMNS = ("status", "node", "cpu_usage", "cpus", "memory_used", "memory_total", "uptime")
+
+def diff_vms(rows: List[Any], inventory: ClusterInventory, now: datetime) -> List[Dict[str, Any]]:
+    """
+    Update mappings ({"id": ..., column: value}) for the rows whose stored
+    state differs from the cluster snapshot.
+    """
+    changes = []
+    for row in rows:
+        if row.status in MANAGED_STATUSES:
+            continue
+        vm = inventory.get(row.vm_id)
+        if vm is None or vm.template:
+            observed = {"status": MISSING}
+        else:
+            observed = {
+                "status": vm.status,
+                "node": vm.node,
+                "cpu_usage": vm.cpu,
+                "cpus": vm.maxcpu,
+                "memory_used": vm.mem,
+                "memory_total": vm.maxmem,
+                "uptime": vm.uptime,
+            }
+        changed = {k: v for k, v in observed.items() if getattr(row, k) != v}
+        if changed:
+            changes.append({"id": row.id, **changed, "synced_at": now})
+    return changes
+
+class StatusReconciler:
+    """
+    Keeps status, node and usage columns of virtual_machines in line with
+    the clusters: one /cluster/resources snapshot per hypervisor every
+    RECONCILE_SECONDS, diffed against the DB and written back as one bulk
+    UPDATE in a single transaction (in a worker thread, off the event loop).
+    Read endpoints serve these columns and never have to ask Proxmox for a
+    VM's state.
+    """
+    def __init__(self):
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def apply(self, db: Session, hypervisor: Optional[models.Hypervisor], inventory: ClusterInventory) -> int:
+        hypervisor_id = hypervisor.id if hypervisor else None
+        rows = db.query(
+            models.VirtualMachine.id,
+            models.VirtualMachine.vm_id,
+            *[getattr(models.VirtualMachine, c) for c in _COLUMNS],
+        ).filter(models.VirtualMachine.hypervisor_id == hypervisor_id).all()
+
+        changes = diff_vms(rows, inventory, datetime.now(timezone.utc))
+        if changes:
+            db.execute(update(models.VirtualMachine), changes)
+        db.commit()
+        return len(changes)
+
+    async def reconcile_once(self):
+        db = SessionLocal()
+        try:
+            results, errors = await HypervisorManager.fan_out(db, lambda hypervisor, client: client.get_inventory())
+            for e in errors:
+                # Without a snapshot we know nothing: keep the last known state
+                print(f"Status reconciler: skipping {e['hypervisor']}: {e['error']}")
+            for hypervisor, inventory in results:
+                await asyncio.to_thread(self.apply, db, hypervisor, inventory)
+        finally:
+            db.close()
+
+    async def run(self):
+        while True:
+            try:
+                await self.reconcile_once()
+            except Exception as e:
+                print(f"Status reconciler: pass failed: {e}")
+            await asyncio.sleep(settings.RECONCILE_SECONDS)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+reconciler = StatusReconciler()
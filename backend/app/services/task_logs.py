@@ -0,0 +1,72 @@
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.hypervisor.base import AsyncHypervisorClient
+
+# "downloaded 1.2 GiB of 4.7 GiB (25.53%)", "transferred ... (10.00%)", "progress 42%"
+_PROGRESS = re.compile(r'(\d+(?:\.\d+)?)%')
+
+def parse_progress(lines: List[str]) -> Optional[float]:
+    """Last percentage found in the lines, if any."""
+    for line in reversed(lines):
+        matches = _PROGRESS.findall(line)
+        if matches:
+            return min(float(matches[-1]), 100.0)
+    return None
+
+class TaskLog:
+    """What we know of one task's log: lines read so far, recent lines, progress."""
+    def __init__(self):
+        self.offset = 0
+        self.progress = 0.0
+        self.recent: deque = deque(maxlen=settings.TASK_LOG_BUFFER_LINES)
+        self.lock = asyncio.Lock()
+        self.touched = time.monotonic()
+
+    def since(self, line: int) -> List[str]:
+        """Buffered lines from line number `line` on (older ones have been dropped)."""
+        first = self.offset - len(self.recent)
+        return list(self.recent)[max(line - first, 0):]
+
+class TaskLogReader:
+    """
+    Incremental task log reader shared by pollers and streams.
+    Keeps a cursor per UPID and only asks Proxmox for lines past it (log
+    `start` parameter), parsing progress from those new lines alone, so a
+    long download costs the same per update however long its log gets.
+    Cursors not read for TASK_LOG_IDLE_SECONDS are dropped.
+    """
+    def __init__(self):
+        self._logs: Dict[str, TaskLog] = {}
+
+    def _evict(self, now: float):
+        for upid in [u for u, log in self._logs.items() if now - log.touched > settings.TASK_LOG_IDLE_SECONDS]:
+            del self._logs[upid]
+
+    async def read(self, client: AsyncHypervisorClient, upid: str, node: str, since: int = 0) -> Tuple[TaskLog, List[str]]:
+        """Fetch new lines of the task log; returns the log state and the lines from `since` on."""
+        now = time.monotonic()
+        self._evict(now)
+        log = self._logs.setdefault(upid, TaskLog())
+        log.touched = now
+
+        # One fetch per UPID at a time; concurrent readers share its result
+        async with log.lock:
+            while True:
+                page = await client.get_task_log(upid, node, start=log.offset, limit=settings.TASK_LOG_PAGE_LINES)
+                log.offset += len(page)
+                log.recent.extend(page)
+                progress = parse_progress(page)
+                if progress is not None:
+                    log.progress = progress
+                if len(page) < settings.TASK_LOG_PAGE_LINES:
+                    break
+        return log, log.since(since)
+
+    def forget(self, upid: str):
+        self._logs.pop(upid, None)
+
+task_logs = TaskLogReader()
@@ -0,0 +1,186 @@
+import asyncio
+import inspect
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from sqlalchemy.orm import Session, joinedload
+from app.core.config import settings
+from app.db import models
+from app.db.base import SessionLocal
+from app.hypervisor.manager import HypervisorManager
+
+def upid_node(upid: str, default: str = "pve") -> str:
+    # UPID:node:pid:pstart:starttime:type:id:user@realm:
+    parts = upid.split(":")
+    return parts[1] if len(parts) > 1 else default
+
+def register_task(
+    db: Session,
+    upid: str,
+    kind: str,
+    vm: models.VirtualMachine = None,
+    hypervisor_id: int = None,
+) -> Optional[models.HypervisorTask]:
+    """Record a Proxmox task so the tracker follows it to completion."""
+    if not upid:
+        return None
+    task = models.HypervisorTask(
+        upid=str(upid),
+        node=upid_node(str(upid)),
+        kind=kind,
+        vm_id=vm.id if vm else None,
+        hypervisor_id=hypervisor_id,
+    )
+    db.add(task)
+    db.commit()
+    return task
+
+class TaskTracker:
+    """
+    Follows every outstanding Proxmox task with one /cluster/tasks call per
+    hypervisor per tick (TASK_POLL_SECONDS), instead of one poller per task.
+    When a task ends its row is updated, the completion handlers registered
+    for its kind run, and coroutines blocked in wait() are released.
+    Queries and commits run in worker threads, off the event loop.
+    """
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable]] = defaultdict(list)
+        self._waiters: Dict[str, List[asyncio.Future]] = defaultdict(list)
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def on_complete(self, kind: str):
+        """Decorator: handler(db, task), plain or async, runs once a task of `kind` has ended."""
+        def register(handler: Callable):
+            self._handlers[kind].append(handler)
+            return handler
+        return register
+
+    async def wait(self, upid: str, timeout: float) -> Dict[str, str]:
+        """Wait until the tracker sees `upid` end; raises asyncio.TimeoutError."""
+        # Registered before the DB check: a task finishing in between still
+        # resolves the future instead of leaving us waiting out the timeout
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[upid].append(future)
+        try:
+            ended = await asyncio.to_thread(self._ended, upid)
+            if ended:
+                return ended
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            waiters = self._waiters.get(upid)
+            if waiters is not None and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[upid]
+
+    @staticmethod
+    def _ended(upid: str) -> Optional[Dict[str, str]]:
+        db = SessionLocal()
+        try:
+            task = db.query(models.HypervisorTask).filter(models.HypervisorTask.upid == upid).first()
+            if task and task.status != "running":
+                return {"status": task.status, "exit_status": task.exit_status}
+            return None
+        finally:
+            db.close()
+
+    @staticmethod
+    def _running(db: Session) -> Dict[Optional[int], List[models.HypervisorTask]]:
+        """Running tasks by hypervisor, with what the handlers use loaded up front."""
+        running = db.query(models.HypervisorTask).options(
+            joinedload(models.HypervisorTask.hypervisor),
+            joinedload(models.HypervisorTask.vm).joinedload(models.VirtualMachine.hypervisor),
+        ).filter(models.HypervisorTask.status == "running").all()
+        by_hypervisor = defaultdict(list)
+        for task in running:
+            by_hypervisor[task.hypervisor_id].append(task)
+        return by_hypervisor
+
+    @staticmethod
+    def _mark_finished(db: Session, task: models.HypervisorTask, exit_status: str):
+        task.status = "ok" if exit_status == "OK" else "error"
+        task.exit_status = exit_status
+        task.finished_at = datetime.now(timezone.utc)
+        db.commit()
+
+    async def _finish(self, db: Session, task: models.HypervisorTask, exit_status: str):
+        await asyncio.to_thread(self._mark_finished, db, task, exit_status)
+
+        for handler in self._handlers.get(task.kind, []):
+            try:
+                result = handler(db, task)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"Task tracker: {task.kind} handler failed for {task.upid}: {e}")
+
+        result = {"status": task.status, "exit_status": exit_status}
+        for future in self._waiters.pop(task.upid, []):
+            if not future.done():
+                future.set_result(result)
+
+    async def poll_once(self):
+        # Not expired on commit: handlers read the task rows after worker-thread commits
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            by_hypervisor = await asyncio.to_thread(self._running, db)
+            for tasks in by_hypervisor.values():
+                client = HypervisorManager.get_async_client(tasks[0].hypervisor)
+                try:
+                    listed = {t["upid"]: t for t in await client.list_cluster_tasks()}
+                except Exception as e:
+                    print(f"Task tracker: failed to list cluster tasks: {e}")
+                    continue
+
+                for task in tasks:
+                    entry = listed.get(task.upid)
+                    if entry is not None:
+                        if entry.get("endtime"):
+                            await self._finish(db, task, entry.get("status", ""))
+                        continue
+                    # Fell out of the recent task list: ask the node directly
+                    status = await client.get_task_status(task.upid, task.node)
+                    if status.get("status") == "stopped":
+                        await self._finish(db, task, status.get("exitstatus", ""))
+        finally:
+            db.close()
+
+    async def run(self):
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"Task tracker: poll failed: {e}")
+            await asyncio.sleep(settings.TASK_POLL_SECONDS)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+tracker = TaskTracker()
+
+@tracker.on_complete("clone")
+async def _vm_created(db: Session, task: models.HypervisorTask):
+    """
+    A cloned VM is usable once its clone task is done and the cores/memory
+    requested for it (held back while the clone locked it) are set.
+    """
+    vm = task.vm
+    if not vm or vm.status != "creating":
+        return
+    details = dict(vm.details or {})
+    pending_config = details.pop("pending_config", None)
+    if task.status == "ok" and pending_config:
+        try:
+            # Resolved to the node the VM was cloned to, not the template's
+            await HypervisorManager.get_async_client_for_vm(vm).update_vm_config(vm.vm_id, **pending_config)
+        except Exception as e:
+            print(f"Warning: Failed to update VM config: {e}")
+    vm.details = details
+    vm.status = "stopped" if task.status == "ok" else "error"
+    await asyncio.to_thread(db.commit)
@@ -0,0 +1,98 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.db import models
+from app.db.base import SessionLocal
+from app.hypervisor.proxmox import boot_disk, cdrom_iso
+
+def template_location(db: Session, template_id: int, hypervisor_id: int = None) -> Optional[models.Template]:
+    """Registered template row for a Proxmox template vmid (None if unknown)."""
+    return db.query(models.Template).filter(
+        models.Template.vm_id == template_id,
+        models.Template.hypervisor_id == hypervisor_id
+    ).first()
+
+def clone_source(template: Optional[models.Template]) -> Dict[str, Any]:
+    """create_vm config entries describing where a registered template lives."""
+    if not template:
+        return {}
+    return {
+        "template_node": template.node,
+        "template_disk": {"storage": template.storage, "format": template.disk_format, "size": template.disk_size},
+    }
+
+def upsert_template(
+    db: Session,
+    vm_id: int,
+    name: str,
+    node: str,
+    config: Dict[str, Any],
+    source_iso: str = None,
+    hypervisor_id: int = None,
+) -> models.Template:
+    """Create or update the registry row for a template from its qemu config."""
+    template = template_location(db, vm_id, hypervisor_id)
+    if not template:
+        template = models.Template(vm_id=vm_id, hypervisor_id=hypervisor_id)
+        db.add(template)
+
+    disk = boot_disk(config)
+    template.name = name or config.get("name")
+    template.node = node
+    template.storage = disk.get("storage")
+    template.disk_size = disk.get("size")
+    template.disk_format = disk.get("format")
+    template.os_type = config.get("ostype")
+    template.source_iso = source_iso or cdrom_iso(config) or template.source_iso
+    db.commit()
+    return template
+
+def _registered(row: Optional[models.Template]) -> bool:
+    return bool(row and row.storage and row.disk_format)
+
+def _apply_listing(
+    db: Session,
+    rows: Dict[int, models.Template],
+    templates: List[Dict[str, Any]],
+    configs: Dict[int, Dict[str, Any]],
+    hypervisor_id: int = None,
+):
+    seen = set()
+    for t in templates:
+        vmid = int(t["vmid"])
+        seen.add(vmid)
+        row = rows.get(vmid)
+        if _registered(row):
+            row.node = t["node"]
+            row.name = t.get("name") or row.name
+        elif vmid in configs:
+            upsert_template(db, vmid, t.get("name"), t["node"], configs[vmid], hypervisor_id=hypervisor_id)
+
+    for vmid, row in rows.items():
+        if vmid not in seen:
+            db.delete(row)
+    db.commit()
+
+async def sync_templates(client, templates: List[Dict[str, Any]], hypervisor_id: int = None):
+    """
+    Bring the templates table in line with a fresh template listing.
+    Node placement is refreshed for every row, the qemu config is only read
+    for templates we haven't registered yet, and rows whose template is gone
+    are deleted. Queries and commits run in a worker thread, off the event loop.
+    """
+    db = SessionLocal()
+    try:
+        rows = await asyncio.to_thread(lambda: {
+            t.vm_id: t for t in db.query(models.Template).filter(models.Template.hypervisor_id == hypervisor_id)
+        })
+        configs = {}
+        for t in templates:
+            vmid = int(t["vmid"])
+            if _registered(rows.get(vmid)):
+                continue
+            details = await client.get_vm_details(vmid)
+            if details:
+                configs[vmid] = details.get("config", {})
+        await asyncio.to_thread(_apply_listing, db, rows, templates, configs, hypervisor_id)
+    finally:
+        db.close()
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+
+MAX_ATTEMPTS = 5
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def release_expired(db: Session, hypervisor_id: int = 0) -> int:
+    """Reclaim reservations whose lease ran out (crashed or abandoned provisioning)."""
+    released = db.query(models.VMIDReservation).filter(
+        models.VMIDReservation.hypervisor_id == hypervisor_id,
+        models.VMIDReservation.lease_expires_at < _now()
+    ).delete(synchronize_session=False)
+    db.commit()
+    if released:
+        print(f"VMID allocator: reclaimed {released} expired reservations")
+    return released
+
+def reserve_vmids(db: Session, count: int, used_vmids: Iterable[int], hypervisor_id: int = 0) -> List[int]:
+    """
+    Reserve `count` VMIDs that are neither used in the cluster (`used_vmids`,
+    typically ClusterInventory.used_vmids()) nor reserved by another allocator.
+    The block is inserted in one transaction; if another worker grabbed one
+    of the same IDs first the unique constraint fails and we pick again.
+    """
+    if count <= 0:
+        return []
+    release_expired(db, hypervisor_id)
+    used = set(int(v) for v in used_vmids)
+
+    for _ in range(MAX_ATTEMPTS):
+        reserved = {
+            r.vm_id for r in db.query(models.VMIDReservation.vm_id).filter(
+                models.VMIDReservation.hypervisor_id == hypervisor_id
+            )
+        }
+        vmids = []
+        candidate = settings.VMID_MIN
+        while len(vmids) < count:
+            if candidate not in used and candidate not in reserved:
+                vmids.append(candidate)
+            candidate += 1
+
+        lease = _now() + timedelta(seconds=settings.VMID_LEASE_SECONDS)
+        db.add_all([
+            models.VMIDReservation(vm_id=vmid, hypervisor_id=hypervisor_id, lease_expires_at=lease)
+            for vmid in vmids
+        ])
+        try:
+            db.commit()
+            return vmids
+        except IntegrityError:
+            db.rollback()
+    raise Exception("Could not reserve VMIDs, too much concurrent allocation")
+
+def mark_used(db: Session, vmid: int, hypervisor_id: int = 0):
+    """
+    The clone for `vmid` was issued. Keep the row for one more lease so the
+    ID isn't handed out again before cluster listings include the new VM.
+    """
+    db.query(models.VMIDReservation).filter(
+        models.VMIDReservation.hypervisor_id == hypervisor_id,
+        models.VMIDReservation.vm_id == vmid
+    ).update({
+        "state": "used",
+        "lease_expires_at": _now() + timedelta(seconds=settings.VMID_LEASE_SECONDS)
+    }, synchronize_session=False)
+    db.commit()
+
+def release(db: Session, vmids: Iterable[int], hypervisor_id: int = 0):
+    """Give back reservations that were not used (clone failed, nothing to provision)."""
+    vmids = [int(v) for v in vmids]
+    if not vmids:
+        return
+    db.query(models.VMIDReservation).filter(
+        models.VMIDReservation.hypervisor_id == hypervisor_id,
+        models.VMIDReservation.vm_id.in_(vmids),
+        models.VMIDReservation.state == "reserved"
+    ).delete(synchronize_session=False)
+    db.commit()
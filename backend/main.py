@@ -4,9 +4,22 @@ from app.core.config import settings
 from app.api.v1.api import api_router
 from app.db import models
 from app.db.base import engine
+from app.db.search import ensure_indexes
+from app.db.upgrade import ensure_columns
+from app.hypervisor.manager import HypervisorManager
+from app.services.catalog import catalog
+from app.services.analytics import analytics
+from app.services.idle import idle_policy
+from app.services.ips import ip_resolver
+from app.services.live_stats import sampler
+from app.services.metrics import collector
+from app.services.reconciler import reconciler
+from app.services.tasks import tracker
 
 # Create tables
 models.Base.metadata.create_all(bind=engine)
+ensure_columns(engine)
+ensure_indexes(engine)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -32,6 +45,28 @@ async def startup_event():
         with open("c:/Users/badda/Desktop/MastersProject/backend/startup.log", "a") as f:
             f.write(f"DB CONNECTION TEST: FAILED - {str(e)}\n")
 
+@app.on_event("startup")
+async def start_background_services():
+    catalog.start()
+    tracker.start()
+    ip_resolver.start()
+    reconciler.start()
+    collector.start()
+    analytics.start()
+    idle_policy.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await catalog.stop()
+    await tracker.stop()
+    await ip_resolver.stop()
+    await reconciler.stop()
+    await collector.stop()
+    await sampler.stop()
+    await analytics.stop()
+    await idle_policy.stop()
+    await HypervisorManager.aclose()
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     import traceback
@@ -3,6 +3,21 @@ import getpass
 
 API_URL = "http://127.0.0.1:8081/api/v1"
 
+def get_all(url, headers, **params):
+    # List endpoints are paginated: follow X-Next-Cursor until the last page
+    items, cursor = [], None
+    while True:
+        query = dict(params, limit=500)
+        if cursor:
+            query["cursor"] = cursor
+        res = requests.get(url, headers=headers, params=query)
+        if res.status_code != 200:
+            return res, None
+        items.extend(res.json())
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            return res, items
+
 def list_course_assistants():
     print("List Course Assistants")
     
@@ -44,13 +59,11 @@ def list_course_assistants():
 
     # 3. Get Assistants
     print(f"Fetching assistants for Course {course_id}")
-    res = requests.get(f"{API_URL}/courses/{course_id}/assistants", headers=headers)
+    res, assistants = get_all(f"{API_URL}/courses/{course_id}/assistants", headers)
     
     if res.status_code != 200:
         print(f"Failed to get assistants: {res.text}")
         return
-        
-    assistants = res.json()
     
     if not assistants:
         print("No assistants found for this course.")
@@ -3,6 +3,21 @@ import getpass
 
 API_URL = "http://localhost:8080/api/v1"
 
+def get_all(url, headers, **params):
+    # List endpoints are paginated: follow X-Next-Cursor until the last page
+    items, cursor = [], None
+    while True:
+        query = dict(params, limit=500)
+        if cursor:
+            query["cursor"] = cursor
+        res = requests.get(url, headers=headers, params=query)
+        if res.status_code != 200:
+            return res, None
+        items.extend(res.json())
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            return res, items
+
 def list_students():
     print("\nList Course Students & VMs")
     
@@ -41,10 +56,9 @@ def list_students():
     
     # 4. Fetch Students
     try:
-        response = requests.get(f"{API_URL}/courses/{course_id}/students", headers=headers)
+        response, students = get_all(f"{API_URL}/courses/{course_id}/students", headers)
         
         if response.status_code == 200:
-            students = response.json()
             print(f"\nStudents in Course {course_id}")
             print(f"{'Username':<20} | {'Email':<30} | {'VM Name':<25} | {'Status':<10}")
             print("-" * 95)
@@ -16,15 +16,15 @@ def search_course():
     token = res.json()["access_token"]
     headers = {"Authorization": f"Bearer {token}"}
     
-    query = input("Enter Course Name to search: ").strip().lower()
+    query = input("Enter Course Name to search: ").strip()
     
-    res = requests.get(f"{API_URL}/courses/", headers=headers)
+    # Matched and ranked server-side
+    res = requests.get(f"{API_URL}/search/courses", headers=headers, params={"q": query})
     if res.status_code != 200:
-        print(f"Failed to fetch courses: {res.text}")
+        print(f"Failed to search courses: {res.text}")
         return
         
-    courses = res.json()
-    found = [c for c in courses if query in c['name'].lower()]
+    found = res.json()
     
     if not found:
         print("No courses found matching query.")
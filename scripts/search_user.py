@@ -17,15 +17,15 @@ def search_user():
     token = res.json()["access_token"]
     headers = {"Authorization": f"Bearer {token}"}
     
-    query = input("Enter Username or Email to search: ").strip().lower()
+    query = input("Enter Username or Email to search: ").strip()
     
-    res = requests.get(f"{API_URL}/users/", headers=headers)
+    # Matched and ranked server-side
+    res = requests.get(f"{API_URL}/search/users", headers=headers, params={"q": query})
     if res.status_code != 200:
-        print(f"Failed to fetch users: {res.text}")
+        print(f"Failed to search users: {res.text}")
         return
         
-    users = res.json()
-    found = [u for u in users if query in u['username'].lower() or query in u['email'].lower()]
+    found = res.json()
     
     if not found:
         print("No users found matching query.")
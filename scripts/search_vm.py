@@ -16,15 +16,15 @@ def search_vm():
     token = res.json()["access_token"]
     headers = {"Authorization": f"Bearer {token}"}
     
-    query = input("Enter VM Name to search: ").strip().lower()
+    query = input("Enter VM Name to search: ").strip()
     
-    res = requests.get(f"{API_URL}/vms/", headers=headers)
+    # Matched and ranked server-side
+    res = requests.get(f"{API_URL}/search/vms", headers=headers, params={"q": query, "limit": 100})
     if res.status_code != 200:
-        print(f"Failed to fetch VMs: {res.text}")
+        print(f"Failed to search VMs: {res.text}")
         return
         
-    vms = res.json()
-    found = [v for v in vms if query in v['name'].lower()]
+    found = res.json()
     
     if not found:
         print("No VMs found matching query.")
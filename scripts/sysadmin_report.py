@@ -2,72 +2,87 @@ import requests
 import getpass
 
 API_URL = "http://127.0.0.1:8081/api/v1"
+ROLES = ["sys_admin", "business_admin", "professor", "assistant", "student"]
+VM_STATUSES = ["running", "stopped", "creating", "error", "missing"]
+
+def count(url, headers, **params):
+    # limit=1: only the X-Total-Count header is needed
+    res = requests.get(url, headers=headers, params={**params, "limit": 1})
+    res.raise_for_status()
+    return int(res.headers["X-Total-Count"])
+
+def pages(url, headers, **params):
+    # Follow X-Next-Cursor, one page in memory at a time
+    cursor = None
+    while True:
+        query = dict(params, limit=500)
+        if cursor:
+            query["cursor"] = cursor
+        res = requests.get(url, headers=headers, params=query)
+        res.raise_for_status()
+        yield from res.json()
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            return
 
 def sysadmin_report():
     print("SysAdmin System Report")
-    
+
     username = input("SysAdmin Email: ").strip() or "sys_admin@example.com"
     password = getpass.getpass("Password: ").strip() or "password123"
 
     print(f"Logging in as {username}")
     res = requests.post(f"{API_URL}/auth/login", data={"username": username, "password": password})
-    
+
     if res.status_code != 200:
         print(f"Login failed: {res.text}")
         return
-        
+
     token = res.json()["access_token"]
     headers = {"Authorization": f"Bearer {token}"}
-    
+
     # 1. Users Report
     print("\n[1] Users Report")
-    res = requests.get(f"{API_URL}/users/", headers=headers)
-    if res.status_code == 200:
-        users = res.json()
-        print(f"Total Users: {len(users)}")
-        by_role = {}
-        for u in users:
-            role = u['role']
-            if role not in by_role: by_role[role] = []
-            by_role[role].append(u)
-            
-        for role, u_list in by_role.items():
-            print(f"  {role.upper()}: {len(u_list)}")
-            for u in u_list:
+    try:
+        print(f"Total Users: {count(f'{API_URL}/users/', headers)}")
+        for role in ROLES:
+            total = count(f"{API_URL}/users/", headers, role=role)
+            if not total:
+                continue
+            print(f"  {role.upper()}: {total}")
+            for u in pages(f"{API_URL}/users/", headers, role=role):
                 print(f"    - {u['username']} ({u['email']})")
-    else:
-        print(f"Failed to fetch users: {res.text}")
+    except requests.HTTPError as e:
+        print(f"Failed to fetch users: {e.response.text}")
 
     # 2. Courses Report
     print("\n[2] Courses Report")
-    res = requests.get(f"{API_URL}/courses/", headers=headers)
-    if res.status_code == 200:
-        courses = res.json()
-        print(f"Total Courses: {len(courses)}")
-        for c in courses:
+    try:
+        print(f"Total Courses: {count(f'{API_URL}/courses/', headers)}")
+        for c in pages(f"{API_URL}/courses/", headers):
             print(f"  [{c['id']}] {c['name']} (Prof ID: {c['professor_id']})")
-    else:
-        print(f"Failed to fetch courses: {res.text}")
+    except requests.HTTPError as e:
+        print(f"Failed to fetch courses: {e.response.text}")
 
     # 3. VMs Report
     print("\n[3] VMs Report")
-    res = requests.get(f"{API_URL}/vms/", headers=headers)
-    if res.status_code == 200:
-        vms = res.json()
-        print(f"Total VMs: {len(vms)}")
-        by_status = {}
-        for vm in vms:
-            status = vm.get('status', 'unknown')
-            if status not in by_status: by_status[status] = []
-            by_status[status].append(vm)
-            
-        for status, vm_list in by_status.items():
-            print(f"  {status.upper()}: {len(vm_list)}")
-            for vm in vm_list:
+    try:
+        total_vms = count(f"{API_URL}/vms/", headers)
+        print(f"Total VMs: {total_vms}")
+        listed = 0
+        for status in VM_STATUSES:
+            total = count(f"{API_URL}/vms/", headers, status=status)
+            listed += total
+            if not total:
+                continue
+            print(f"  {status.upper()}: {total}")
+            for vm in pages(f"{API_URL}/vms/", headers, status=status):
                 ip = vm.get('ip_address') or "N/A"
                 print(f"    - {vm['name']} (ID: {vm['id']}) [IP: {ip}]")
-    else:
-        print(f"Failed to fetch VMs: {res.text}")
+        if total_vms > listed:
+            print(f"  OTHER: {total_vms - listed}")
+    except requests.HTTPError as e:
+        print(f"Failed to fetch VMs: {e.response.text}")
 
 if __name__ == "__main__":
     sysadmin_report()
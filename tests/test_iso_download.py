@@ -1,4 +1,5 @@
 import requests
+import json
 import time
 
 API_URL = "http://127.0.0.1:8081/api/v1"
@@ -56,7 +57,20 @@ def test_iso_download():
             print(f"Failed to get status: {res.text}")
             
         time.sleep(2)
-        
+
+    # 2b. Follow the task stream for a few events
+    print("\n2b. Streaming Progress (5 events)")
+    with requests.get(f"{API_URL}/resources/tasks/{upid}/stream", headers=headers, stream=True, timeout=60) as stream:
+        received = 0
+        for line in stream.iter_lines(decode_unicode=True):
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            print(f"Event: {event}")
+            received += 1
+            if received >= 5:
+                break
+
     # 3. Cancel Task
     print("\n3. Cancelling Task")
     res = requests.delete(f"{API_URL}/resources/tasks/{upid}", headers=headers)
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Runs against a throwaway SQLite database with fake hypervisor clients,
+# no server or Proxmox needed
+DB_FILE = os.path.join(tempfile.mkdtemp(), "metrics.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.db import models
+from app.db.base import SessionLocal, engine
+from app.hypervisor.manager import HypervisorManager
+from app.services.metrics import RAW, collector
+
+class HealthyClient:
+    async def list_nodes(self):
+        return [{"node": "pve1", "status": "online"}]
+
+    async def get_node_rrddata(self, node, timeframe="hour"):
+        now = int(time.time()) // 60 * 60
+        return [{"time": now - 60 * i, "cpu": 0.1, "memused": 1024, "memtotal": 4096} for i in range(10)]
+
+    async def get_vm_rrddata(self, vm_id, timeframe="hour"):
+        return []
+
+class FailingClient(HealthyClient):
+    async def list_nodes(self):
+        raise Exception("cluster unreachable")
+
+def test_failing_cluster_keeps_other_samples():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    broken = models.Hypervisor(name="broken", type=models.HypervisorType.PROXMOX, url="https://broken.invalid:8006",
+                               auth_user="root@pam", auth_token="x", verify_ssl=False)
+    db.add(broken)
+    db.commit()
+    broken_id = broken.id
+    db.close()
+
+    original = HypervisorManager.get_async_client
+    HypervisorManager.get_async_client = classmethod(
+        lambda cls, hypervisor=None: FailingClient() if hypervisor and hypervisor.id == broken_id else HealthyClient()
+    )
+    try:
+        # The failing cluster comes after the healthy default one
+        asyncio.run(collector.collect_once())
+    finally:
+        HypervisorManager.get_async_client = original
+
+    db = SessionLocal()
+    try:
+        stored = db.query(models.MetricSample).filter(
+            models.MetricSample.subject == "node:0:pve1", models.MetricSample.resolution == RAW
+        ).count()
+        print(f"Samples stored for the healthy cluster: {stored}")
+        assert stored == 10
+    finally:
+        db.close()
+
+def test_repeated_pass_stores_samples_once():
+    models.Base.metadata.create_all(bind=engine)
+    original = HypervisorManager.get_async_client
+    HypervisorManager.get_async_client = classmethod(lambda cls, hypervisor=None: HealthyClient())
+    try:
+        asyncio.run(collector.collect_once())
+        db = SessionLocal()
+        first = db.query(models.MetricSample).filter(models.MetricSample.resolution == RAW).count()
+        db.close()
+        # The same rrddata window again: every sample is already stored
+        asyncio.run(collector.collect_once())
+        db = SessionLocal()
+        second = db.query(models.MetricSample).filter(models.MetricSample.resolution == RAW).count()
+        db.close()
+    finally:
+        HypervisorManager.get_async_client = original
+    print(f"Raw samples after one pass: {first}, after two: {second}")
+    assert first > 0 and second == first
+
+if __name__ == "__main__":
+    test_failing_cluster_keeps_other_samples()
+    test_repeated_pass_stores_samples_once()
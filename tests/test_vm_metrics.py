@@ -0,0 +1,47 @@
+import requests
+import json
+
+# Config
+API_URL = "http://localhost:8080/api/v1"
+EMAIL = "student3@example.com"
+PASSWORD = "password123"
+
+def test_vm_metrics():
+    # 1. Login
+    print(f"Logging in as {EMAIL}")
+    response = requests.post(f"{API_URL}/auth/login", data={"username": EMAIL, "password": PASSWORD})
+    if response.status_code != 200:
+        print("Login failed.")
+        return
+
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    # 2. List VMs to find one
+    print("Listing VMs")
+    list_response = requests.get(f"{API_URL}/vms/", headers=headers)
+    try:
+        vms = list_response.json()
+    except:
+        print("Failed to list VMs")
+        return
+    
+    if not vms:
+        print("No VMs found.")
+        return
+
+    vm_id = vms[0]["id"]
+
+    # 3. Last hour (raw 1-minute samples) and last week (15-minute roll-ups)
+    for label, params in [("last hour", {}), ("last week", {"resolution": 900})]:
+        print(f"Fetching {label} of history for VM {vm_id}...")
+        metrics_response = requests.get(f"{API_URL}/metrics/vms/{vm_id}", headers=headers, params=params)
+        if metrics_response.status_code == 200:
+            metrics = metrics_response.json()
+            print(f"Resolution: {metrics['resolution']}s, {len(metrics['points'])} points")
+            print(json.dumps(metrics["summary"], indent=2))
+        else:
+            print(f"Failed to get metrics: {metrics_response.text}")
+
+if __name__ == "__main__":
+    test_vm_metrics()
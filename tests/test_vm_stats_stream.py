@@ -0,0 +1,56 @@
+import requests
+import json
+
+# Config
+API_URL = "http://localhost:8080/api/v1"
+EMAIL = "student3@example.com"
+PASSWORD = "password123"
+EVENTS = 3
+
+def test_vm_stats_stream():
+    # 1. Login
+    print(f"Logging in as {EMAIL}")
+    response = requests.post(f"{API_URL}/auth/login", data={"username": EMAIL, "password": PASSWORD})
+    if response.status_code != 200:
+        print("Login failed.")
+        return
+
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    # 2. List VMs to watch
+    print("Listing VMs")
+    list_response = requests.get(f"{API_URL}/vms/", headers=headers)
+    try:
+        vms = list_response.json()
+    except:
+        print("Failed to list VMs")
+        return
+    
+    if not vms:
+        print("No VMs found.")
+        return
+
+    vm_ids = [vm["id"] for vm in vms]
+    print(f"Streaming stats for VMs {vm_ids}...")
+
+    # 3. Read a few events from the stream
+    params = {"vm_ids": vm_ids, "interval": 2}
+    with requests.get(f"{API_URL}/vms/stats/stream", headers=headers, params=params, stream=True) as stream:
+        if stream.status_code != 200:
+            print(f"Failed to open stream: {stream.text}")
+            return
+        received = 0
+        for line in stream.iter_lines(decode_unicode=True):
+            if not line.startswith("data: "):
+                continue
+            batch = json.loads(line[len("data: "):])
+            print(f"\nEVENT {received + 1}")
+            for entry in batch:
+                print(f"VM {entry['vm_id']}: {entry.get('status')} cpu={entry.get('cpu_usage_percent')}%")
+            received += 1
+            if received >= EVENTS:
+                break
+
+if __name__ == "__main__":
+    test_vm_stats_stream()